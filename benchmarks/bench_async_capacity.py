@@ -0,0 +1,170 @@
+"""
+同時對話承載量基準測試：app.py（Flask，gunicorn gthread）vs async_app.py（Quart，hypercorn）
+兩個服務各自在子程序中啟動，真正的 /recommend 路徑（關鍵字、型錄 / RAG、對話紀錄、回應快取、模型路由）都照常執行，
+只把 agent 的模型換成 StubLLM（固定延遲，不連外）；再同時送出 N 個 POST /recommend，
+測量全部完成所需時間、吞吐量與延遲分佈
+
+需要可連線的 MySQL（與 app.py 相同的 DB_HOST 等環境變數，例如 docker compose 的 mysql），
+以及 Dockerfile 中安裝的 flask / quart / gunicorn / hypercorn / langchain 套件：
+
+    python benchmarks/bench_async_capacity.py
+    BENCH_CONCURRENCY=500 BENCH_LLM_LATENCY=1.0 BENCH_THREADS=32 python benchmarks/bench_async_capacity.py
+
+BENCH_THREADS 為 gunicorn 一個 worker 的執行緒數（兩邊都只有一個 worker）。
+每個請求的訊息與 session 都不同，不會命中回應快取或被合併成同一次模型呼叫。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+FLASK_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask_app')
+sys.path.insert(0, FLASK_APP_DIR)
+
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '300'))
+LLM_LATENCY = float(os.getenv('BENCH_LLM_LATENCY', '0.5'))
+THREADS = int(os.getenv('BENCH_THREADS', '32'))
+STUB_REPLY = "bench-stub-reply"
+PORTS = {"flask": 5601, "async": 5602}
+STARTUP_TIMEOUT = 120.0
+
+
+# ---------- 服務端（子程序） ----------
+
+def load_stubbed_app():
+    """匯入 app.py，並把 agent 的模型換成 StubLLM（async_app 匯入的是同一個 agent）"""
+    os.environ.setdefault('LLM_API_KEY', 'bench-stub')  # 讓 app.py 建立 agent
+    os.environ.setdefault('CANDIDATES_JOB', 'false')    # 背景工作不影響量測
+    import app
+    from test_llm_router import StubLLM
+
+    app.agent.llms = [{"name": "Stub", "llm": StubLLM(STUB_REPLY, latency=LLM_LATENCY)}]
+    return app
+
+
+def serve_flask(port):
+    from gunicorn.app.base import BaseApplication
+
+    app = load_stubbed_app()
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {"bind": f"127.0.0.1:{port}", "workers": 1, "worker_class": "gthread",
+                               "threads": THREADS, "backlog": CONCURRENCY * 2, "timeout": 300,
+                               "loglevel": "warning"}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            app.warm_catalog()  # 在 worker（fork 之後）建立型錄快照，背景執行緒才會在 worker 中
+            return app.app
+
+    Server().run()
+
+
+def serve_async(port):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    load_stubbed_app()
+    import async_app
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.backlog = CONCURRENCY * 2
+    config.accesslog = None
+    asyncio.run(serve(async_app.app, config))
+
+
+# ---------- 用戶端 ----------
+
+async def http_request(port, method, path, body=None):
+    """最簡單的 HTTP/1.1 用戶端（每個請求一條連線），回傳 (狀態碼, 回應內容)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+    head = (f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+    writer.write(head.encode('ascii') + payload)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    status_line, _, rest = data.partition(b"\r\n")
+    return int(status_line.split()[1]), rest.partition(b"\r\n\r\n")[2]
+
+
+async def wait_ready(port, proc):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"服務啟動失敗（exit {proc.returncode}）")
+        try:
+            status, _ = await http_request(port, "GET", "/ping")
+            if status == 200:
+                return
+        except (OSError, IndexError, ValueError):  # 還沒開始監聽或連線被中斷
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("等待服務啟動逾時")
+
+
+async def one_recommend(port, run_id, i, latencies):
+    body = {"message": f"明天要約會穿什麼 #{run_id}-{i}", "session_id": f"bench-{run_id}-{i}", "model": "auto"}
+    start = time.perf_counter()
+    status, content = await http_request(port, "POST", "/recommend", body)
+    latencies.append(time.perf_counter() - start)
+    return status == 200 and STUB_REPLY.encode('utf-8') in content
+
+
+async def load_test(port, run_id):
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_recommend(port, run_id, i, latencies) for i in range(CONCURRENCY)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    ok = sum(r is True for r in results)
+    return elapsed, ok, sorted(latencies)
+
+
+def run(mode):
+    port = PORTS[mode]
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port)],
+                            cwd=FLASK_APP_DIR)
+    try:
+        asyncio.run(wait_ready(port, proc))
+        asyncio.run(load_test(port, "warmup"))  # 暖身（建立連線池、載入索引等）
+        return asyncio.run(load_test(port, "run"))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def report(name, elapsed, ok, latencies):
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float('nan')
+
+    print(f"{name:<28} {CONCURRENCY} 個請求完成時間={elapsed:6.2f}s  吞吐量={CONCURRENCY / elapsed:7.1f} req/s  "
+          f"p50={pct(0.5):5.2f}s  p99={pct(0.99):5.2f}s  成功 {ok}/{CONCURRENCY}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--serve", choices=sorted(PORTS), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("modes", nargs="*", default=["flask", "async"], help="要測的服務（flask / async）")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        (serve_flask if args.serve == "flask" else serve_async)(args.port)
+        return
+
+    print(f"模型延遲 {LLM_LATENCY}s，同時請求 {CONCURRENCY}，gunicorn 執行緒數 {THREADS}")
+    names = {"flask": f"app.py（gthread {THREADS} 執行緒）", "async": "async_app.py（hypercorn）"}
+    for mode in args.modes:
+        report(names[mode], *run(mode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+crawl_malefashion_items 列表頁解析基準測試
+以 dataset/fixtures/malefashion/shop.html 為樣本，把商品卡片複製成不同大小的列表頁，比較：
+- 舊寫法：BeautifulSoup(html.parser) 建整棵樹，每個 data-setbg 區塊各自 find_next("h6") / find_next("h5")
+- 新寫法：parse_list_page() 的各個解析器（selectolax / lxml / bs4），依文件順序走一次節點配對
+每個大小都會確認各解析器的結果與舊寫法完全相同
+（時間大多花在 html.parser 建樹，頁面越大越明顯；bs4 後備只省下配對的部分）
+
+    python benchmarks/bench_crawler_parse.py
+"""
+
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset')
+sys.path.insert(0, DATASET_DIR)
+
+import crawl_malefashion_items as crawler  # noqa: E402
+
+FIXTURE = os.path.join(DATASET_DIR, 'fixtures', 'malefashion', 'shop.html')
+PAGE_URL = 'https://themewagon.github.io/malefashion/shop.html'
+SIZES = [10, 100, 500, 2000]  # 每頁商品數
+REPEAT = 5                    # 每個解析器最多跑幾次取最快的一次
+MAX_SECONDS = 2.0             # 累計超過這個秒數就不再重複（大頁面的 bs4 很慢）
+
+
+def old_parse_list_page(html, base_url):
+    """改寫前的 parse_list_page（不含 DEBUG 輸出）"""
+    soup = BeautifulSoup(html, "html.parser")
+    items = []
+    for img_block in soup.find_all(attrs={"data-setbg": True}):
+        name_tag = img_block.find_next("h6")
+        price_tag = name_tag.find_next("h5") if name_tag else None
+        if not (name_tag and price_tag):
+            continue
+        name = name_tag.get_text(strip=True)
+        price = price_tag.get_text(strip=True)
+        category = crawler.guess_category(name)
+        if category == "other":
+            continue
+        img_rel = img_block.get("data-setbg", "").strip()
+        if not img_rel:
+            continue
+        items.append({"name": name, "category": category, "color": crawler.guess_color(name),
+                      "price": price, "image_url": urljoin(base_url, img_rel)})
+    return items
+
+
+def make_page(template, products):
+    """把樣本頁的商品卡片複製到 products 張（圖片編號各不相同）"""
+    cards = re.findall(r'( *<div class="col-lg-4 col-md-6 col-sm-6">.*?\n {16}</div>\n)', template, re.S)
+    body = []
+    for i in range(products):
+        card = cards[i % len(cards)]
+        body.append(re.sub(r'product-\d+\.jpg', f'product-{i + 1}.jpg', card))
+    start = template.index(cards[0])
+    end = template.index(cards[-1]) + len(cards[-1])
+    return template[:start] + ''.join(body) + template[end:]
+
+
+def timed(fn, html):
+    """回傳 (最快一次的毫秒數, 結果)"""
+    times = []
+    while len(times) < REPEAT and sum(times) < MAX_SECONDS:
+        start = time.perf_counter()
+        result = fn(html)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main():
+    with open(FIXTURE, encoding='utf-8') as f:
+        template = f.read()
+
+    parsers = {'舊寫法 bs4 find_next': lambda html: old_parse_list_page(html, PAGE_URL)}
+    for name in crawler.BACKENDS:
+        try:
+            crawler.get_backend(name)
+        except ImportError:
+            print(f"（未安裝 {name}，略過）")
+            continue
+        parsers[name] = lambda html, name=name: crawler.parse_list_page(html, PAGE_URL, name)
+
+    failed = False
+    for size in SIZES:
+        html = make_page(template, size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs = {name: timed(fn, html) for name, fn in parsers.items()}
+        expected = runs['舊寫法 bs4 find_next'][1]
+        same = all(result == expected for _, result in runs.values())
+        failed |= not same
+        print(f"== {size} 筆商品（{len(html) / 1024:,.0f} KB，{len(expected)} 筆服飾，"
+              f"結果{'相同' if same else '不同！'}）==")
+        baseline = runs['舊寫法 bs4 find_next'][0]
+        for name, (ms, _) in runs.items():
+            print(f"  {name:<20} {ms:9.2f} ms  {baseline / ms:6.1f}x")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
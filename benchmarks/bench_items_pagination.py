@@ -0,0 +1,111 @@
+"""
+/items 回應時間基準測試
+比較舊版（SELECT * + color LIKE，整表序列化）與 keyset 分頁 + fields 投影在 5k / 500k 筆衣物下的耗時
+
+使用 SQLite 記憶體資料庫模擬 items 表（含 color_norm 與 init/outfit_db.sql 相同的索引），不需要 MySQL：
+    python benchmarks/bench_items_pagination.py
+    BENCH_SIZES=5000 python benchmarks/bench_items_pagination.py
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask_app'))
+
+from catalog_queries import fetch_items_page, count_items, parse_item_fields  # noqa: E402
+
+SIZES = [int(n) for n in os.getenv('BENCH_SIZES', '5000,500000').split(',')]
+ROUNDS = int(os.getenv('BENCH_ROUNDS', '20'))
+PAGE_SIZE = 100
+
+CATEGORIES = ['top', 'bottom', 'outer', 'shoes', 'accessory']
+COLORS = ['White', 'black', 'Navy', 'grey', 'red', 'beige', 'green', 'blue']
+
+
+class DictCursor:
+    """把 pymysql 風格（%s、DictCursor）轉成 sqlite3"""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql.replace('%s', '?'), list(params))
+
+    def fetchall(self):
+        cols = [d[0] for d in self._cur.description]
+        return [dict(zip(cols, row)) for row in self._cur.fetchall()]
+
+
+def build_db(n_items):
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        CREATE TABLE items (id INTEGER PRIMARY KEY, sku TEXT UNIQUE, name TEXT, category TEXT,
+                            color TEXT, size TEXT, price REAL, image_url TEXT, created_at TEXT,
+                            color_norm TEXT GENERATED ALWAYS AS (LOWER(TRIM(color))) STORED);
+    """)
+    conn.executemany(
+        "INSERT INTO items (id, sku, name, category, color, size, price, image_url, created_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"SKU-{i}", f"item {i}", CATEGORIES[i % 5], COLORS[i % 8], 'M', 19.9,
+          f"https://example.com/{i}.jpg", '2024-01-01T00:00:00') for i in range(1, n_items + 1))
+    )
+    conn.executescript("""
+        CREATE INDEX idx_items_category_id ON items (category, id);
+        CREATE INDEX idx_items_color_norm_id ON items (color_norm, id);
+        CREATE INDEX idx_items_category_color_id ON items (category, color_norm, id);
+    """)
+    return conn
+
+
+def legacy_items(cur, color=None, category=None):
+    """舊版 query_items()：無 LIMIT，color 用 LIKE"""
+    sql = "SELECT * FROM items WHERE 1=1"
+    params = []
+    if color:
+        sql += " AND color LIKE %s"
+        params.append(f"%{color}%")
+    if category:
+        sql += " AND category=%s"
+        params.append(category)
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        body = json.dumps(fn(), ensure_ascii=False, default=str)
+    return (time.perf_counter() - start) / ROUNDS * 1000, len(body)
+
+
+def main():
+    fields = parse_item_fields('id,name,category,color,price')
+    for n in SIZES:
+        conn = build_db(n)
+        cur = DictCursor(conn)
+        # 深翻頁：從資料中段開始
+        deep_cursor = n // 2
+
+        cases = [
+            ("舊版 全表", lambda: legacy_items(cur)),
+            ("舊版 category+color LIKE", lambda: legacy_items(cur, 'white', 'top')),
+            ("分頁 第一頁", lambda: fetch_items_page(cur, limit=PAGE_SIZE)[0]),
+            ("分頁 中段頁", lambda: fetch_items_page(cur, after_id=deep_cursor, limit=PAGE_SIZE)[0]),
+            ("分頁 category+color", lambda: fetch_items_page(cur, 'top', 'White', limit=PAGE_SIZE)[0]),
+            ("分頁 + fields 投影", lambda: fetch_items_page(cur, limit=PAGE_SIZE, fields=fields)[0]),
+            ("分頁 + count", lambda: (fetch_items_page(cur, 'top', limit=PAGE_SIZE)[0],
+                                       count_items(cur, 'top'))),
+        ]
+
+        print(f"== {n:,} 筆衣物（每頁 {PAGE_SIZE}，{ROUNDS} 輪平均）==")
+        for label, fn in cases:
+            ms, size = timed(fn)
+            print(f"  {label:<26} {ms:9.2f} ms  {size / 1024:10.1f} KiB")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
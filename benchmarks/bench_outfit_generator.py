@@ -0,0 +1,94 @@
+"""
+穿搭組合產生器基準測試
+以 dataset/items_fashion_small_clean.csv（5,000 件單品）建立產生器，量測：
+- 建立耗時（單品 × 場合 分數）
+- 每個場合第一次產生（beam search）與快取命中的耗時
+- 小候選集下 beam search 與窮舉的最佳分數是否一致
+
+    python benchmarks/bench_outfit_generator.py
+    BENCH_BUDGET_MS=5 python benchmarks/bench_outfit_generator.py
+"""
+
+import csv
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask_app'))
+
+from catalog_snapshot import CatalogSnapshot  # noqa: E402
+from outfit_generator import (OutfitGenerator, OCCASIONS, SLOTS, REQUIRED_SLOTS, COLOR_MATRIX,  # noqa: E402
+                              GENDER_MATRIX, OPTIONAL_NONE_SCORE, PAIR_WEIGHT)
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'dataset', 'items_fashion_small_clean.csv')
+BUDGET_MS = float(os.getenv('BENCH_BUDGET_MS', '50'))
+TOP_N = 5
+EXACT_M = 6
+
+
+def load_snapshot():
+    with open(CSV_PATH, encoding='utf-8-sig', newline='') as f:
+        rows = [dict(row, id=i) for i, row in enumerate(csv.DictReader(f), 1)]
+    return CatalogSnapshot.build(rows, [], [])
+
+
+def exact_best(gen, occasion):
+    """窮舉每個類別前 EXACT_M 名候選的所有組合，回傳最佳分數"""
+    o = OCCASIONS.index(occasion)
+    options = []
+    for slot in SLOTS:
+        cands = [int(c) for c in gen._candidates(o, slot)]
+        options.append(cands + ([-1] if slot not in REQUIRED_SLOTS else []))
+    best = float('-inf')
+    for combo in itertools.product(*options):
+        score = 0.0
+        for k, (slot, c) in enumerate(zip(SLOTS, combo)):
+            if c < 0:
+                score += OPTIONAL_NONE_SCORE[occasion].get(slot, 0.0)
+                continue
+            score += gen.unary[o, c]
+            for prev_slot, p in zip(SLOTS[:k], combo[:k]):
+                if p >= 0:
+                    score += (COLOR_MATRIX[gen.color_of[p], gen.color_of[c]]
+                              * PAIR_WEIGHT.get(slot, 1.0) * PAIR_WEIGHT.get(prev_slot, 1.0)
+                              + GENDER_MATRIX[gen.gender_of[p], gen.gender_of[c]])
+        best = max(best, score)
+    return best
+
+
+def main():
+    snapshot = load_snapshot()
+
+    start = time.perf_counter()
+    gen = OutfitGenerator.from_snapshot(snapshot)
+    build_ms = (time.perf_counter() - start) * 1000
+    counts = {s: len(gen.slot_members[s]) for s in SLOTS}
+    print(f"== {len(snapshot.items):,} 件單品，可用 {len(gen.items):,} 件 {counts} ==")
+    print(f"  建立產生器            {build_ms:8.1f} ms")
+
+    for occasion in OCCASIONS:
+        start = time.perf_counter()
+        results = gen.generate(occasion, TOP_N, BUDGET_MS)
+        cold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in range(1000):
+            gen.generate(occasion, TOP_N, BUDGET_MS)
+        cached_us = (time.perf_counter() - start) * 1000
+        print(f"  {occasion:<8} 首次 {cold_ms:7.2f} ms   快取 {cached_us:6.2f} us   "
+              f"最佳分數 {results[0][0] if results else '-'}")
+        if results:
+            score, outfit = results[0]
+            print("           " + " / ".join(f"{outfit[s].name} ({outfit[s].color})" for s in SLOTS if s in outfit))
+    print(f"  超過時間預算 {gen.stats()['budget_exceeded']} 次（預算 {BUDGET_MS} ms）")
+
+    small = OutfitGenerator.from_snapshot(snapshot, candidates_per_slot=EXACT_M, beam_width=128)
+    print(f"== 前 {EXACT_M} 名候選：beam search vs 窮舉 ==")
+    for occasion in OCCASIONS:
+        beam = small.generate(occasion, 1, budget_ms=1000, max_item_reuse=TOP_N)[0][0]
+        exact = exact_best(small, occasion)
+        print(f"  {occasion:<8} beam {beam:8.4f}   窮舉 {exact:8.4f}   {'一致' if abs(beam - exact) < 1e-3 else '不同'}")
+
+
+if __name__ == '__main__':
+    main()
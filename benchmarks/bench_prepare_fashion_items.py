@@ -0,0 +1,118 @@
+"""
+prepare_fashion_small_items 基準測試
+以合成的 Kaggle styles.csv（44k 列，含格式錯誤的列、缺值與 "NA" 之類的字串）比較：
+- 舊流程：整份 read_csv → iterrows 逐列組 items → head(5000) → 寫中間檔 → clean_items_fashion_small 讀回篩欄位
+- 新流程：分塊讀取、整欄運算、讀滿筆數就停止，一次寫出最終檔
+兩者輸出需逐位元組相同；耗時與峰值記憶體（RSS）各在獨立的子程序中量測
+
+    python benchmarks/bench_prepare_fashion_items.py
+    BENCH_STYLES=/path/to/styles.csv python benchmarks/bench_prepare_fashion_items.py
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset')
+ROWS = 44000
+LIMITS = [5000, 10 ** 9]  # 預設筆數，以及整份
+
+ARTICLE_TYPES = ['Tshirts', 'Shirts', 'Casual Shoes', 'Watches', 'Sports Shoes', 'Kurtas', 'Tops', 'Handbags',
+                 'Heels', 'Sunglasses', 'Wallets', 'Flip Flops', 'Sandals', 'Briefs', 'Belts', 'Jeans']
+COLOURS = ['Black', 'White', 'Blue', 'Brown', 'Grey', 'Red', 'Green', 'Pink', 'Navy Blue', 'Purple', 'Silver',
+           'Off White', '', 'NA']
+BRANDS = ['Nike', 'Puma', 'ADIDAS', 'Fossil', 'Titan', 'Lee', 'Levis', 'Catwalk', 'Jealous 21', 'Gini and Jony']
+
+# 舊流程（prepare_fashion_small_items.py + clean_items_fashion_small.py 原始版本）
+OLD_PIPELINE = '''
+import pandas as pd
+df = pd.read_csv(STYLES, on_bad_lines="skip")
+def build_items(df):
+    rows = []
+    for _, row in df.iterrows():
+        sku = str(row["id"])
+        name = str(row.get("productDisplayName", "")).strip()
+        category = str(row.get("articleType", "")).strip()
+        color = str(row.get("baseColour", "")).strip()
+        price = ""
+        image_url = f"images/{sku}.jpg"
+        rows.append({"sku": sku, "name": name, "category": category, "color": color, "price": price,
+                     "image_url": image_url, "source": "kaggle_fashion_small", "url": ""})
+    return pd.DataFrame(rows)
+items_df = build_items(df).head(LIMIT)
+items_df.to_csv(OUT + ".tmp", index=False, encoding="utf-8-sig")
+df = pd.read_csv(OUT + ".tmp")
+df[["sku", "name", "category", "color", "price", "image_url"]].to_csv(OUT, index=False, encoding="utf-8-sig")
+'''
+
+NEW_PIPELINE = '''
+sys.path.insert(0, DATASET_DIR)
+from prepare_fashion_small_items import build_items, read_styles
+build_items(read_styles(STYLES, LIMIT)).to_csv(OUT, index=False, encoding="utf-8-sig")
+'''
+
+RUNNER = '''
+import json, resource, sys, time
+import pandas  # 匯入時間不列入
+STYLES, OUT, LIMIT, DATASET_DIR = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]
+start = time.perf_counter()
+exec(compile(sys.argv[5], "pipeline", "exec"))
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def make_styles(path, rows=ROWS, seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('id,gender,masterCategory,subCategory,articleType,baseColour,season,year,usage,productDisplayName\n')
+        for i in range(rows):
+            article = rng.choice(ARTICLE_TYPES)
+            colour = rng.choice(COLOURS)
+            name = f"{rng.choice(BRANDS)} {rng.choice(['Men', 'Women', 'Unisex'])} {colour} {article}"
+            roll = rng.random()
+            if roll < 0.003:
+                name = ''
+            elif roll < 0.005:
+                name = 'NA'
+            elif roll < 0.010:
+                name = f'"{name}, Pack of 2"'
+            elif roll < 0.012:
+                name = f'{name}, Pack of 3'  # 沒加引號的逗號：欄位數不對，兩個流程都會略過
+            elif roll < 0.5:
+                name = f'  {name} '
+            f.write(f"{10000 + i},Men,Apparel,Topwear,{article},{colour},Summer,2012,Casual,{name}\n")
+
+
+def run(code, styles, out, limit):
+    result = subprocess.run([sys.executable, '-c', RUNNER, styles, out, str(limit), DATASET_DIR, code],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        styles = os.getenv('BENCH_STYLES')
+        if not styles:
+            styles = os.path.join(tmp, 'styles.csv')
+            make_styles(styles)
+        for limit in LIMITS:
+            old_out, new_out = os.path.join(tmp, 'old.csv'), os.path.join(tmp, 'new.csv')
+            old = run(OLD_PIPELINE, styles, old_out, limit)
+            new = run(NEW_PIPELINE, styles, new_out, limit)
+            with open(old_out, 'rb') as a, open(new_out, 'rb') as b:
+                identical = a.read() == b.read()
+            label = f"前 {limit} 筆" if limit < 10 ** 9 else "整份"
+            print(f"== {label}（輸出{'逐位元組相同' if identical else '不同！'}）==")
+            for name, r in (('舊流程', old), ('新流程', new)):
+                print(f"  {name}  {r['seconds'] * 1000:8.1f} ms   峰值 RSS {r['max_rss_mb']:6.1f} MB")
+            print(f"  加速 {old['seconds'] / new['seconds']:.1f}x，峰值 RSS 少 {old['max_rss_mb'] - new['max_rss_mb']:.1f} MB")
+            if not identical:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+/recommend 查詢次數基準測試
+比較舊版 N+1（每組穿搭各查一次單品）與批次查詢的每次請求查詢數與耗時
+
+使用 SQLite 記憶體資料庫模擬 outfit_db 的結構，不需要 MySQL；
+每次查詢額外加上 BENCH_RTT_MS 毫秒模擬 MySQL 網路往返：
+    BENCH_RTT_MS=0.5 python benchmarks/bench_recommend_queries.py
+"""
+
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask_app'))
+
+from catalog_queries import fetch_outfits_with_items  # noqa: E402
+
+N_OUTFITS = 1000
+ITEMS_PER_OUTFIT = 4
+ROUNDS = 200
+RTT = float(os.getenv('BENCH_RTT_MS', '0.5')) / 1000
+
+
+class CountingCursor:
+    """把 pymysql 風格（%s、DictCursor）轉成 sqlite3 並記錄查詢次數"""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+        self.queries = 0
+
+    def execute(self, sql, params=()):
+        self.queries += 1
+        if RTT:
+            time.sleep(RTT)
+        self._cur.execute(sql.replace('%s', '?'), list(params))
+
+    def fetchall(self):
+        cols = [d[0] for d in self._cur.description]
+        return [dict(zip(cols, row)) for row in self._cur.fetchall()]
+
+
+def build_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        CREATE TABLE items (id INTEGER PRIMARY KEY, sku TEXT, name TEXT, category TEXT,
+                            color TEXT, size TEXT, price REAL, image_url TEXT, created_at TEXT);
+        CREATE TABLE outfits (id INTEGER PRIMARY KEY, name TEXT, occasion TEXT,
+                              description TEXT, created_at TEXT);
+        CREATE TABLE outfit_items (id INTEGER PRIMARY KEY, outfit_id INT, item_id INT);
+        CREATE INDEX idx_oi_outfit ON outfit_items(outfit_id);
+    """)
+    occasions = ['casual', 'formal', 'street', 'sport', 'date']
+    conn.executemany(
+        "INSERT INTO outfits (id, name, occasion, description) VALUES (?, ?, ?, ?)",
+        [(i, f"outfit {i}", occasions[i % 5], "desc") for i in range(1, N_OUTFITS + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO items (id, sku, name, category, color, price) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i, f"SKU-{i}", f"item {i}", 'top', 'white', 10.0) for i in range(1, N_OUTFITS * ITEMS_PER_OUTFIT + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO outfit_items (outfit_id, item_id) VALUES (?, ?)",
+        [(o, (o - 1) * ITEMS_PER_OUTFIT + k + 1) for o in range(1, N_OUTFITS + 1) for k in range(ITEMS_PER_OUTFIT)]
+    )
+    return conn
+
+
+def legacy_fetch(cur, keywords):
+    """舊版 recommend() 的查詢流程（每組穿搭一次單品查詢）"""
+    if keywords:
+        placeholders = ','.join(['%s'] * len(keywords))
+        cur.execute(f"SELECT * FROM outfits WHERE occasion IN ({placeholders}) LIMIT 5", keywords)
+        outfits = cur.fetchall()
+        if not outfits:
+            cur.execute("SELECT * FROM outfits LIMIT 5")
+            outfits = cur.fetchall()
+    else:
+        cur.execute("SELECT * FROM outfits LIMIT 5")
+        outfits = cur.fetchall()
+    for o in outfits:
+        cur.execute("""
+            SELECT i.* FROM items i
+            JOIN outfit_items oi ON i.id = oi.item_id
+            WHERE oi.outfit_id=%s
+        """, (o['id'],))
+        o['items'] = cur.fetchall()
+    return outfits
+
+
+def run(name, fn, conn, keywords):
+    cur = CountingCursor(conn)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(cur, keywords)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<8} keywords={keywords!s:<12} 查詢數/請求={cur.queries / ROUNDS:.1f}  "
+          f"平均耗時={elapsed / ROUNDS * 1e3:.2f} ms")
+
+
+def main():
+    conn = build_db()
+    for keywords in ([], ['date'], ['unknown']):
+        run("before", legacy_fetch, conn, keywords)
+        run("after", fetch_outfits_with_items, conn, keywords)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+RAG 向量檢索基準測試
+以合成的穿搭資料建立雜湊 n-gram TF-IDF 索引，量測建立、存檔、memory-map 載入與 top-k 查詢耗時
+（目標：十萬組穿搭時每次查詢 < TARGET_MS），並與舊版「關鍵字 → occasion IN (...)」的命中情況比較
+
+    python benchmarks/bench_retrieval.py
+    BENCH_OUTFITS=100000 python benchmarks/bench_retrieval.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'flask_app'))
+
+from catalog_snapshot import CatalogSnapshot  # noqa: E402
+from outfit_retriever import OutfitIndex  # noqa: E402
+
+SIZES = [int(n) for n in os.getenv('BENCH_OUTFITS', '10000,100000').split(',')]
+ITEMS_PER_OUTFIT = 3
+QUERIES = 2000
+DIM = int(os.getenv('RETRIEVAL_DIM', str(1 << 20)))
+TARGET_MS = 1.0
+
+OCCASIONS = ['casual', 'formal', 'street', 'sport', 'date']
+CATEGORIES = ['top', 'bottom', 'outer', 'shoes', 'accessory']
+COLORS = ['white', 'black', 'navy', 'grey', 'red', 'beige', 'green', 'blue']
+NAMES = ['T恤', '襯衫', '牛仔褲', '西裝外套', '球鞋', '皮鞋', '洋裝', '針織衫', '帽子', '風衣']
+DESCRIPTIONS = ['經典日常穿搭', '簡約正式感', '街頭風混搭', '舒適好活動', '溫柔浪漫風']
+QUERY_TEXTS = ['明天要約會穿什麼', '上班穿搭推薦', '週末想去逛街', '去健身房運動', '派對要穿什麼',
+               '想要黑色外套的搭配', '白色球鞋怎麼搭', 'casual outfit for weekend']
+
+
+def build_snapshot(rng, n_outfits):
+    n_items = n_outfits * ITEMS_PER_OUTFIT
+    items = [{"id": i, "name": f"{rng.choice(COLORS)} {rng.choice(NAMES)}", "category": rng.choice(CATEGORIES),
+              "color": rng.choice(COLORS)} for i in range(1, n_items + 1)]
+    outfits = [{"id": i, "name": " + ".join(rng.sample(NAMES, 3)), "occasion": rng.choice(OCCASIONS),
+                "description": rng.choice(DESCRIPTIONS)} for i in range(1, n_outfits + 1)]
+    links = [{"outfit_id": o, "item_id": (o - 1) * ITEMS_PER_OUTFIT + k + 1}
+             for o in range(1, n_outfits + 1) for k in range(ITEMS_PER_OUTFIT)]
+    return CatalogSnapshot.build(items, outfits, links)
+
+
+def bench_search(index, label):
+    for q in QUERY_TEXTS:  # 暖身
+        index.search(q)
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        index.search(QUERY_TEXTS[i % len(QUERY_TEXTS)], 5)
+    per_query = (time.perf_counter() - start) / QUERIES * 1000
+    print(f"  {label:<22} {per_query:8.3f} ms / 查詢  {'✓' if per_query < TARGET_MS else '✗'} < {TARGET_MS} ms")
+
+
+def run(n_outfits):
+    rng = random.Random(42)
+    snapshot = build_snapshot(rng, n_outfits)
+    print(f"== {n_outfits:,} 組穿搭，dim={DIM} ==")
+
+    start = time.perf_counter()
+    index = OutfitIndex.from_snapshot(snapshot, DIM)
+    print(f"  建立索引               {time.perf_counter() - start:8.2f} s"
+          f"（內容相同而共用的維度 {index.aliased_dims}）")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'index')
+        start = time.perf_counter()
+        index.save(path)
+        print(f"  存檔                   {time.perf_counter() - start:8.2f} s")
+        start = time.perf_counter()
+        mapped = OutfitIndex.load(path)
+        print(f"  memory-map 載入        {(time.perf_counter() - start) * 1000:8.2f} ms")
+
+        bench_search(index, "查詢（記憶體）")
+        bench_search(mapped, "查詢（memory-map）")
+        del mapped
+
+    # 舊版以中文關鍵字比對英文 occasion ENUM，永遠落到「前 5 組」；這裡看前 20 名的場合是否相符
+    print("  前 20 名場合相符比例：")
+    for q, occasion in (('明天要約會穿什麼', 'date'), ('上班穿搭推薦', 'formal'), ('週末想去逛街', 'casual'),
+                        ('去健身房運動', 'sport'), ('派對要穿什麼', 'street')):
+        top = index.search(q, 20)
+        hit = sum(snapshot.outfits[outfit_id].occasion == occasion for outfit_id, _ in top) / 20
+        print(f"    {q:<12} {occasion:<7} {hit:.0%}")
+
+
+def main():
+    for n in SIZES:
+        run(n)
+
+
+if __name__ == '__main__':
+    main()
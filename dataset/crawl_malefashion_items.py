@@ -1,21 +1,58 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+"""
+爬取 malefashion 模板的商品，輸出 items CSV（或直接寫入 MySQL items 表）
+- 從列表頁開始，跟著分頁連結往下爬；商品有詳細頁時一併抓取，用說明文字補上顏色
+- 列表頁以 selectolax 或 lxml 解析（沒有安裝時用 bs4，--parser / CRAWLER_PARSER 可指定），每頁只走訪一次
+- 每個執行緒一個 requests.Session（連線重用、失敗自動重試），同時進行的請求數有上限（--concurrency）
+- 條件式請求：記住每頁的 ETag / Last-Modified，伺服器回 304 時沿用上次的解析結果，不重新下載與解析
+- 商品解析完就寫出（CSV 或 MySQL），不在記憶體中累積；sku 由圖片網址算出（product-12.jpg → MF-012，其他檔名取路徑的雜湊），與抓取順序無關
+- 可續跑：狀態檔（--state）記錄本次已抓過的頁面與已寫出的商品，中斷後再執行同一個指令會接著做
+  （本次已抓過的頁面直接用快取，已寫出的商品略過；全部成功後才算完成，下次執行重新輸出整份）
+
+用法：
+    python crawl_malefashion_items.py
+    python crawl_malefashion_items.py --concurrency 8 --max-pages 30 -o items_malefashion.csv
+    python crawl_malefashion_items.py --mysql                      # 直接寫入 MySQL（環境變數 DB_HOST 等）
+    python crawl_malefashion_items.py --fixtures fixtures/malefashion   # 離線：以本機伺服器提供存下來的 HTML
+"""
+
+import argparse
 import csv
-import random
+import hashlib
+import json
+import os
 import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 LIST_URL = "https://themewagon.github.io/malefashion/shop.html"
 BASE_URL = "https://themewagon.github.io/malefashion/"
-
-# 目標要爬到的筆數（如果原始頁面筆數不足，會用簡單變體補足）
-# 可以設定成 50 到 100 之間，例如 80
-TARGET_COUNT = 80
+OUTPUT = "items_malefashion.csv"
+STATE_FILE = "crawl_malefashion_state.json"
+
+DEFAULT_CONCURRENCY = 4
+# 列表頁解析器：auto（依序使用已安裝的 selectolax、lxml，都沒有時用 bs4）、selectolax、lxml、bs4
+PARSER = os.getenv("CRAWLER_PARSER", "auto")
+# 最多爬幾個列表頁（分頁）
+MAX_PAGES = 50
+# --fixtures 時本機伺服器的埠（固定，網址不變 ETag 快取才有效）
+FIXTURES_PORT = 8765
+# 狀態檔至少每幾秒存一次（存檔前會先把已解析的商品寫出）
+SAVE_INTERVAL = 2.0
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; RubyCrawler/1.0; +https://example.com)"
 }
 
+FIELDNAMES = ["sku", "name", "category", "color", "price", "image_url"]
+
 # 關鍵字簡單判斷 top / bottom
 CLOTHING_KEYWORDS_TOP = [
     "jacket", "t-shirt", "shirt", "coat", "hoodie", "sweatshirt"
@@ -44,138 +81,619 @@ def guess_color(name: str) -> str:
     return ""
 
 
-def fetch_html(url: str) -> str:
-    resp = requests.get(url, headers=HEADERS, timeout=15)
-    resp.raise_for_status()
-    return resp.text
+def make_sku(image_url: str) -> str:
+    """由圖片網址決定 sku：模板的 img/product/product-N 為 MF-00N，其他圖片為網址路徑 SHA-1 的前 10 碼
+    （只看路徑不看主機，離線 fixtures 與線上網站算出相同的 sku）"""
+    path = urlparse(image_url).path
+    m = re.search(r"/img/product/product-(\d+)\.\w+$", path)
+    if m:
+        return f"MF-{int(m.group(1)):03d}"
+    return "MF-" + hashlib.sha1(path.encode("utf-8")).hexdigest()[:10].upper()
 
 
-def parse_list_page(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    items = []
+class _Bs4Backend:
+    """BeautifulSoup（html.parser）；沒有安裝 lxml / selectolax 時使用"""
+    name = "bs4"
 
-    # 這個模板的商品圖片區塊會有 data-setbg 屬性
-    img_blocks = soup.find_all(attrs={"data-setbg": True})
-    print(f"DEBUG: 找到 data-setbg 圖片區塊 {len(img_blocks)} 個")
+    def parse(self, html):
+        return BeautifulSoup(html, "html.parser")
 
-    for img_block in img_blocks:
-        # 從圖片區塊往後找最近的商品名稱 (h6) 和價格 (h5)
-        name_tag = img_block.find_next("h6")
-        price_tag = name_tag.find_next("h5") if name_tag else None
+    def list_nodes(self, doc):
+        return doc.find_all(lambda tag: tag.name in ("h5", "h6") or tag.has_attr("data-setbg"))
 
-        if not (name_tag and price_tag):
+    def tag(self, node):
+        return node.name
+
+    def setbg(self, node):
+        return node.get("data-setbg")
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def pagination_hrefs(self, doc):
+        return [a.get("href") for a in doc.select(PAGINATION_SELECTOR)]
+
+    def products(self, doc):
+        for product in doc.select(".product__item"):
+            img_block = product.find(attrs={"data-setbg": True})
+            yield (img_block["data-setbg"] if img_block is not None else None,
+                   [a["href"] for a in product.find_all("a", href=True)])
+
+
+class _LxmlBackend:
+    """lxml（libxml2）：以 XPath 一次取出依文件順序排列的節點"""
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        from lxml import etree
+
+        has_class = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')".format
+        self._parser = lxml.html.HTMLParser(encoding="utf-8")
+        self._fromstring = lxml.html.document_fromstring
+        self._list_nodes = etree.XPath("//h5 | //h6 | //*[@data-setbg]")
+        # 與 bs4 的 get_text() 相同：不含 <script> / <style> 與註解
+        self._texts = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+        self._pagination = etree.XPath(
+            f"//a[@href][ancestor::*[{has_class('product__pagination')}] or "
+            "contains(concat(' ', normalize-space(@rel), ' '), ' next ')]/@href")
+        self._products = etree.XPath(f"//*[{has_class('product__item')}]")
+        self._product_setbg = etree.XPath("(.//*[@data-setbg])[1]/@data-setbg")
+        self._product_hrefs = etree.XPath(".//a[@href]/@href")
+        self._parser_error = etree.ParserError
+
+    def parse(self, html):
+        try:
+            return self._fromstring(html.encode("utf-8"), parser=self._parser)
+        except self._parser_error:  # 空白文件
+            return None
+
+    def list_nodes(self, doc):
+        return self._list_nodes(doc) if doc is not None else []
+
+    def tag(self, node):
+        return node.tag
+
+    def setbg(self, node):
+        return node.get("data-setbg")
+
+    def text(self, node):
+        return "".join(s.strip() for s in self._texts(node))
+
+    def pagination_hrefs(self, doc):
+        return self._pagination(doc) if doc is not None else []
+
+    def products(self, doc):
+        for product in self._products(doc) if doc is not None else []:
+            setbg = self._product_setbg(product)
+            yield (setbg[0] if setbg else None), self._product_hrefs(product)
+
+
+class _SelectolaxBackend:
+    """selectolax（lexbor）"""
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self._parser(html)
+
+    def list_nodes(self, doc):
+        # 同時符合兩個選擇器的節點（例如帶 data-setbg 的 h6）會出現兩次
+        seen = set()
+        for node in doc.css("h5, h6, [data-setbg]"):
+            if node.mem_id not in seen:
+                seen.add(node.mem_id)
+                yield node
+
+    def tag(self, node):
+        return node.tag
+
+    def setbg(self, node):
+        attributes = node.attributes
+        if "data-setbg" not in attributes:
+            return None
+        return attributes["data-setbg"] or ""  # 沒有值的屬性是 None，bs4 為 ""
+
+    def text(self, node):
+        if node.css_first("script, style") is None:
+            return node.text(deep=True, separator="", strip=True)
+        # 與 bs4 的 get_text() 相同：不含 <script> / <style> 裡的文字
+        parts = []
+        for child in node.traverse(include_text=True):
+            if child.tag != "-text":
+                continue
+            parent = child.parent
+            while parent is not None and parent.mem_id != node.mem_id and parent.tag not in ("script", "style"):
+                parent = parent.parent
+            if parent is not None and parent.mem_id == node.mem_id:
+                parts.append(child.text_content.strip())
+        return "".join(parts)
+
+    def pagination_hrefs(self, doc):
+        return [a.attributes["href"] for a in doc.css(PAGINATION_SELECTOR)]
+
+    def products(self, doc):
+        for product in doc.css(".product__item"):
+            # node.css() 也會比對節點本身，bs4 的 find() 只找子孫
+            setbg = next((self.setbg(n) for n in product.css("[data-setbg]") if n.mem_id != product.mem_id), None)
+            yield setbg, [a.attributes["href"] or "" for a in product.css("a[href]") if a.mem_id != product.mem_id]
+
+
+PAGINATION_SELECTOR = ".product__pagination a[href], a[rel~=next][href]"
+BACKENDS = {"selectolax": _SelectolaxBackend, "lxml": _LxmlBackend, "bs4": _Bs4Backend}
+# 解析器物件（含編譯好的 XPath）每個執行緒各一份
+_backends = threading.local()
+
+
+def get_backend(name: str = None):
+    """取得解析器；auto 依序使用已安裝的 selectolax、lxml，都沒有時用 bs4"""
+    name = (name or PARSER).lower()
+    cache = _backends.__dict__
+    if name not in cache:
+        if name == "auto":
+            for candidate in BACKENDS:
+                try:
+                    cache[name] = get_backend(candidate)
+                    break
+                except ImportError:
+                    continue
+        elif name in BACKENDS:
+            cache[name] = BACKENDS[name]()
+        else:
+            raise ValueError(f"不支援的解析器：{name}（可用：auto、{'、'.join(BACKENDS)}）")
+    return cache[name]
+
+
+def _list_items(backend, doc, base_url: str):
+    """依文件順序走一次 h5 / h6 / data-setbg 節點，把每個圖片區塊配上之後最近的 h6 與再之後最近的 h5
+    （結果與逐個區塊呼叫 find_next("h6") / find_next("h5") 相同，但不會每個區塊都往後掃描）"""
+    blocks = []         # [圖片區塊的 data-setbg, 名稱節點, 價格節點]，依文件順序
+    need_name = []      # 還在等 h6 的區塊
+    need_price = []     # 已有名稱、還在等 h5 的區塊
+    for node in backend.list_nodes(doc):
+        tag = backend.tag(node)
+        # 同一個節點若也帶 data-setbg，它要配的是「之後」的 h6 / h5，所以先處理標題
+        if tag == "h5":
+            for block in need_price:
+                block[2] = node
+            need_price = []
+        elif tag == "h6":
+            for block in need_name:
+                block[1] = node
+            need_price.extend(need_name)
+            need_name = []
+        setbg = backend.setbg(node)
+        if setbg is not None:
+            block = [setbg, None, None]
+            blocks.append(block)
+            need_name.append(block)
+
+    texts = {}
+
+    def text(node):
+        # 多個區塊可能配到同一個 h6 / h5，文字只取一次（node 留在 blocks 中，id 不會被重用）
+        key = id(node)
+        if key not in texts:
+            texts[key] = backend.text(node)
+        return texts[key]
+
+    items = []
+    for setbg, name_tag, price_tag in blocks:
+        if name_tag is None or price_tag is None:
             continue
 
-        name = name_tag.get_text(strip=True)
-        price = price_tag.get_text(strip=True)
+        name = text(name_tag)
+        price = text(price_tag)
 
         # 只保留衣服 / 褲子
         category = guess_category(name)
         if category == "other":
             continue
 
-        img_rel = img_block.get("data-setbg", "").strip()
+        img_rel = setbg.strip()
         if not img_rel:
             continue
 
-        image_url = urljoin(BASE_URL, img_rel)
-
-        color = guess_color(name)
-
         items.append({
             "name": name,
             "category": category,
-            "color": color,
+            "color": guess_color(name),
             "price": price,
-            "image_url": image_url,
+            "image_url": urljoin(base_url, img_rel),
         })
-
-    return items
+    return len(blocks), items
 
 
-def save_to_csv(items, filename="items_malefashion.csv"):
-    if not items:
-        print("沒有資料，CSV 不會產生。")
-        return
-
-    fieldnames = ["sku", "name", "category", "color", "price", "image_url"]
-
-    with open(filename, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for idx, item in enumerate(items, start=1):
-            sku = f"MF-{idx:03d}"
-            writer.writerow({
-                "sku": sku,
-                "name": item["name"],
-                "category": item["category"],
-                "color": item["color"],
-                "price": item["price"],
-                "image_url": item["image_url"],
-            })
-
-    print(f"已寫入 {len(items)} 筆商品到 {filename}")
-
-
-def augment_items(items, target_count: int):
-    """如果 items 筆數小於 target_count，就用現有 items 製造變體來補足。
-
-    變體策略：重複現有商品，對名稱加上 (Variant N)，並隨機調整價格 +/-15%。
-    這是為了在測試或資料準備階段快速產生較多的商品；長期應改為爬多個分頁或更多來源。
-    """
-    if not items:
-        return items
-
-    out = list(items)
-    i = 0
-    while len(out) < target_count:
-        base = items[i % len(items)]
-        new = base.copy()
-
-        variant_num = len(out) + 1
-        new['name'] = f"{base['name']} (Variant {variant_num})"
-
-        # 嘗試解析數字價格並隨機調整
-        price_text = base.get('price', '')
-        m = re.search(r"[\d\.,]+", price_text)
-        if m:
-            raw = m.group(0).replace(',', '')
-            try:
-                pv = float(raw)
-                change = random.uniform(-0.15, 0.15)
-                new_price = max(0.5, pv * (1 + change))
-                new['price'] = f"${new_price:,.2f}"
-            except Exception:
-                new['price'] = price_text
-        else:
-            new['price'] = price_text
+def _list_links(backend, doc, page_url: str):
+    pages = []
+    for href in backend.pagination_hrefs(doc):
+        url = _link(page_url, href)
+        if url and url not in pages:
+            pages.append(url)
 
-        # 小幅調整 color 保持一致（可擴充）
-        new['color'] = base.get('color', '')
+    details = {}
+    for setbg, hrefs in backend.products(doc):
+        if setbg is None:
+            continue
+        for href in hrefs:
+            url = _link(page_url, href)
+            if url:
+                details[urljoin(page_url, setbg.strip())] = url
+                break
+    return pages, details
+
+
+def parse_list_page(html: str, base_url: str = BASE_URL, parser: str = None):
+    # 這個模板的商品圖片區塊會有 data-setbg 屬性，往後最近的 h6 是商品名稱、再往後最近的 h5 是價格
+    backend = get_backend(parser)
+    _, items = _list_items(backend, backend.parse(html), base_url)
+    return items
 
-        out.append(new)
-        i += 1
 
-    return out
+def _link(page_url: str, href) -> str:
+    """href → 絕對網址（去掉 #片段）；"#"、javascript: 之類不是頁面的連結回傳空字串"""
+    href = (href or "").strip()
+    if not href or href.startswith(("#", "javascript:", "mailto:")):
+        return ""
+    return urldefrag(urljoin(page_url, href))[0]
 
 
-def main():
-    html = fetch_html(LIST_URL)
-    items = parse_list_page(html)
-    print(f"實際留下 {len(items)} 筆『服飾』商品，預覽前幾筆：")
-    for i, item in enumerate(items[:5], start=1):
-        print(f"{i}. {item['name']} | {item['price']} | {item['category']} | {item['color']}")
-        print(f"   img: {item['image_url']}")
-        print("-" * 50)
+def parse_list(html: str, page_url: str, parser: str = None):
+    """列表頁只解析一次，回傳 (商品, 分頁連結, 圖片網址 → 詳細頁網址)"""
+    backend = get_backend(parser)
+    doc = backend.parse(html)
+    _, items = _list_items(backend, doc, page_url)
+    pages, details = _list_links(backend, doc, page_url)
+    return items, pages, details
 
-    # 如果筆數不足，就用簡單變體補足到 TARGET_COUNT
-    if len(items) < TARGET_COUNT:
-        print(f"筆數 {len(items)} 少於 TARGET_COUNT={TARGET_COUNT}，將使用 augment_items 補足。")
-        items = augment_items(items, TARGET_COUNT)
-        print(f"補足後共有 {len(items)} 筆（含變體）。")
 
-    save_to_csv(items)
+def parse_detail_page(html: str, page_url: str = BASE_URL):
+    """商品詳細頁：名稱、說明、尺寸，以及從說明找到的顏色"""
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.select_one(".product__details__text")
+    if text is None:
+        return {}
+    name = text.find("h4")
+    description = text.find("p")
+    description = description.get_text(" ", strip=True) if description else ""
+    sizes = [label.get_text(strip=True) for label in text.select(".product__details__option__size label")]
+    return {
+        "name": name.get_text(strip=True) if name else "",
+        "description": description,
+        "sizes": sizes,
+        "color": guess_color(description),
+    }
+
+
+def parse_page(kind: str, html: str, url: str, parser: str = None) -> dict:
+    if kind == "detail":
+        return parse_detail_page(html, url)
+    items, pages, details = parse_list(html, url, parser)
+    return {"items": items, "pages": pages, "details": details}
+
+
+def load_state(path: str) -> dict:
+    """狀態檔：pages（每頁的 ETag / Last-Modified 與解析結果）、run（未完成的這次執行）"""
+    state = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    state.setdefault("pages", {})
+    state.setdefault("run", None)
+    return state
+
+
+def save_state(path: str, state: dict):
+    # 先寫暫存檔再改名，存到一半當機也不會弄壞原本的狀態檔
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class CsvSink:
+    """逐筆寫出 CSV；append=True 時接在既有檔案後面，並回傳已寫過的圖片網址（續跑時略過）"""
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.written = set()
+        append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if append:
+            self._truncate_partial_line()
+            with open(path, "r", newline="", encoding="utf-8-sig") as f:
+                self.written = {row.get("image_url") for row in csv.DictReader(f)}
+        self.f = open(path, "a" if append else "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.DictWriter(self.f, fieldnames=FIELDNAMES)
+        if not append:
+            self.writer.writeheader()
+
+    def _truncate_partial_line(self):
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+
+    def write(self, row: dict):
+        self.writer.writerow(row)
+
+    def flush(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class MysqlSink:
+    """累積到 batch_size 筆（或存狀態檔時）以 load_items_mysql 的正規化與 UPSERT 寫入 items 表（依 sku 冪等）"""
+
+    def __init__(self, batch_size: int = 500):
+        import pandas as pd
+        import load_items_mysql
+
+        self.pd = pd
+        self.loader = load_items_mysql
+        # 連線設定與 load_items_mysql.py 相同（環境變數）
+        self.conn = load_items_mysql.connect(argparse.Namespace(
+            host=os.getenv("DB_HOST", "127.0.0.1"), port=int(os.getenv("DB_PORT", "3306")),
+            user=os.getenv("DB_USER", "root"), password=os.getenv("DB_PASS", "rootpassword"),
+            database=os.getenv("DB_NAME", "outfit_db")))
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = set()
+
+    def write(self, row: dict):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        df = self.loader.normalize_chunk(self.pd.DataFrame(self.rows, columns=FIELDNAMES, dtype=str))
+        with self.conn.cursor() as cur:
+            cur.executemany(self.loader.UPSERT_SQL, self.loader.to_rows(df))
+        self.conn.commit()
+        self.rows = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+
+class Crawler:
+    def __init__(self, start_url: str, sink, state: dict, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_pages: int = MAX_PAGES, timeout: float = 15, save=None, parser: str = None):
+        """
+        Args:
+            start_url: 第一個列表頁
+            sink: 有 write(row) / flush() 的輸出（CsvSink、MysqlSink）
+            state: load_state() 的結果；爬的過程中會更新
+            concurrency: 同時進行的請求數上限
+            max_pages: 最多爬幾個列表頁
+            save: save(state)，每隔 SAVE_INTERVAL 秒與結束時呼叫
+            parser: 列表頁解析器（None 表示 CRAWLER_PARSER）
+        """
+        self.start_url = start_url
+        self.host = urlparse(start_url).netloc
+        self.sink = sink
+        self.state = state
+        self.concurrency = max(1, concurrency)
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.save = save or (lambda state: None)
+        self.parser = parser
+        self._local = threading.local()
+
+        run = state.get("run") or {}
+        self.fetched = set(run.get("fetched", []))  # 本次已抓過的頁面（續跑時直接用快取）
+        self.emitted = set(run.get("emitted", [])) | getattr(sink, "written", set())
+        self.details = {}   # 詳細頁網址 -> 解析結果
+        self.waiting = {}   # 詳細頁網址 -> 等著它的商品
+        self.queued = set()
+        self.list_pages = 0
+
+        self.fetched_pages = 0
+        self.not_modified = 0
+        self.resumed = 0
+        self.items = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def _session(self):
+        # requests.Session 不保證執行緒安全，每個執行緒各用一個（各自重用連線）
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def _fetch(self, kind: str, url: str, cached, reuse: bool):
+        """在工作執行緒中執行：回傳 (kind, url, 快取項目, 狀態)"""
+        if cached and reuse:
+            return kind, url, cached, "resumed"
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        resp = self._session().get(url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304 and cached:
+            return kind, url, cached, "not_modified"
+        resp.raise_for_status()
+        if "charset" not in resp.headers.get("Content-Type", "").lower():
+            # 沒有宣告編碼時 requests 會當成 ISO-8859-1，改用內容偵測
+            resp.encoding = resp.apparent_encoding
+        entry = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "result": parse_page(kind, resp.text, url, self.parser),
+        }
+        return kind, url, entry, "fetched"
+
+    def _same_site(self, url: str) -> bool:
+        return urlparse(url).netloc == self.host
+
+    def _emit(self, item: dict, detail=None):
+        key = item["image_url"]
+        if key in self.emitted:
+            self.skipped += 1
+            return
+        if detail and not item.get("color"):
+            item = dict(item, color=detail.get("color", ""))
+        self.sink.write({"sku": make_sku(key), **{k: item.get(k, "") for k in FIELDNAMES[1:]}})
+        self.emitted.add(key)
+        self.items += 1
+
+    def _checkpoint(self):
+        # 先把商品寫出再存狀態：狀態檔記為已寫出的商品一定已經在輸出裡
+        self.sink.flush()
+        self.state["run"] = {"fetched": sorted(self.fetched), "emitted": sorted(self.emitted)}
+        self.save(self.state)
+
+    def run(self):
+        pending = set()
+        last_save = time.monotonic()
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            def submit(kind, url):
+                if url in self.queued or not self._same_site(url):
+                    return
+                if kind == "list":
+                    if self.list_pages >= self.max_pages:
+                        return
+                    self.list_pages += 1
+                self.queued.add(url)
+                pending.add(pool.submit(self._fetch, kind, url, self.state["pages"].get(url), url in self.fetched))
+
+            submit("list", self.start_url)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    try:
+                        kind, url, entry, status = future.result()
+                    except Exception as e:
+                        self.errors += 1
+                        print(f"⚠️ 抓取失敗：{e}", file=sys.stderr)
+                        self._fail_details(pending)
+                        continue
+                    self.state["pages"][url] = entry
+                    self.fetched.add(url)
+                    if status == "not_modified":
+                        self.not_modified += 1
+                    elif status == "resumed":
+                        self.resumed += 1
+                    else:
+                        self.fetched_pages += 1
+                    self._handle(kind, url, entry["result"], submit)
+
+                self._fail_details(pending)
+                if time.monotonic() - last_save >= SAVE_INTERVAL:
+                    self._checkpoint()
+                    last_save = time.monotonic()
+
+        self._checkpoint()
+        if not self.errors:
+            # 全部成功才算完成；有失敗的頁面時保留 run，下次執行只重抓失敗的部分
+            self.state["run"] = None
+            self.save(self.state)
+        return self.stats()
+
+    def _handle(self, kind: str, url: str, result: dict, submit):
+        if kind == "detail":
+            self.details[url] = result
+            for item in self.waiting.pop(url, []):
+                self._emit(item, result)
+            return
+
+        for page in result.get("pages", []):
+            submit("list", page)
+        details = result.get("details", {})
+        for item in result.get("items", []):
+            detail_url = details.get(item["image_url"])
+            if not detail_url or not self._same_site(detail_url) or item["image_url"] in self.emitted:
+                self._emit(item)
+            elif detail_url in self.details:
+                self._emit(item, self.details[detail_url])
+            else:
+                self.waiting.setdefault(detail_url, []).append(item)
+                submit("detail", detail_url)
+
+    def _fail_details(self, pending):
+        # 詳細頁抓取失敗（或沒有排進佇列）時，等著它的商品直接寫出（不補顏色）
+        if pending:
+            return
+        for url in list(self.waiting):
+            for item in self.waiting.pop(url):
+                self._emit(item)
+
+    def stats(self):
+        return {
+            "list_pages": self.list_pages,
+            "fetched": self.fetched_pages,
+            "not_modified": self.not_modified,
+            "resumed": self.resumed,
+            "items": self.items,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬取 malefashion 商品（分頁、詳細頁、條件式請求、可續跑）")
+    parser.add_argument("--start-url", default=LIST_URL, help="第一個列表頁")
+    parser.add_argument("-o", "--output", default=OUTPUT, help="輸出 CSV")
+    parser.add_argument("--state", default=STATE_FILE, help="狀態檔（ETag 快取、續跑進度）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同時進行的請求數")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="最多爬幾個列表頁")
+    parser.add_argument("--parser", choices=["auto", *BACKENDS], default=None,
+                        help="列表頁解析器（預設 CRAWLER_PARSER 環境變數或 auto）")
+    parser.add_argument("--mysql", action="store_true", help="直接寫入 MySQL items 表（不輸出 CSV）")
+    parser.add_argument("--restart", action="store_true", help="忽略未完成的進度，重新輸出整份")
+    parser.add_argument("--fixtures", metavar="DIR", help="以本機伺服器提供 DIR 中存下來的 HTML，從 shop.html 開始爬")
+    args = parser.parse_args(argv)
+
+    state = load_state(args.state)
+    if args.restart:
+        state["run"] = None
+    resume = state["run"] is not None
+    if resume:
+        print("↩️ 續跑上次未完成的爬取", file=sys.stderr)
+
+    server = None
+    start_url = args.start_url
+    if args.fixtures:
+        from fixture_server import serve
+        server = serve(args.fixtures, port=FIXTURES_PORT)
+        start_url = urljoin(server.url, "shop.html")
+
+    sink = MysqlSink() if args.mysql else CsvSink(args.output, append=resume)
+    crawler = Crawler(start_url, sink, state, args.concurrency, args.max_pages,
+                      save=lambda s: save_state(args.state, s), parser=args.parser)
+    try:
+        stats = crawler.run()
+    finally:
+        sink.close()
+        if server is not None:
+            server.shutdown()
+    print(f"✅ 寫出 {stats['items']} 筆商品到 {'MySQL' if args.mysql else args.output}：{stats}")
+    if server is not None:
+        print(f"   本機伺服器回應：{dict(server.stats)}")
 
 
 if __name__ == "__main__":
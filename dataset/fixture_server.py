@@ -0,0 +1,80 @@
+"""
+離線測試用的本機 HTTP 伺服器：提供存下來的 HTML（例如 fixtures/malefashion/）
+- 回應帶 ETag 與 Last-Modified，收到相符的 If-None-Match / If-Modified-Since 時回 304，用來驗證爬蟲的條件式請求
+- 依狀態碼統計請求次數（server.stats）
+
+用法：
+    python fixture_server.py fixtures/malefashion --port 8000
+"""
+
+import argparse
+import functools
+import os
+import threading
+from collections import Counter
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "malefashion")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive，爬蟲的連線池才會重用連線
+    etag = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        self.etag = None
+        if os.path.isfile(path):
+            st = os.stat(path)
+            self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                # 有 If-None-Match 時以它為準，不再看 If-Modified-Since
+                del self.headers["If-Modified-Since"]
+                if self.etag in [tag.strip() for tag in if_none_match.split(",")]:
+                    self.send_response(304)
+                    self.end_headers()
+                    return None
+        return super().send_head()
+
+    def end_headers(self):
+        if self.etag:
+            self.send_header("ETag", self.etag)
+        super().end_headers()
+
+    def log_request(self, code="-", size="-"):
+        self.server.stats[int(code) if str(code).isdigit() else code] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory: str = FIXTURES_DIR, host: str = "127.0.0.1", port: int = 0):
+    """在背景執行緒啟動伺服器並回傳（port=0 表示自動挑選可用的埠）；server.url 為根網址"""
+    handler = functools.partial(FixtureHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = Counter()
+    server.url = f"http://{host}:{server.server_address[1]}/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="提供存下來的 HTML（支援 ETag / Last-Modified）")
+    parser.add_argument("directory", nargs="?", default=FIXTURES_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    server = serve(args.directory, args.host, args.port)
+    print(f"📂 {args.directory} → {server.url}（Ctrl+C 結束）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"請求統計：{dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
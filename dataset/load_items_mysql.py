@@ -0,0 +1,254 @@
+"""
+把 dataset 的 CSV 匯入 MySQL items 表
+- 以 chunksize 串流讀取（百萬筆也不會整份載入記憶體），每個 chunk 以整欄運算正規化：
+  category：Kaggle articleType（Shirts、Jeans...）或 top / bottom... 對應到 items.category ENUM，
+            對應不到時依名稱關鍵字判斷，仍無法判斷的列略過
+  color：去空白，空白時從名稱找顏色字
+  price：去掉 $ 與千分位轉成數字（兩位小數），空白為 NULL
+- 以多列 INSERT ... ON DUPLICATE KEY UPDATE 分批寫入（依 sku 冪等，重跑不會重複），每個 chunk 一個交易；
+  寫入前先鎖定並讀出已存在的列，只寫入新增或內容有變的列
+- 匯入期間 SET @skip_catalog_triggers = 1 略過 items 的逐列 trigger（每列都會搶 catalog_version 的鎖），
+  改為每個 chunk 遞增一次型錄版本，並以 INSERT ... SELECT 只記錄有變的列（重跑相同資料不會寫入異動紀錄，
+  快照與向量索引也不需要重建）
+- --defer-indexes：匯入前先移除 items 的次要索引，匯入後一次建回（大量匯入時較快；sku 唯一索引保留）
+
+用法：
+    python load_items_mysql.py items_fashion_small_clean.csv items_malefashion.csv
+    python load_items_mysql.py big.csv --chunk-size 50000 --batch-size 2000 --defer-indexes
+連線設定讀取環境變數 DB_HOST / DB_PORT / DB_USER / DB_PASS / DB_NAME（或命令列參數）
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import pymysql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask_app'))
+
+from outfit_generator import ARTICLE_TYPE_SLOTS, SLOTS  # noqa: E402
+
+COLUMNS = ["sku", "name", "category", "color", "price", "image_url"]
+# items 欄位長度
+MAX_LEN = {"sku": 50, "name": 100, "color": 50, "image_url": 255}
+
+# 類別對應不到時，依名稱關鍵字判斷（依序比對，先符合者優先）；英文以 \b 比對整個字，
+# 避免 "Chatter" 裡的 hat、"Belted" 裡的 belt 這類子字串誤判，"short sleeve" / "tie-dye" 另外排除
+NAME_CATEGORY_PATTERNS = [
+    ("outer", r"\b(?:jackets?|coats?|blazers?|parkas?|cardigans?)\b|外套|夾克|大衣"),
+    ("shoes", r"\b(?:shoes?|sneakers?|boots?|heels?|sandals?|loafers?|flip[ -]?flops?)\b|鞋"),
+    ("bottom", r"\b(?:jeans?|pants?|trousers?|skirts?|leggings?)\b|\bshorts?\b(?![ -]?sleeves?)|褲|裙"),
+    ("accessory", r"\b(?:watch(?:es)?|belts?|bags?|caps?|hats?|wallets?|sunglass(?:es)?|scarf|scarves)\b"
+                  r"|\bties?\b(?![ -]?dye)|帽|包|錶"),
+    ("top", r"\b(?:shirts?|tees?|t-shirts?|tops?|hoodies?|sweaters?|polos?|kurtas?)\b|上衣|襯衫"),
+]
+COLOR_PATTERN = (r"\b(black|white|blue|navy|red|green|brown|grey|gray|yellow|beige|pink|purple|"
+                 r"orange|maroon|olive|khaki|cream|silver|gold)\b")
+
+UPSERT_SQL = (
+    "INSERT INTO items (sku, name, category, color, price, image_url) VALUES (%s, %s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE name = VALUES(name), category = VALUES(category), "
+    "color = COALESCE(VALUES(color), color), price = COALESCE(VALUES(price), price), "
+    "image_url = VALUES(image_url)"
+)
+
+# 每個 chunk 自行記錄異動（取代匯入期間略過的 trigger，見 init/outfit_db.sql）
+BUMP_VERSION_SQL = "UPDATE catalog_version SET version = version + 1 WHERE id = 1"
+LOG_CHANGES_SQL = "INSERT INTO catalog_changes (table_name, row_id) SELECT 'items', id FROM items WHERE sku IN ({})"
+EXISTING_SQL = "SELECT sku, name, category, color, price, image_url FROM items WHERE sku IN ({}) FOR UPDATE"
+
+# --defer-indexes 時先移除、匯入後建回的次要索引（與 init/outfit_db.sql 一致）
+SECONDARY_INDEXES = {
+    "idx_items_category_id": "(category, id)",
+    "idx_items_color_norm_id": "(color_norm, id)",
+    "idx_items_category_color_id": "(category, color_norm, id)",
+}
+
+
+def _blank_to_na(s: pd.Series) -> pd.Series:
+    s = s.str.strip()
+    return s.mask(s == "")
+
+
+def normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """整欄正規化；回傳可寫入 items 的列（缺 sku / name / 類別的列已移除）"""
+    df = df.reindex(columns=COLUMNS)
+    for col in COLUMNS:
+        df[col] = _blank_to_na(df[col].astype("string"))
+
+    # category：ENUM 值直接使用，其次 articleType 對照表（類別種類很少，只對不重複的值查表）
+    lookup = {}
+    for value in df["category"].dropna().unique():
+        key = value.lower()
+        lookup[value] = key if key in SLOTS else ARTICLE_TYPE_SLOTS.get(key)
+    category = df["category"].map(lookup).astype("string")
+
+    # 仍對應不到的列才看名稱關鍵字
+    missing = category.isna() & df["name"].notna()
+    if missing.any():
+        names = df.loc[missing, "name"].str.lower()
+        guessed = pd.Series(pd.NA, index=names.index, dtype="string")
+        for slot, pattern in NAME_CATEGORY_PATTERNS:
+            guessed = guessed.mask(guessed.isna() & names.str.contains(pattern, regex=True), slot)
+        category = category.fillna(guessed)
+    df["category"] = category
+
+    # color：空白時從名稱找顏色字（只處理缺顏色的列）
+    missing = df["color"].isna() & df["name"].notna()
+    if missing.any():
+        found = df.loc[missing, "name"].str.lower().str.extract(COLOR_PATTERN, expand=False).str.title()
+        df["color"] = df["color"].fillna(found)
+
+    # price：只留數字與小數點，轉換失敗或空白為 NULL
+    price = pd.to_numeric(df["price"].str.replace(r"[^0-9.\-]", "", regex=True), errors="coerce")
+    df["price"] = price.round(2)
+
+    for col, length in MAX_LEN.items():
+        df[col] = df[col].str.slice(0, length)
+
+    df = df.dropna(subset=["sku", "name", "category"])
+    # 同一個檔案裡重複的 sku 以最後一筆為準（與 ON DUPLICATE KEY UPDATE 的結果一致）
+    return df.drop_duplicates("sku", keep="last")
+
+
+def to_rows(df: pd.DataFrame):
+    """DataFrame → executemany 的參數（NA 轉成 None）"""
+    price = df["price"].to_numpy(dtype=object)
+    price[pd.isna(df["price"]).to_numpy()] = None
+    columns = [df[c].astype(object).where(df[c].notna(), None).to_numpy() for c in ("sku", "name", "category",
+                                                                                     "color")]
+    image = df["image_url"].astype(object).where(df["image_url"].notna(), None).to_numpy()
+    return list(zip(*columns, price, image))
+
+
+def connect(args):
+    return pymysql.connect(host=args.host, port=args.port, user=args.user, password=args.password,
+                           db=args.database, charset="utf8mb4", autocommit=False)
+
+
+def drop_secondary_indexes(cur):
+    cur.execute("SELECT DISTINCT index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'items'")
+    existing = {row[0] for row in cur.fetchall()}
+    dropped = [name for name in SECONDARY_INDEXES if name in existing]
+    if dropped:
+        cur.execute("ALTER TABLE items " + ", ".join(f"DROP INDEX {name}" for name in dropped))
+    return dropped
+
+
+def add_secondary_indexes(cur, names):
+    if names:
+        cur.execute("ALTER TABLE items " + ", ".join(f"ADD INDEX {name} {SECONDARY_INDEXES[name]}"
+                                                     for name in names))
+
+
+def _unchanged(row, old) -> bool:
+    """寫入 row 後 items 的內容是否與 old 相同（與 UPSERT_SQL 一致：新值為 NULL 的 color / price 保留舊值）"""
+    _, name, category, color, price, image_url = row
+    return (name == old[1] and category == old[2] and image_url == old[5]
+            and (color is None or color == old[3])
+            and (price is None or (old[4] is not None and float(old[4]) == float(price))))
+
+
+def changed_rows(cur, rows, batch_size):
+    """鎖定並讀出已存在的列，只回傳新增或內容會改變的列"""
+    changed = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cur.execute(EXISTING_SQL.format(", ".join(["%s"] * len(batch))), [row[0] for row in batch])
+        existing = {old[0]: old for old in cur.fetchall()}
+        changed.extend(row for row in batch if row[0] not in existing or not _unchanged(row, existing[row[0]]))
+    return changed
+
+
+def write_chunk(conn, rows, batch_size):
+    """一個交易寫入一個 chunk 中新增或內容有變的列，回傳寫入列數；
+    有寫入時遞增一次型錄版本，並只記錄這些列的異動"""
+    try:
+        with conn.cursor() as cur:
+            rows = changed_rows(cur, rows, batch_size)
+            for start in range(0, len(rows), batch_size):
+                cur.executemany(UPSERT_SQL, rows[start:start + batch_size])
+            if rows:
+                # 與 trigger 相同：先鎖版本列再寫異動紀錄，catalog_changes 的序號依提交順序
+                cur.execute(BUMP_VERSION_SQL)
+                for start in range(0, len(rows), batch_size):
+                    skus = [row[0] for row in rows[start:start + batch_size]]
+                    cur.execute(LOG_CHANGES_SQL.format(", ".join(["%s"] * len(skus))), skus)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def load_file(conn, path, chunk_size, batch_size, dry_run=False):
+    """匯入一個 CSV，回傳 (讀取列數, 寫入列數, 略過列數)；寫入列數含內容未變的列，實際有變的列另外顯示"""
+    read = written = skipped = changed = 0
+    started = time.perf_counter()
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig",
+                         usecols=lambda c: c in COLUMNS, chunksize=chunk_size)
+    for chunk in reader:
+        read += len(chunk)
+        df = normalize_chunk(chunk)
+        skipped += len(chunk) - len(df)
+        rows = to_rows(df)
+        if not dry_run and rows:
+            changed += write_chunk(conn, rows, batch_size)
+        written += len(rows)
+        elapsed = time.perf_counter() - started
+        print(f"  {path}: 已讀 {read:,} 列，寫入 {written:,}（有變 {changed:,}），略過 {skipped:,}"
+              f"（{read / elapsed:,.0f} 列/秒）", file=sys.stderr)
+    return read, written, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CSV → MySQL items（依 sku 冪等）")
+    parser.add_argument("files", nargs="+", help="CSV 檔（欄位 sku,name,category,color,price,image_url）")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="每次讀取的列數（一個交易）")
+    parser.add_argument("--batch-size", type=int, default=2000, help="每個多列 INSERT 的列數")
+    parser.add_argument("--defer-indexes", action="store_true", help="匯入期間移除次要索引，結束後一次建回")
+    parser.add_argument("--dry-run", action="store_true", help="只讀取與正規化，不寫入資料庫")
+    parser.add_argument("--host", default=os.getenv("DB_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DB_PORT", "3306")))
+    parser.add_argument("--user", default=os.getenv("DB_USER", "root"))
+    parser.add_argument("--password", default=os.getenv("DB_PASS", "rootpassword"))
+    parser.add_argument("--database", default=os.getenv("DB_NAME", "outfit_db"))
+    args = parser.parse_args(argv)
+
+    conn = None if args.dry_run else connect(args)
+    dropped = []
+    started = time.perf_counter()
+    total_read = total_written = total_skipped = 0
+    try:
+        if conn is not None:
+            with conn.cursor() as cur:
+                # 只影響這個連線；型錄版本與異動紀錄改由 write_chunk 每個 chunk 寫一次
+                cur.execute("SET @skip_catalog_triggers = 1")
+        if args.defer_indexes and conn is not None:
+            with conn.cursor() as cur:
+                dropped = drop_secondary_indexes(cur)
+            print(f"⏸️ 暫時移除索引：{dropped}", file=sys.stderr)
+        for path in args.files:
+            read, written, skipped = load_file(conn, path, args.chunk_size, args.batch_size, args.dry_run)
+            total_read += read
+            total_written += written
+            total_skipped += skipped
+    finally:
+        if dropped:
+            index_started = time.perf_counter()
+            with conn.cursor() as cur:
+                add_secondary_indexes(cur, dropped)
+            print(f"▶️ 重建索引 {time.perf_counter() - index_started:.1f} 秒", file=sys.stderr)
+        if conn is not None:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ 讀取 {total_read:,} 列，寫入 {total_written:,}，略過 {total_skipped:,}，"
+          f"共 {elapsed:.1f} 秒（{total_read / max(elapsed, 1e-9):,.0f} 列/秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,67 @@
+import sys
+
 import pandas as pd
 
-# 讀 Kaggle 的 styles.csv（圖片檔在 images/ 資料夾）
+# 讀 Kaggle 的 styles.csv（圖片檔在 images/ 資料夾），一次產生最終的 items_fashion_small_clean.csv
+# （原本 clean_items_fashion_small.py 的欄位篩選已併入）
 STYLES_CSV = "styles.csv"
+OUTPUT = "items_fashion_small_clean.csv"
 
-df = pd.read_csv(STYLES_CSV, on_bad_lines="skip")
+# 你不一定要全部 44k，先取 5000 筆也可以
+LIMIT = 5000
 
-# 只保留我們要用的欄位
-def build_items(df):
-    rows = []
+# 需要的欄位；全部當字串讀（不做型別推斷）
+# 注意：不能用 read_csv(usecols=...)，指定 usecols 時欄位過多的列不會被視為格式錯誤而略過，結果會和原本不同
+USECOLS = ["id", "productDisplayName", "articleType", "baseColour"]
+COLUMNS = ["sku", "name", "category", "color", "price", "image_url"]
+# read_csv 預設視為缺值的字串（見 pandas 文件 read_csv 的 na_values；不匯入 pandas 內部模組）
+NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
 
-    for _, row in df.iterrows():
-        sku = str(row["id"])
-        name = str(row.get("productDisplayName", "")).strip()
 
-        # 這邊先用 articleType 當 category（之後你要再 mapping 成 top/bottom/outer也可以）
-        category = str(row.get("articleType", "")).strip()
-        color = str(row.get("baseColour", "")).strip()
+def _text(s: pd.Series) -> pd.Series:
+    """等同逐列的 str(value).strip()（缺值變成 "nan"）"""
+    return s.astype(str).str.strip()
 
-        # 這份 dataset 沒有價格，先留空或之後自己生
-        price = ""
 
+def build_items(df: pd.DataFrame) -> pd.DataFrame:
+    """整欄運算產生 items 欄位"""
+    sku = df["id"].astype(str)
+    items = pd.DataFrame({
+        "sku": sku,
+        "name": _text(df["productDisplayName"]),
+        # 這邊先用 articleType 當 category（之後你要再 mapping 成 top/bottom/outer也可以）
+        "category": _text(df["articleType"]),
+        "color": _text(df["baseColour"]),
+        # 這份 dataset 沒有價格，先留空或之後自己生
+        "price": "",
         # 圖片檔通常是 images/<id>.jpg，你之後可以把 images/ 這個資料夾當成靜態服務目錄
-        image_url = f"images/{sku}.jpg"
+        "image_url": "images/" + sku + ".jpg",
+    }, columns=COLUMNS)
+    # 舊流程先寫出中間檔、再用 read_csv 讀回來，"nan"、"NA"、"None" 等字串會變成空白；這裡直接比照
+    return items.mask(items.isin(NA_STRINGS), "")
 
-        source = "kaggle_fashion_small"
-        url = ""  # 原始商品頁網址不可得，先留空
 
-        rows.append({
-            "sku": sku,
-            "name": name,
-            "category": category,
-            "color": color,
-            "price": price,
-            "image_url": image_url,
-            "source": source,
-            "url": url,
-        })
+def read_styles(path: str, limit: int = LIMIT, chunksize: int = 2000):
+    """分塊讀取 styles.csv，讀滿 limit 筆就停止（格式錯誤的列略過，與原本相同）"""
+    chunks, total = [], 0
+    reader = pd.read_csv(path, dtype=str, on_bad_lines="skip", chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            chunks.append(chunk.loc[:, USECOLS].head(limit - total))
+            total += len(chunks[-1])
+            if total >= limit:
+                break
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=USECOLS)
 
-    return pd.DataFrame(rows)
 
-items_df = build_items(df)
+def main(styles_csv: str = STYLES_CSV, output: str = OUTPUT, limit: int = LIMIT):
+    items_df = build_items(read_styles(styles_csv, limit))
+    items_df.to_csv(output, index=False, encoding="utf-8-sig")
+    print(f"輸出 {output}，筆數：", len(items_df))
 
-# 你不一定要全部 44k，先取 5000 筆也可以
-items_df = items_df.head(5000)
 
-items_df.to_csv("items_fashion_small.csv", index=False, encoding="utf-8-sig")
-print("輸出 items_fashion_small.csv，筆數：", len(items_df))
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,102 @@
+# 爬蟲離線測試：以 fixture_server 提供 fixtures/malefashion，驗證商品、ETag / 304 與中斷續跑
+#     python -m unittest test_crawl_malefashion_items
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import urljoin
+
+import crawl_malefashion_items as crawler_module
+from crawl_malefashion_items import Crawler, CsvSink, load_state, save_state
+from fixture_server import FIXTURES_DIR, serve
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+class InterruptingSink(CsvSink):
+    """寫出 limit 筆後丟出例外，模擬爬到一半中斷"""
+
+    def __init__(self, path, limit):
+        super().__init__(path)
+        self.limit = limit
+
+    def write(self, row):
+        if self.limit == 0:
+            raise KeyboardInterrupt
+        self.limit -= 1
+        super().write(row)
+
+
+class CrawlerOfflineTest(unittest.TestCase):
+    def setUp(self):
+        self.server = serve(FIXTURES_DIR)
+        self.addCleanup(self.server.shutdown)
+        self.start_url = urljoin(self.server.url, "shop.html")
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.output = os.path.join(self.dir, "items.csv")
+        self.state_path = os.path.join(self.dir, "state.json")
+
+    def crawl(self, sink=None, append=False):
+        state = load_state(self.state_path)
+        sink = sink or CsvSink(self.output, append=append)
+        crawler = Crawler(self.start_url, sink, state, concurrency=4,
+                          save=lambda s: save_state(self.state_path, s))
+        try:
+            return crawler.run()
+        finally:
+            sink.close()
+
+    def test_items_and_conditional_get(self):
+        pages = len(os.listdir(FIXTURES_DIR))
+        stats = self.crawl()
+        self.assertEqual((stats["fetched"], stats["errors"]), (pages, 0))
+        self.assertEqual(self.server.stats[200], pages)
+
+        rows = read_rows(self.output)
+        self.assertEqual(len(rows), stats["items"])
+        self.assertGreater(len(rows), 0)
+        skus = [row["sku"] for row in rows]
+        self.assertEqual(len(set(skus)), len(skus))
+        self.assertTrue(all(sku.startswith("MF-") for sku in skus))
+        self.assertTrue(all(row["name"] and row["category"] for row in rows))
+        self.assertIsNone(load_state(self.state_path)["run"])  # 全部成功，沒有未完成的進度
+
+        # 第二次執行：每頁都帶 ETag，伺服器全部回 304，輸出內容不變（完成順序可能不同）
+        stats = self.crawl()
+        self.assertEqual((stats["fetched"], stats["not_modified"]), (0, pages))
+        self.assertEqual(self.server.stats[304], pages)
+        self.assertCountEqual(read_rows(self.output), rows)
+
+    def test_resume_after_interrupt(self):
+        pages = len(os.listdir(FIXTURES_DIR))
+        with mock.patch.object(crawler_module, "SAVE_INTERVAL", 0):  # 每輪都存狀態
+            with self.assertRaises(KeyboardInterrupt):
+                self.crawl(InterruptingSink(self.output, limit=3))
+        self.assertIsNotNone(load_state(self.state_path)["run"])
+        self.assertEqual(len(read_rows(self.output)), 3)
+
+        # 續跑：已抓過的頁面用快取、不重新請求，已寫出的商品不重複
+        stats = self.crawl(append=True)
+        self.assertGreater(stats["resumed"], 0)
+        # 商品都已寫出的詳細頁不會再排進佇列，所以走訪的頁數可能少於全部
+        self.assertLessEqual(stats["fetched"] + stats["resumed"] + stats["not_modified"], pages)
+        self.assertLess(stats["fetched"], pages)
+        self.assertIsNone(load_state(self.state_path)["run"])
+        resumed = read_rows(self.output)
+        self.assertEqual(len({row["sku"] for row in resumed}), len(resumed))
+
+        # 與一次爬完的結果相同（順序可能不同）
+        os.remove(self.state_path)
+        self.output = os.path.join(self.dir, "full.csv")
+        self.crawl()
+        self.assertCountEqual(resumed, read_rows(self.output))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# 匯入正規化測試（不需要 MySQL）
+#     python -m unittest test_load_items_mysql
+
+import unittest
+from decimal import Decimal
+
+import pandas as pd
+
+from load_items_mysql import changed_rows, normalize_chunk
+
+
+def categorize(*names):
+    """只有名稱、沒有類別的列經過 normalize_chunk 後的 category（對應不到為 None）"""
+    df = pd.DataFrame({"sku": [f"S{i}" for i in range(len(names))], "name": list(names)})
+    result = normalize_chunk(df).set_index("name")["category"]
+    return {name: result.get(name) for name in names}
+
+
+class NameCategoryTest(unittest.TestCase):
+    def test_whole_words_only(self):
+        self.assertEqual(categorize("Chatter Hoodie", "Belted Dress", "Tie-Dye Tee", "Short Sleeve Shirt"), {
+            "Chatter Hoodie": "top",       # hat 只是 Chatter 的一部分
+            "Belted Dress": None,          # belt 只是 Belted 的一部分，洋裝沒有對應類別
+            "Tie-Dye Tee": "top",          # tie-dye 是花色不是領帶
+            "Short Sleeve Shirt": "top",   # 短袖上衣不是短褲
+        })
+
+    def test_keywords_still_match(self):
+        self.assertEqual(categorize("Denim Shorts", "Silk Tie", "Bucket Hat", "Leather Belts", "Wool Coat",
+                                    "Running Sneakers", "牛仔褲"), {
+            "Denim Shorts": "bottom",
+            "Silk Tie": "accessory",
+            "Bucket Hat": "accessory",
+            "Leather Belts": "accessory",
+            "Wool Coat": "outer",
+            "Running Sneakers": "shoes",
+            "牛仔褲": "bottom",
+        })
+
+    def test_category_column_takes_precedence(self):
+        df = pd.DataFrame({"sku": ["A", "B"], "name": ["Short Sleeve Shirt", "Chatter Hoodie"],
+                           "category": ["Shorts", "accessory"]})
+        self.assertEqual(list(normalize_chunk(df)["category"]), ["bottom", "accessory"])
+
+
+class FakeCursor:
+    """只回應 changed_rows 的 SELECT ... WHERE sku IN (...)"""
+
+    def __init__(self, items):
+        self.items = items  # sku -> (sku, name, category, color, price, image_url)
+
+    def execute(self, sql, params):
+        self.result = [self.items[sku] for sku in params if sku in self.items]
+
+    def fetchall(self):
+        return self.result
+
+
+class ChangedRowsTest(unittest.TestCase):
+    def test_only_new_or_modified_rows(self):
+        cur = FakeCursor({
+            "A": ("A", "White Tee", "top", "White", Decimal("12.50"), "a.jpg"),
+            "B": ("B", "Jeans", "bottom", "Blue", Decimal("30.00"), "b.jpg"),
+            "C": ("C", "Coat", "outer", "Black", None, "c.jpg"),
+        })
+        rows = [
+            ("A", "White Tee", "top", "White", 12.5, "a.jpg"),   # 完全相同
+            ("B", "Jeans", "bottom", None, None, "b.jpg"),       # NULL 的顏色 / 價格保留舊值
+            ("C", "Coat", "outer", "Black", 99.0, "c.jpg"),      # 補上價格
+            ("D", "Cap", "accessory", None, None, None),         # 新增
+        ]
+        self.assertEqual([row[0] for row in changed_rows(cur, rows, batch_size=2)], ["C", "D"])
+
+
+if __name__ == "__main__":
+    unittest.main()
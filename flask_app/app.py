@@ -1,7 +1,19 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 import pymysql, os, requests, json, sys
 from langchain_agent import OutfitAIAgent
+from llm_router import router_stats
+from db_pool import ConnectionPool
+from catalog_snapshot import LiveCatalog
+from outfit_retriever import OutfitRetriever
+from outfit_generator import OutfitGenerator
+from user_candidates import CandidateJob, fetch_user_candidates
+from keyword_matcher import KeywordExtractor
+from catalog_cache import (CatalogVersion, EncodedResponseCache, params_key, make_etag, etag_matches,
+                           negotiate_encoding, encode_body)
+from catalog_queries import (OUTFIT_LIMIT, fetch_outfits_with_items, fetch_outfits_by_ids, fetch_items_page,
+                             iter_items, count_items, parse_item_fields, ITEMS_DEFAULT_LIMIT, ITEMS_MAX_LIMIT)
 import uuid
+import threading
 from datetime import datetime
 from decimal import Decimal
 
@@ -33,6 +45,33 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASS = os.getenv('DB_PASS', 'rootpassword')
 DB_NAME = os.getenv('DB_NAME', 'outfit_db')
 
+# 連線池設定
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+# 型錄版本最多每幾秒查一次資料庫、已編碼 /items 回應的快取大小
+CATALOG_VERSION_TTL = float(os.getenv('CATALOG_VERSION_TTL', '2'))
+ITEMS_CACHE_SIZE = int(os.getenv('ITEMS_CACHE_SIZE', '256'))
+# 以記憶體內型錄快照回應 /items 篩選與 RAG 檢索（false 時每次查 MySQL）
+CATALOG_SNAPSHOT = os.getenv('CATALOG_SNAPSHOT', 'true').lower() == 'true'
+# RAG 向量檢索（需要型錄快照）；索引存放目錄、雜湊維度、最短重建間隔
+RETRIEVAL_ENABLED = os.getenv('RETRIEVAL_ENABLED', 'true').lower() == 'true'
+RETRIEVAL_INDEX_DIR = os.getenv('RETRIEVAL_INDEX_DIR', '/app/data/retrieval_index')
+RETRIEVAL_DIM = int(os.getenv('RETRIEVAL_DIM', str(1 << 20)))
+RETRIEVAL_REBUILD_INTERVAL = float(os.getenv('RETRIEVAL_REBUILD_INTERVAL', '30'))
+# 檢索結果不足時，依場合自動組合穿搭補足（需型錄快照）
+OUTFIT_GENERATOR = os.getenv('OUTFIT_GENERATOR', 'true').lower() == 'true'
+OUTFIT_GENERATOR_BUDGET_MS = float(os.getenv('OUTFIT_GENERATOR_BUDGET_MS', '50'))
+# 個人化推薦候選（依收藏預先計算，/recommend 帶 user_id 時優先使用）
+CANDIDATES_JOB = os.getenv('CANDIDATES_JOB', 'true').lower() == 'true'
+CANDIDATES_TOP_K = int(os.getenv('CANDIDATES_TOP_K', '20'))
+CANDIDATES_INTERVAL = float(os.getenv('CANDIDATES_INTERVAL', '10'))
+# 批次推薦（async_app.py /recommend/batch 與 batch_recommend.py）：每個模型每秒請求數，例如 Gemini=2,Groq=5
+BATCH_RATE_LIMITS = os.getenv('BATCH_RATE_LIMITS', '')
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '10000'))
+
 LLM_API_KEY = os.getenv('LLM_API_KEY')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
@@ -54,7 +93,7 @@ GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_M
 # =======================
 # 🗃️ 資料庫連線
 # =======================
-def get_db_conn():
+def create_db_conn():
     return pymysql.connect(
         host=DB_HOST,
         port=DB_PORT,
@@ -63,9 +102,96 @@ def get_db_conn():
         db=DB_NAME,
         charset='utf8mb4',
         cursorclass=pymysql.cursors.DictCursor,
-        use_unicode=True
+        use_unicode=True,
+        autocommit=True  # 連線會被重複使用，避免長交易讀到舊快照
     )
 
+db_pool = ConnectionPool(
+    create_db_conn,
+    max_size=DB_POOL_SIZE,
+    max_idle=DB_POOL_MAX_IDLE,
+    timeout=DB_POOL_TIMEOUT
+)
+
+def get_db_conn():
+    """從連線池借用連線（with 語法，離開時自動歸還）"""
+    return db_pool.connection()
+
+# =======================
+# 🏷️ 型錄版本（ETag / 快取失效）
+# =======================
+def load_catalog_version():
+    """讀取型錄版本號（items / outfits / outfit_items 異動時由 trigger 遞增）"""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cur.fetchone()
+    return row['version'] if row else None
+
+catalog_version = CatalogVersion(load_catalog_version, refresh_interval=CATALOG_VERSION_TTL)
+items_cache = EncodedResponseCache(max_entries=ITEMS_CACHE_SIZE)
+catalog_version.on_change(items_cache.clear)
+if agent:
+    catalog_version.on_change(lambda old, new: agent.response_cache.invalidate())
+
+live_catalog = LiveCatalog(get_db_conn)
+
+def current_catalog():
+    """目前版本的型錄快照；停用或無法取得時回傳 None（呼叫端改查 MySQL）"""
+    if not CATALOG_SNAPSHOT:
+        return None
+    return live_catalog.get(catalog_version.current())
+
+retriever = (OutfitRetriever(RETRIEVAL_INDEX_DIR or None, RETRIEVAL_DIM, RETRIEVAL_REBUILD_INTERVAL)
+             if RETRIEVAL_ENABLED else None)
+
+_generator = None
+_generator_lock = threading.Lock()
+
+def current_generator(catalog):
+    """目前快照對應的穿搭組合產生器（快照更新後第一次使用時重建，舊的結果快取一併丟棄）"""
+    global _generator
+    if not OUTFIT_GENERATOR or catalog is None:
+        return None
+    with _generator_lock:
+        if _generator is None or _generator.change_seq != catalog.change_seq:
+            _generator = OutfitGenerator.from_snapshot(catalog)
+        return _generator
+
+candidate_job = CandidateJob(get_db_conn, CANDIDATES_TOP_K, CANDIDATES_INTERVAL) if CANDIDATES_JOB else None
+
+def warm_catalog():
+    """啟動個人化候選的背景更新，並先建立型錄快照、向量索引與穿搭組合產生器
+    （候選工作先啟動：MySQL 還沒就緒時型錄暖機會失敗，背景工作之後會自行重試）"""
+    if candidate_job is not None:
+        candidate_job.start()
+    catalog = current_catalog()
+    if catalog is not None and retriever is not None:
+        retriever.current(catalog, wait=True)
+    current_generator(catalog)
+
+_warm_lock = threading.Lock()
+_warm_started = False
+
+def _warm_in_background():
+    try:
+        warm_catalog()
+    except Exception as e:
+        print(f"⚠️ 啟動暖機失敗（之後的請求會直接查詢 MySQL）: {e}", file=sys.stderr)
+
+@app.before_request
+def start_background_jobs():
+    """WSGI 伺服器（gunicorn app:app 等）不會執行 __main__：每個 worker 收到第一個請求時，
+    在背景執行 warm_catalog（在 worker 行程中啟動，fork 之後背景執行緒才存在），不阻塞這個請求"""
+    global _warm_started
+    if _warm_started:
+        return
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+    threading.Thread(target=_warm_in_background, name="warm-catalog", daemon=True).start()
+
 # =======================
 # 🔹 首頁（HTML）
 # =======================
@@ -77,55 +203,268 @@ def home_page():
 # =======================
 # 📦 取得所有衣物
 # =======================
+def parse_items_args(args):
+    """解析 /items 查詢參數，格式錯誤時拋出 ValueError"""
+    try:
+        limit = int(args.get('limit', ITEMS_DEFAULT_LIMIT))
+        cursor = args.get('cursor')
+        after_id = int(cursor) if cursor else None
+    except ValueError:
+        raise ValueError("limit 與 cursor 必須是整數")
+    if not 1 <= limit <= ITEMS_MAX_LIMIT:
+        raise ValueError(f"limit 必須介於 1 到 {ITEMS_MAX_LIMIT}")
+    return {
+        "category": args.get('category'),
+        "color": args.get('color'),
+        "after_id": after_id,
+        "limit": limit,
+        "fields": parse_item_fields(args.get('fields')),
+        "with_count": args.get('count', '').lower() in ('1', 'true'),
+    }
+
+def query_items(category=None, color=None, after_id=None, limit=ITEMS_DEFAULT_LIMIT,
+                fields=None, with_count=False):
+    """分頁查詢衣物（依類別、顏色精確篩選），回傳 (items, next_cursor, total)"""
+    catalog = current_catalog()
+    if catalog is not None:
+        items, next_cursor = catalog.page_items(category, color, after_id, limit, fields)
+        total = catalog.count_items(category, color) if with_count else None
+        return items, next_cursor, total
+
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            items, next_cursor = fetch_items_page(cur, category, color, after_id, limit, fields)
+            total = count_items(cur, category, color) if with_count else None
+    return items, next_cursor, total
+
+def items_headers(next_cursor, total):
+    """分頁資訊放在 header，回應主體維持衣物陣列"""
+    headers = {}
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = str(next_cursor)
+    if total is not None:
+        headers['X-Total-Count'] = str(total)
+    return headers
+
+def items_response(path, args, if_none_match=None, accept_encoding=None):
+    """產生 /items 回應，回傳 (body, status, headers)；參數錯誤時拋出 ValueError
+
+    型錄版本未變且 ETag 相符時直接回 304，已編碼的回應主體依 ETag 快取，兩者都不查 MySQL。
+    """
+    params = parse_items_args(args)
+    encoding = negotiate_encoding(accept_encoding)
+    version = catalog_version.current()
+
+    base_headers = {'Vary': 'Accept-Encoding'}
+    etag = None
+    if version is not None:
+        etag = make_etag(version, params_key(path, args), encoding)
+        base_headers.update({'ETag': etag, 'Cache-Control': 'no-cache'})
+        if etag_matches(if_none_match, etag):
+            return b'', 304, base_headers
+        cached = items_cache.get(etag)
+        if cached is not None:
+            body, headers = cached
+            return body, 200, {**headers, **base_headers}
+
+    items, next_cursor, total = query_items(**params)
+    raw = json.dumps(items, ensure_ascii=False, default=json_serial).encode('utf-8')
+    body, used = encode_body(raw, encoding)
+    headers = items_headers(next_cursor, total)
+    if used != 'identity':
+        headers['Content-Encoding'] = used
+    if etag is not None:
+        items_cache.put(etag, body, headers)
+    return body, 200, {**headers, **base_headers}
+
 @app.route('/items', methods=['GET'])
 def get_items():
-    color = request.args.get('color')
-    category = request.args.get('category')
-    conn = get_db_conn()
+    """GET /items?category=top&color=white&limit=100&cursor=<上一頁的 X-Next-Cursor>&fields=id,name&count=true"""
     try:
-        with conn.cursor() as cur:
-            sql = "SELECT * FROM items WHERE 1=1"
-            params = []
-            if color:
-                sql += " AND color LIKE %s"
-                params.append(f"%{color}%")
-            if category:
-                sql += " AND category=%s"
-                params.append(category)
-            cur.execute(sql, params)
-            items = cur.fetchall()
-            
-            # 轉換 datetime 和 Decimal 為可序列化類型
-            for item in items:
-                if 'created_at' in item:
-                    item['created_at'] = item['created_at'].isoformat() if item['created_at'] else None
-                if 'price' in item and isinstance(item['price'], Decimal):
-                    item['price'] = float(item['price'])
-    finally:
-        conn.close()
-    return jsonify(items)
+        body, status, headers = items_response(
+            request.path, request.args,
+            request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, status=status, headers=headers, mimetype='application/json')
 
 # =======================
-# � RAG 關鍵字映射
+# 📤 匯出整份型錄（串流）
 # =======================
-KEYWORD_MAPPING = {
-    '約會': ['約會', 'date', '浪漫', '晚餐'],
-    '運動': ['運動', 'sport', '健身', '跑步', '瑜珈'],
-    '上班': ['上班', '辦公', '正式', '商務', 'office'],
-    '休閒': ['休閒', '逛街', '週末', 'casual', '放鬆'],
-    '派對': ['派對', 'party', '聚會', '夜店'],
-    '旅遊': ['旅遊', '旅行', '出遊', 'travel'],
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
 }
 
+def parse_export_args(args):
+    """解析 /items/export 查詢參數，格式錯誤時拋出 ValueError"""
+    fmt = args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_MIMETYPES:
+        raise ValueError("format 必須是 ndjson 或 json")
+    return fmt, {
+        "category": args.get('category'),
+        "color": args.get('color'),
+        "fields": parse_item_fields(args.get('fields')),
+    }
+
+def export_items(fmt='ndjson', category=None, color=None, fields=None):
+    """以伺服器端游標逐批讀取衣物並產出 NDJSON（每行一筆）或 JSON 陣列片段
+
+    連線在整個串流期間被佔用；用戶端中途斷線時，未讀完的結果集無法再重用該連線，直接丟棄。
+    """
+    conn = db_pool.acquire()
+    cur = conn.cursor(pymysql.cursors.SSDictCursor)
+    finished = False
+    try:
+        if fmt == 'json':
+            yield '['
+        first = True
+        for batch in iter_items(cur, category, color, fields):
+            lines = [json.dumps(item, ensure_ascii=False, default=json_serial) for item in batch]
+            if fmt == 'ndjson':
+                yield '\n'.join(lines) + '\n'
+            else:
+                yield ('' if first else ',') + ','.join(lines)
+            first = False
+        if fmt == 'json':
+            yield ']'
+        cur.close()
+        finished = True
+    finally:
+        # 中途中斷時不關閉游標（關閉會把剩下的結果集讀完），直接丟棄連線
+        db_pool.release(conn, discard=not finished)
+
+@app.route('/items/export', methods=['GET'])
+def export_items_route():
+    """GET /items/export?format=ndjson|json&category=top&color=white&fields=id,name"""
+    try:
+        fmt, params = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(
+        stream_with_context(export_items(fmt, **params)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# =======================
+# 🔑 RAG 關鍵字比對
+# =======================
+# 同義詞檔（場合、顏色、類別、天氣、風格 → 資料庫標準值），啟動時編譯成 Aho-Corasick 自動機
+SYNONYMS_FILE = os.getenv('SYNONYMS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synonyms.json'))
+keyword_extractor = KeywordExtractor.from_file(SYNONYMS_FILE)
+
 def extract_keywords(text):
-    """從使用者輸入中提取關鍵字"""
-    found_keywords = []
-    for key, synonyms in KEYWORD_MAPPING.items():
-        for synonym in synonyms:
-            if synonym in text:
-                found_keywords.append(key)
-                break
-    return list(set(found_keywords))  # 去重
+    """從使用者輸入中提取關鍵字（顯示用標籤，例如 約會、白色）"""
+    return KeywordExtractor.labels(keyword_extractor.extract(text))
+
+def format_outfits_fallback(outfits, limit=3):
+    """AI 無法回應時，把資料庫穿搭整理成文字推薦"""
+    text = ""
+    for idx, outfit in enumerate(outfits[:limit], 1):
+        text += f"\n**推薦 {idx}：{outfit['name']}**\n"
+        text += f"- 場合：{outfit['occasion']}\n"
+        text += f"- 說明：{outfit['description']}\n"
+        text += "- 包含：\n"
+        for item in outfit['items']:
+            text += f"  • {item['name']} ({item['color']}, {item['category']})\n"
+    return text
+
+def load_user_outfits(user_id, occasions, catalog):
+    """使用者預先計算好的候選穿搭（主鍵查詢）；偵測到場合時只保留該場合的"""
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            ids = fetch_user_candidates(cur, user_id)
+            if not ids:
+                return []
+            if catalog is not None:
+                outfits = catalog.outfit_dicts(ids)
+            else:
+                outfits = fetch_outfits_by_ids(cur, ids)
+    if occasions:
+        outfits = [o for o in outfits if o['occasion'] in occasions]
+    return outfits[:OUTFIT_LIMIT]
+
+def load_outfits(query, user_id=None):
+    """RAG 檢索：有型錄快照時以向量相似度排序（沒有相關結果則依場合），否則查 MySQL（批次查詢，避免 N+1）
+
+    帶 user_id 時，依收藏預先計算的候選排在最前面；
+    有型錄快照時，結果不足 OUTFIT_LIMIT 組會以自動組合的穿搭補足
+    """
+    matches = keyword_extractor.extract(query)
+    occasions = KeywordExtractor.values(matches, 'occasion')
+    catalog = current_catalog()
+    personal = load_user_outfits(user_id, occasions, catalog) if user_id is not None else []
+
+    if catalog is not None:
+        outfits = []
+        if query and retriever is not None:
+            # 比對到的標準值（date、white...）一併送進檢索，對上英文的 ENUM 欄位
+            canonical = [m.value for m in matches]
+            outfits = retriever.retrieve(catalog, ' '.join([query, *canonical]), OUTFIT_LIMIT)
+        if not outfits:
+            outfits = catalog.outfits_with_items(occasions)
+    else:
+        with get_db_conn() as conn:
+            with conn.cursor() as cur:
+                outfits = fetch_outfits_with_items(cur, occasions)
+
+    if personal:
+        seen = {o['id'] for o in personal}
+        outfits = (personal + [o for o in outfits if o['id'] not in seen])[:OUTFIT_LIMIT]
+
+    generator = current_generator(catalog)
+    if generator is not None and len(outfits) < OUTFIT_LIMIT:
+        occasion = occasions[0] if occasions else 'casual'
+        outfits = outfits + generator.generate_dicts(occasion, OUTFIT_LIMIT - len(outfits),
+                                                     OUTFIT_GENERATOR_BUDGET_MS)
+    return outfits
+
+def build_rag_context(keywords, outfits):
+    """加入 RAG 提示"""
+    if not keywords:
+        return ""
+    return f"\n\n🔍 偵測到關鍵字：{', '.join(keywords)}\n系統已為您檢索相關的 {len(outfits)} 組穿搭資料。"
+
+def build_error_payload(user_input, session_id, outfits, error_msg):
+    """AI 呼叫失敗時的友善回覆（使用資料庫推薦，仍回傳 200）"""
+    # 如果是 API 配額超限，提供友善提示
+    if "429" in error_msg or "quota" in error_msg.lower():
+        fallback_response = f"""抱歉，AI 服務暫時超過使用配額 😅
+
+不過別擔心！以下是資料庫中符合「{user_input}」的穿搭推薦：
+
+"""
+        fallback_response += format_outfits_fallback(outfits)
+        fallback_response += "\n💡 提示：請稍後再試，或聯繫管理員增加 API 配額。"
+        
+        return {
+            "response": fallback_response,
+            "session_id": session_id,
+            "db_data": outfits,
+            "note": "AI 配額超限，使用資料庫推薦"
+        }
+    
+    # 其他錯誤也返回友善訊息
+    fallback_response = f"""系統遇到了一些問題 😅
+
+不過別擔心！以下是資料庫中的穿搭推薦：
+
+"""
+    fallback_response += format_outfits_fallback(outfits)
+    
+    return {
+        "response": fallback_response,
+        "session_id": session_id,
+        "db_data": outfits,
+        "error_details": error_msg
+    }
+
+def sse_event(event, payload):
+    """組成一則 Server-Sent Event"""
+    data = json.dumps(payload, ensure_ascii=False, default=json_serial)
+    return f"event: {event}\ndata: {data}\n\n"
 
 # =======================
 # �👕 AI 穿搭推薦（使用 LangChain + RAG）
@@ -135,7 +474,9 @@ def recommend():
     data = request.json
     user_input = data.get('message', '')
     session_id = data.get('session_id', 'default')
+    user_id = data.get('user_id')  # 選填：登入使用者，依收藏個人化排序
     preferred_model = data.get('model', 'auto')  # 新增：讀取用戶選擇的模型
+    stream = wants_stream(data, request.args)
 
     if not user_input:
         return jsonify({"error": "請輸入訊息"}), 400
@@ -144,42 +485,11 @@ def recommend():
     keywords = extract_keywords(user_input)
     
     # 先從資料庫取出可能的穿搭
-    conn = get_db_conn()
-    try:
-        with conn.cursor() as cur:
-            # 如果有關鍵字，優先檢索相關穿搭
-            if keywords:
-                placeholders = ','.join(['%s'] * len(keywords))
-                sql = f"SELECT * FROM outfits WHERE occasion IN ({placeholders}) LIMIT 5"
-                cur.execute(sql, keywords)
-                outfits = cur.fetchall()
-                
-                # 如果找不到，退回全部
-                if not outfits:
-                    cur.execute("SELECT * FROM outfits LIMIT 5")
-                    outfits = cur.fetchall()
-            else:
-                # 沒有關鍵字，返回全部
-                cur.execute("SELECT * FROM outfits LIMIT 5")
-                outfits = cur.fetchall()
-            for o in outfits:
-                cur.execute("""
-                    SELECT i.* FROM items i
-                    JOIN outfit_items oi ON i.id = oi.item_id
-                    WHERE oi.outfit_id=%s
-                """, (o['id'],))
-                o['items'] = cur.fetchall()
-                
-                # 轉換 datetime 和 Decimal 為可序列化類型
-                if 'created_at' in o:
-                    o['created_at'] = o['created_at'].isoformat() if o['created_at'] else None
-                for item in o['items']:
-                    if 'created_at' in item:
-                        item['created_at'] = item['created_at'].isoformat() if item['created_at'] else None
-                    if 'price' in item and isinstance(item['price'], Decimal):
-                        item['price'] = float(item['price'])
-    finally:
-        conn.close()
+    outfits = load_outfits(user_input, user_id)
+
+    # 串流模式：先送 db_data，再逐段送出 AI 回覆
+    if stream:
+        return stream_recommend(session_id, user_input, keywords, outfits, preferred_model)
 
     # 若未啟用 AI，僅返回資料庫內容
     if not USE_GEMINI or not agent:
@@ -191,16 +501,12 @@ def recommend():
 
     # 使用 LangChain Agent 處理對話（帶 RAG context）
     try:
-        # 加入 RAG 提示
-        rag_context = ""
-        if keywords:
-            rag_context = f"\n\n🔍 偵測到關鍵字：{', '.join(keywords)}\n系統已為您檢索相關的 {len(outfits)} 組穿搭資料。"
-        
         ai_response = agent.chat(
             session_id=session_id,
-            user_input=user_input + rag_context,
+            user_input=user_input + build_rag_context(keywords, outfits),
             db_outfits=outfits,
-            preferred_model=preferred_model  # 新增：傳遞用戶選擇的模型
+            preferred_model=preferred_model,  # 新增：傳遞用戶選擇的模型
+            keywords=keywords
         )
         
         return jsonify({
@@ -210,52 +516,60 @@ def recommend():
             "keywords": keywords  # 回傳偵測到的關鍵字
         })
     except Exception as e:
-        error_msg = str(e)
-        
-        # 如果是 API 配額超限，提供友善提示
-        if "429" in error_msg or "quota" in error_msg.lower():
-            fallback_response = f"""抱歉，AI 服務暫時超過使用配額 😅
+        # 返回 200 而不是錯誤狀態
+        return jsonify(build_error_payload(user_input, session_id, outfits, str(e))), 200
 
-不過別擔心！以下是資料庫中符合「{user_input}」的穿搭推薦：
+def recommend_events(session_id, user_input, keywords, outfits, preferred_model):
+    """產生 /recommend 串流模式的 Server-Sent Events（app.py 直接串流，async_app 在執行緒池中逐一取出）
 
-"""
-            for idx, outfit in enumerate(outfits[:3], 1):
-                fallback_response += f"\n**推薦 {idx}：{outfit['name']}**\n"
-                fallback_response += f"- 場合：{outfit['occasion']}\n"
-                fallback_response += f"- 說明：{outfit['description']}\n"
-                fallback_response += "- 包含：\n"
-                for item in outfit['items']:
-                    fallback_response += f"  • {item['name']} ({item['color']}, {item['category']})\n"
-            
-            fallback_response += "\n💡 提示：請稍後再試，或聯繫管理員增加 API 配額。"
-            
-            return jsonify({
-                "response": fallback_response,
-                "session_id": session_id,
-                "db_data": outfits,
-                "note": "AI 配額超限，使用資料庫推薦"
-            }), 200  # 返回 200 而不是錯誤狀態
-        
-        # 其他錯誤也返回友善訊息
-        fallback_response = f"""系統遇到了一些問題 😅
+    事件順序：db_data（檢索結果）→ token（多次）→ done；發生錯誤時送出資料庫推薦後 done
+    """
+    yield sse_event("db_data", {
+        "session_id": session_id,
+        "db_data": outfits,
+        "keywords": keywords
+    })
 
-不過別擔心！以下是資料庫中的穿搭推薦：
+    if not USE_GEMINI or not agent:
+        yield sse_event("token", {"text": "AI 尚未啟用，僅回傳資料庫內容"})
+        yield sse_event("done", {"session_id": session_id})
+        return
 
-"""
-        for idx, outfit in enumerate(outfits[:3], 1):
-            fallback_response += f"\n**推薦 {idx}：{outfit['name']}**\n"
-            fallback_response += f"- 場合：{outfit['occasion']}\n"
-            fallback_response += f"- 說明：{outfit['description']}\n"
-            fallback_response += "- 包含：\n"
-            for item in outfit['items']:
-                fallback_response += f"  • {item['name']} ({item['color']}, {item['category']})\n"
-        
-        return jsonify({
-            "response": fallback_response,
-            "session_id": session_id,
-            "db_data": outfits,
-            "error_details": error_msg
-        }), 200
+    try:
+        for text in agent.chat_stream(
+            session_id=session_id,
+            user_input=user_input + build_rag_context(keywords, outfits),
+            db_outfits=outfits,
+            preferred_model=preferred_model,
+            keywords=keywords
+        ):
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        fallback_response = "系統遇到了一些問題 😅\n\n不過別擔心！以下是資料庫中的穿搭推薦：\n\n"
+        fallback_response += format_outfits_fallback(outfits)
+        yield sse_event("token", {"text": fallback_response})
+        yield sse_event("done", {"session_id": session_id, "error_details": str(e)})
+        return
+
+    yield sse_event("done", {"session_id": session_id})
+
+# SSE 回應標頭
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # 避免反向代理緩衝整個回應
+}
+
+def wants_stream(data, args):
+    """SSE 串流模式（"false"、"0" 等字串不算開啟）"""
+    return data.get('stream') in (True, 'true', '1') or args.get('stream') in ('true', '1')
+
+def stream_recommend(session_id, user_input, keywords, outfits, preferred_model):
+    """以 Server-Sent Events 串流回覆"""
+    return Response(
+        stream_with_context(recommend_events(session_id, user_input, keywords, outfits, preferred_model)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
 
 # =======================
 # 🗑️ 清除對話記憶
@@ -280,17 +594,35 @@ def clear_session():
 # =======================
 # ✅ 健康檢查
 # =======================
-@app.route('/ping')
-def ping():
-    return jsonify({
+def build_status():
+    """健康檢查與各元件統計"""
+    return {
         "status": "ok",
         "db_host": DB_HOST,
         "gemini_model": GEMINI_MODEL,
-        "ai_enabled": USE_GEMINI
-    })
+        "ai_enabled": USE_GEMINI,
+        "db_pool": db_pool.stats(),
+        "session_cache": agent.sessions.stats() if agent else None,
+        "llm_providers": agent.health.stats() if agent else None,
+        "llm_inflight": agent.inflight.stats() if agent else None,
+        "llm_threads": router_stats(),
+        "response_cache": agent.response_cache.stats() if agent else None,
+        "catalog_version": catalog_version.stats(),
+        "items_cache": items_cache.stats(),
+        "catalog_snapshot": live_catalog.stats() if CATALOG_SNAPSHOT else None,
+        "retriever": retriever.stats() if retriever else None,
+        "outfit_generator": _generator.stats() if _generator else None,
+        "user_candidates": candidate_job.stats() if candidate_job else None
+    }
+
+@app.route('/ping')
+def ping():
+    return jsonify(build_status())
 
 # =======================
 # 🏁 主程式
 # =======================
 if __name__ == '__main__':
+    warm_catalog()
+    _warm_started = True
     app.run(host='0.0.0.0', port=5000, debug=True)
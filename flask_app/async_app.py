@@ -0,0 +1,235 @@
+"""
+非同步版本的 API（Quart，介面與 app.py 相同）
+資料庫查詢交給執行緒池，LLM 呼叫使用 ainvoke，等待模型回應時不佔用執行緒，
+單一 worker 即可同時處理數百個對話。SSE 串流模式沿用 app.py 的同步串流（在執行緒池中逐段取出），
+批次推薦 /recommend/batch 僅由本檔提供。容器預設以此檔提供服務（見 Dockerfile）
+
+啟動方式：
+    hypercorn async_app:app --bind 0.0.0.0:5000 --workers 2
+"""
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, request, jsonify, render_template, Response
+
+from app import (agent, USE_GEMINI, DB_POOL_SIZE, extract_keywords, load_outfits,
+                 items_response, warm_catalog, parse_export_args, export_items, EXPORT_MIMETYPES,
+                 build_rag_context, build_error_payload, build_status, recommend_events, wants_stream, SSE_HEADERS,
+                 BATCH_RATE_LIMITS, BATCH_MAX_CONCURRENCY, BATCH_MAX_REQUESTS)
+from batch_recommend import BatchRecommender, DEFAULT_CONCURRENCY
+from llm_router import ProviderRateLimits, parse_rate_limits
+
+app = Quart(__name__)
+app.config['JSON_AS_ASCII'] = False  # 確保 JSON 正確顯示中文
+
+# 資料庫查詢使用的執行緒池（大小與連線池一致，避免執行緒卡在等待連線）
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(fn, *args):
+    """在資料庫執行緒池中執行同步的查詢函數"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, fn, *args)
+
+
+# 批次推薦共用的模型速率限制（同一個 worker 內的所有批次一起計算）
+batch_rate_limits = ProviderRateLimits(parse_rate_limits(BATCH_RATE_LIMITS))
+
+
+@app.before_serving
+async def warm_up():
+    """啟動時先建立型錄快照與向量索引"""
+    await run_db(warm_catalog)
+
+
+# =======================
+# 🔹 首頁（HTML）
+# =======================
+@app.route('/')
+@app.route('/home')
+async def home_page():
+    return await render_template('index.html')
+
+
+# =======================
+# 📦 取得所有衣物
+# =======================
+@app.route('/items', methods=['GET'])
+async def get_items():
+    try:
+        body, status, headers = await run_db(
+            items_response, request.path, request.args,
+            request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+
+# =======================
+# 📤 匯出整份型錄（串流）
+# =======================
+@app.route('/items/export', methods=['GET'])
+async def export_items_route():
+    try:
+        fmt, params = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    async def stream():
+        # 同步產生器的每一步都在資料庫執行緒池中執行，不阻塞事件迴圈
+        chunks = export_items(fmt, **params)
+        try:
+            while True:
+                chunk = await run_db(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk.encode('utf-8')
+        finally:
+            await run_db(chunks.close)
+
+    return Response(stream(), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# =======================
+# 👕 AI 穿搭推薦（async）
+# =======================
+@app.route('/recommend', methods=['POST'])
+async def recommend():
+    data = await request.get_json()
+    user_input = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    user_id = data.get('user_id')
+    preferred_model = data.get('model', 'auto')
+
+    if not user_input:
+        return jsonify({"error": "請輸入訊息"}), 400
+
+    keywords = extract_keywords(user_input)
+    outfits = await run_db(load_outfits, user_input, user_id)
+
+    if wants_stream(data, request.args):
+        return stream_recommend(session_id, user_input, keywords, outfits, preferred_model)
+
+    if not USE_GEMINI or not agent:
+        return jsonify({
+            "response": "AI 尚未啟用，僅回傳資料庫內容",
+            "db_data": outfits,
+            "session_id": session_id
+        })
+
+    try:
+        ai_response = await agent.achat(
+            session_id=session_id,
+            user_input=user_input + build_rag_context(keywords, outfits),
+            db_outfits=outfits,
+            preferred_model=preferred_model,
+            keywords=keywords
+        )
+        return jsonify({
+            "response": ai_response,
+            "session_id": session_id,
+            "db_data": outfits,
+            "keywords": keywords
+        })
+    except Exception as e:
+        print(f"❌ async recommend 失敗: {e}", file=sys.stderr)
+        return jsonify(build_error_payload(user_input, session_id, outfits, str(e))), 200
+
+
+def stream_recommend(session_id, user_input, keywords, outfits, preferred_model):
+    """以 Server-Sent Events 串流回覆（事件與 app.py 相同）；同步的模型串流在預設執行緒池中逐段取出"""
+    events = recommend_events(session_id, user_input, keywords, outfits, preferred_model)
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                event = await loop.run_in_executor(None, next, events, None)
+                if event is None:
+                    break
+                yield event.encode('utf-8')
+        finally:
+            await loop.run_in_executor(None, events.close)
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+# =======================
+# 📦 批次推薦（NDJSON 串流）
+# =======================
+@app.route('/recommend/batch', methods=['POST'])
+async def recommend_batch():
+    """請求主體為 NDJSON（或 JSON 陣列），每筆 {id, occasion, temperature, user_id, message, model}；
+    結果依完成順序以 NDJSON 串流回傳。?concurrency= 調整同時處理數（上限 BATCH_MAX_CONCURRENCY）"""
+    body = (await request.get_data()).decode('utf-8-sig')
+    try:
+        if body.lstrip().startswith('['):
+            requests = json.loads(body)
+        else:
+            requests = [json.loads(line) for line in body.splitlines() if line.strip()]
+        concurrency = int(request.args.get('concurrency', DEFAULT_CONCURRENCY))
+    except ValueError as e:
+        return jsonify({"error": f"請求格式錯誤: {e}"}), 400
+    if not all(isinstance(r, dict) for r in requests):
+        return jsonify({"error": "每筆請求必須是 JSON 物件"}), 400
+    if len(requests) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"單次最多 {BATCH_MAX_REQUESTS} 筆"}), 413
+
+    complete = None
+    if USE_GEMINI and agent:
+        def complete(user_input, outfits, model):
+            return agent.acomplete(user_input, outfits, model, before_call=batch_rate_limits)
+
+    recommender = BatchRecommender(load_outfits, complete, extract_keywords, build_rag_context,
+                                   min(max(concurrency, 1), BATCH_MAX_CONCURRENCY), run_db)
+
+    async def stream():
+        async for record in recommender.run(requests):
+            yield (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+
+    return Response(stream(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# =======================
+# 🗑️ 清除對話記憶
+# =======================
+@app.route('/clear_session', methods=['POST'])
+async def clear_session():
+    data = await request.get_json()
+    session_id = data.get('session_id')
+
+    if not session_id:
+        return jsonify({"error": "請提供 session_id"}), 400
+
+    if agent:
+        # 刪除對話紀錄是阻塞的儲存 I/O，不在事件迴圈上執行
+        success = await asyncio.get_running_loop().run_in_executor(None, agent.clear_session, session_id)
+        return jsonify({
+            "success": success,
+            "message": "對話記憶已清除" if success else "找不到該 session"
+        })
+
+    return jsonify({"error": "AI 未啟用"}), 400
+
+
+# =======================
+# ✅ 健康檢查
+# =======================
+@app.route('/ping')
+async def ping():
+    status = build_status()
+    status["llm_inflight_async"] = agent.ainflight.stats() if agent else None
+    status["batch_rate_limits"] = batch_rate_limits.stats()
+    status["server"] = "async"
+    return jsonify(status)
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
@@ -0,0 +1,283 @@
+"""
+批次推薦模組（行銷 / 離線評分）
+輸入每行一個 JSON（或 CSV），欄位：id（選填）、occasion、temperature、user_id、message、model
+- 沒有 message 時由 occasion / temperature 組成查詢（例如「約會 氣溫 12°C 寒冷 穿搭推薦」）
+- 相同的檢索（查詢文字 + user_id）只做一次，型錄資料由記憶體快照提供
+- 相同的提示只呼叫一次模型（共用結果以 LRU 保留最近 SHARED_CACHE_SIZE 筆，大檔案時記憶體不隨請求數成長）；
+  同時進行的請求數有上限，每個模型各自限速（BATCH_RATE_LIMITS）
+- 結果以 NDJSON 依完成順序逐筆輸出，每筆帶 id 對應原請求（沒給 id 時以請求內容的雜湊代替）
+
+命令列（輸出到檔案，中斷後再執行同一個指令會略過已成功的 id）：
+    python batch_recommend.py requests.ndjson -o results.ndjson --concurrency 8 --rate Gemini=2,Groq=5
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from llm_router import ProviderRateLimits, parse_rate_limits
+
+DEFAULT_CONCURRENCY = 8
+# 每寫入幾筆結果呼叫一次 fsync（當機時最多重跑這麼多筆）
+FSYNC_EVERY = 50
+# 共用的檢索 / 模型結果各保留幾筆（最近使用的；被淘汰後再遇到相同請求會重新計算）
+SHARED_CACHE_SIZE = 1024
+
+
+def request_id(req: dict) -> str:
+    """請求的 id；沒有提供時以內容雜湊代替（同樣的請求得到同樣的 id，續跑時才能辨識）"""
+    if req.get('id') not in (None, ''):
+        return str(req['id'])
+    payload = json.dumps(req, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def build_query(req: dict) -> str:
+    """批次請求 → 查詢文字（與 /recommend 的 message 相同用途）"""
+    if req.get('message'):
+        return str(req['message'])
+    parts = []
+    if req.get('occasion'):
+        parts.append(str(req['occasion']))
+    temperature = req.get('temperature')
+    if temperature not in (None, ''):
+        t = float(temperature)
+        weather = '炎熱' if t >= 28 else '寒冷' if t <= 15 else '涼爽'
+        parts.append(f"氣溫 {t:g}°C {weather}")
+    parts.append('穿搭推薦')
+    return ' '.join(parts)
+
+
+def compact_outfit(outfit: dict) -> dict:
+    return {
+        "id": outfit.get('id'),
+        "name": outfit.get('name'),
+        "occasion": outfit.get('occasion'),
+        "items": [{"id": i.get('id'), "name": i.get('name')} for i in outfit.get('items', [])],
+    }
+
+
+def read_requests(path: str):
+    """讀取 NDJSON 或 CSV（依副檔名）；空行略過"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield {k: v for k, v in row.items() if v not in (None, '')}
+            return
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ 第 {line_no} 行不是合法的 JSON，略過: {e}", file=sys.stderr)
+
+
+def load_done(path: str):
+    """讀取既有的輸出檔，回傳已成功的 id；最後一行沒寫完（當機）時先截掉"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+            print(f"⚠️ 截掉輸出檔最後 {len(data) - end} bytes 未完成的紀錄", file=sys.stderr)
+    done = set()
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not record.get('error'):
+            done.add(record.get('id'))
+    return done
+
+
+class BatchRecommender:
+    def __init__(self, retrieve, complete=None, keywords=None, rag_context=None,
+                 concurrency: int = DEFAULT_CONCURRENCY, run_sync=None, cache_size: int = SHARED_CACHE_SIZE):
+        """
+        Args:
+            retrieve: retrieve(query, user_id) → 穿搭清單（同步，會在執行緒中執行）
+            complete: await complete(user_input, outfits, model) → (response_text, used_model)；None 表示只做檢索
+            keywords: keywords(query) → 關鍵字清單
+            rag_context: rag_context(keywords, outfits) → 附加在提示後的 RAG 說明
+            concurrency: 同時處理的請求數上限
+            run_sync: await run_sync(fn, *args) 執行同步函數（預設 asyncio.to_thread）
+            cache_size: 共用的檢索 / 模型結果各保留幾筆
+        """
+        self.retrieve = retrieve
+        self.complete = complete
+        self.keywords = keywords or (lambda query: [])
+        self.rag_context = rag_context or (lambda keywords, outfits: "")
+        self.concurrency = max(1, concurrency)
+        self.run_sync = run_sync or asyncio.to_thread
+        self.cache_size = max(1, cache_size)
+        self._retrievals = OrderedDict()   # (query, user_id) -> Task
+        self._completions = OrderedDict()  # (user_input, 穿搭 id, model) -> Task
+
+        self.requests = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.retrievals = 0
+        self.llm_calls = 0
+        self.errors = 0
+
+    def _shared(self, cache, key, make):
+        """相同 key 共用同一個 Task；cache 只保留最近使用的 cache_size 筆
+        （淘汰的 Task 若還在執行，正在等待的請求仍持有它，不受影響）"""
+        task = cache.get(key)
+        if task is not None:
+            cache.move_to_end(key)
+            return task
+        task = cache[key] = asyncio.ensure_future(make())
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return task
+
+    async def _process(self, req):
+        rid = request_id(req)
+        record = {"id": rid, "query": None, "keywords": [], "outfits": [], "response": None,
+                  "model": None, "error": None}
+        try:
+            query = build_query(req)
+            user_id = req.get('user_id') or None
+            record["query"] = query
+            record["keywords"] = keywords = self.keywords(query)
+
+            def retrieve():
+                self.retrievals += 1
+                return self.run_sync(self.retrieve, query, user_id)
+
+            outfits = await self._shared(self._retrievals, (query, user_id), retrieve)
+            record["outfits"] = [compact_outfit(o) for o in outfits]
+
+            if self.complete is not None:
+                model = req.get('model') or 'auto'
+                user_input = query + self.rag_context(keywords, outfits)
+                key = (user_input, tuple(o.get('id') for o in outfits), model.lower())
+
+                def complete():
+                    self.llm_calls += 1
+                    return self.complete(user_input, outfits, model)
+
+                response, used_model = await self._shared(self._completions, key, complete)
+                record["response"], record["model"] = response, used_model
+                if response is None:
+                    record["error"] = "所有 AI 服務都無法使用"
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+        if record["error"]:
+            self.errors += 1
+        return record
+
+    async def run(self, requests, skip=()):
+        """依完成順序產出每個請求的結果；skip 中的 id 與重複的 id 略過"""
+        pending = asyncio.Queue(maxsize=self.concurrency * 4)
+        results = asyncio.Queue()
+        seen = set()
+
+        async def feed():
+            try:
+                for req in requests:
+                    if not isinstance(req, dict):
+                        continue
+                    rid = request_id(req)
+                    if rid in seen:
+                        self.duplicates += 1
+                        continue
+                    seen.add(rid)
+                    if rid in skip:
+                        self.skipped += 1
+                        continue
+                    self.requests += 1
+                    await pending.put(req)
+            finally:
+                # 讀取請求失敗時也要讓 worker 結束
+                for _ in range(self.concurrency):
+                    await pending.put(None)
+
+        async def worker():
+            while True:
+                req = await pending.get()
+                if req is None:
+                    break
+                await results.put(await self._process(req))
+            await results.put(None)
+
+        tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            remaining = self.concurrency
+            while remaining:
+                record = await results.get()
+                if record is None:
+                    remaining -= 1
+                    continue
+                yield record
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "retrievals": self.retrievals,
+            "llm_calls": self.llm_calls,
+            "errors": self.errors,
+        }
+
+
+def app_recommender(concurrency: int = DEFAULT_CONCURRENCY, rate_limits=None, run_sync=None):
+    """以 app.py 的檢索與 AI Agent 建立 BatchRecommender（未啟用 AI 時只做檢索）"""
+    from app import agent, USE_GEMINI, load_outfits, extract_keywords, build_rag_context, BATCH_RATE_LIMITS
+
+    complete = None
+    if USE_GEMINI and agent:
+        limits = ProviderRateLimits(rate_limits if rate_limits is not None else parse_rate_limits(BATCH_RATE_LIMITS))
+
+        def complete(user_input, outfits, model):
+            return agent.acomplete(user_input, outfits, model, before_call=limits)
+
+    return BatchRecommender(load_outfits, complete, extract_keywords, build_rag_context, concurrency, run_sync)
+
+
+async def run_to_file(recommender, requests, output: str):
+    skip = load_done(output)
+    if skip:
+        print(f"↩️ 續跑：略過 {len(skip)} 筆已完成的請求", file=sys.stderr)
+    written = 0
+    with open(output, 'a', encoding='utf-8') as out:
+        async for record in recommender.run(requests, skip):
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            out.flush()
+            written += 1
+            if written % FSYNC_EVERY == 0:
+                os.fsync(out.fileno())
+        os.fsync(out.fileno())
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次穿搭推薦（NDJSON 輸出，可續跑）")
+    parser.add_argument('input', help="請求檔（.ndjson / .jsonl 或 .csv）")
+    parser.add_argument('-o', '--output', required=True, help="結果檔（NDJSON，已存在時續跑）")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同時處理的請求數")
+    parser.add_argument('--rate', default=None, help="每個模型每秒請求數，例如 Gemini=2,Groq=5")
+    args = parser.parse_args(argv)
+
+    recommender = app_recommender(args.concurrency, parse_rate_limits(args.rate) if args.rate else None)
+    written = asyncio.run(run_to_file(recommender, read_requests(args.input), args.output))
+    print(f"✅ 寫入 {written} 筆結果 {recommender.stats()}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
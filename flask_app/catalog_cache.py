@@ -0,0 +1,205 @@
+"""
+型錄讀取快取模組
+- CatalogVersion：型錄版本號（MySQL catalog_version 表，items / outfits / outfit_items 異動時由 trigger 遞增），
+  在程序內快取，每 refresh_interval 秒最多查一次資料庫；版本改變時通知其他快取失效
+- 依「版本 + 查詢參數 + 編碼」產生強 ETag，If-None-Match 命中時直接回 304
+- 依 Accept-Encoding 協商 br / gzip 壓縮，並以 LRU 快取已編碼的回應主體
+"""
+
+import gzip
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # 未安裝時只提供 gzip
+    brotli = None
+
+# 小於此大小的回應不壓縮（壓縮後的節省抵不過 CPU 與標頭成本）
+MIN_COMPRESS_SIZE = 512
+
+
+class CatalogVersion:
+    def __init__(self, loader, refresh_interval: float = 2.0):
+        """建立型錄版本快取
+
+        Args:
+            loader: 呼叫 loader() 讀取資料庫中的版本號
+            refresh_interval: 兩次讀取資料庫之間的最短間隔（秒）
+        """
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._version = None
+        self._checked_at = 0.0
+        self._refreshing = False
+
+        self.refreshes = 0
+        self.changes = 0
+        self.errors = 0
+
+    def on_change(self, callback):
+        """註冊版本改變時的回呼 callback(old, new)"""
+        self._listeners.append(callback)
+        return callback
+
+    def current(self):
+        """目前的版本號；從未讀到過時回傳 None（呼叫端應略過所有快取）
+
+        過期時只有一個請求負責重新讀取，其他請求沿用目前的值，不等待資料庫。
+        讀取失敗時沿用上一次的版本、不觸發回呼，等下一個 refresh_interval 再試：
+        若改成 None，恢復後第一次讀到的版本會被當成「沒有舊值」，期間的型錄異動就不會通知快取失效。
+        """
+        with self._lock:
+            stale = time.monotonic() - self._checked_at >= self.refresh_interval
+            if not stale or (self._refreshing and self._version is not None):
+                return self._version
+            self._refreshing = True
+
+        try:
+            version = self.loader()
+        except Exception as e:
+            print(f"⚠️ 讀取型錄版本失敗: {e}", file=sys.stderr)
+            with self._lock:
+                self.errors += 1
+                self._checked_at = time.monotonic()
+                return self._version
+        finally:
+            with self._lock:
+                self._refreshing = False
+        self._set(version)
+        return version
+
+    def _set(self, version):
+        with self._lock:
+            old = self._version
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.refreshes += 1
+            changed = old is not None and version != old
+            if changed:
+                self.changes += 1
+        if changed:
+            for callback in self._listeners:
+                try:
+                    callback(old, version)
+                except Exception as e:
+                    print(f"⚠️ 型錄版本回呼失敗: {e}", file=sys.stderr)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._version,
+                "refresh_interval": self.refresh_interval,
+                "refreshes": self.refreshes,
+                "changes": self.changes,
+                "errors": self.errors,
+            }
+
+
+def params_key(path: str, args) -> str:
+    """把路徑與查詢參數整理成固定順序的字串（參數順序不同仍視為同一請求）"""
+    pairs = sorted((k, v) for k in args for v in args.getlist(k))
+    return path + "?" + "&".join(f"{k}={v}" for k, v in pairs)
+
+
+def make_etag(version, key: str, encoding: str) -> str:
+    """強 ETag：同一版本、同一查詢、同一編碼的回應內容逐位元組相同"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+    return f'"v{version}-{digest}-{encoding}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def negotiate_encoding(accept_encoding) -> str:
+    """依 Accept-Encoding 選擇 br、gzip 或 identity"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def encode_body(body: bytes, encoding: str):
+    """壓縮回應主體，回傳 (body, 實際使用的編碼)"""
+    if encoding == "identity" or len(body) < MIN_COMPRESS_SIZE:
+        return body, "identity"
+    if encoding == "br":
+        return brotli.compress(body, quality=5), "br"
+    return gzip.compress(body, compresslevel=6, mtime=0), "gzip"
+
+
+class EncodedResponseCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        """以 (ETag) 為 key 的已編碼回應 LRU 快取，值為 (body, headers)"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def put(self, etag: str, body: bytes, headers: dict):
+        with self._lock:
+            old = self._entries.pop(etag, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[etag] = (body, headers)
+            self._bytes += len(body)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (dropped, _) = self._entries.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def clear(self, *_):
+        """清空快取（可直接註冊為 CatalogVersion.on_change 回呼）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,166 @@
+"""
+穿搭 / 衣物查詢模組
+集中 items、outfits、outfit_items 的 SQL，並負責轉換成可 JSON 序列化的格式
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+OUTFIT_LIMIT = 5
+
+# /items 可選的欄位（fields= 投影）與分頁上限
+ITEM_FIELDS = ('id', 'sku', 'name', 'category', 'color', 'size', 'price', 'image_url', 'created_at')
+OUTFIT_FIELDS = ('id', 'name', 'occasion', 'description', 'created_at')
+ITEMS_DEFAULT_LIMIT = 100
+ITEMS_MAX_LIMIT = 1000
+ITEMS_EXPORT_BATCH = 1000
+
+
+def normalize_color(color):
+    """與 items.color_norm（LOWER(TRIM(color))）相同的正規化"""
+    return color.strip().lower() if color else color
+
+
+def serialize_row(row: dict):
+    """就地轉換 datetime 和 Decimal 為可序列化類型"""
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            row[key] = value.isoformat()
+        elif isinstance(value, Decimal):
+            row[key] = float(value)
+    return row
+
+
+def parse_item_fields(fields):
+    """解析 fields=（逗號分隔），回傳要查詢的欄位；id 一定包含（分頁游標需要）"""
+    if not fields:
+        return list(ITEM_FIELDS)
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in ITEM_FIELDS]
+    if unknown:
+        raise ValueError(f"不支援的欄位: {', '.join(unknown)}")
+    return ['id'] + [f for f in requested if f != 'id']
+
+
+def _item_filters(category=None, color=None):
+    where, params = [], []
+    if category:
+        where.append("category = %s")
+        params.append(category)
+    if color:
+        where.append("color_norm = %s")
+        params.append(normalize_color(color))
+    return where, params
+
+
+def fetch_items_page(cur, category=None, color=None, after_id=None,
+                     limit: int = ITEMS_DEFAULT_LIMIT, fields=None):
+    """keyset 分頁查詢衣物，回傳 (items, next_cursor)
+
+    以 id 作為游標（WHERE id > 游標 ORDER BY id），category / color 走 (category|color_norm, id) 索引，
+    翻到第幾頁都只讀 limit + 1 筆。
+    """
+    columns = fields or list(ITEM_FIELDS)
+    where, params = _item_filters(category, color)
+    if after_id is not None:
+        where.append("id > %s")
+        params.append(after_id)
+
+    sql = f"SELECT {', '.join(columns)} FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id LIMIT %s"
+    cur.execute(sql, [*params, limit + 1])
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]['id']
+    return [serialize_row(dict(r)) for r in rows], next_cursor
+
+
+def iter_items(cur, category=None, color=None, fields=None, batch_size: int = ITEMS_EXPORT_BATCH):
+    """依 id 順序逐批產出衣物（整份匯出用）
+
+    搭配伺服器端游標（SSDictCursor）時資料一邊讀一邊送出，記憶體用量與型錄大小無關。
+    """
+    columns = fields or list(ITEM_FIELDS)
+    where, params = _item_filters(category, color)
+    sql = f"SELECT {', '.join(columns)} FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [serialize_row(dict(r)) for r in rows]
+
+
+def count_items(cur, category=None, color=None):
+    """符合篩選條件的衣物總數（需要時才查詢）"""
+    where, params = _item_filters(category, color)
+    sql = "SELECT COUNT(*) AS total FROM items"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    cur.execute(sql, params)
+    return cur.fetchall()[0]['total']
+
+
+def fetch_outfits(cur, occasions=None, limit: int = OUTFIT_LIMIT):
+    """依場合檢索穿搭；找不到時退回前 limit 組"""
+    outfits = []
+    if occasions:
+        placeholders = ','.join(['%s'] * len(occasions))
+        cur.execute(
+            f"SELECT {', '.join(OUTFIT_FIELDS)} FROM outfits WHERE occasion IN ({placeholders}) ORDER BY id LIMIT %s",
+            [*occasions, limit]
+        )
+        outfits = cur.fetchall()
+
+    if not outfits:
+        cur.execute(f"SELECT {', '.join(OUTFIT_FIELDS)} FROM outfits ORDER BY id LIMIT %s", (limit,))
+        outfits = cur.fetchall()
+    return [serialize_row(dict(o)) for o in outfits]
+
+
+def attach_outfit_items(cur, outfits):
+    """一次查詢取回所有穿搭的單品，並依 outfit_id 分組放入 outfit['items']"""
+    if not outfits:
+        return outfits
+
+    by_id = {}
+    for outfit in outfits:
+        outfit['items'] = []
+        by_id[outfit['id']] = outfit
+
+    placeholders = ','.join(['%s'] * len(by_id))
+    cur.execute(f"""
+        SELECT oi.outfit_id AS _outfit_id, {', '.join('i.' + f for f in ITEM_FIELDS)} FROM outfit_items oi
+        JOIN items i ON i.id = oi.item_id
+        WHERE oi.outfit_id IN ({placeholders})
+        ORDER BY oi.outfit_id, oi.id
+    """, list(by_id))
+
+    for row in cur.fetchall():
+        item = dict(row)
+        outfit_id = item.pop('_outfit_id')
+        by_id[outfit_id]['items'].append(serialize_row(item))
+    return outfits
+
+
+def fetch_outfits_by_ids(cur, ids):
+    """依給定順序取回穿搭（含單品），不存在的 id 略過"""
+    if not ids:
+        return []
+    placeholders = ','.join(['%s'] * len(ids))
+    cur.execute(f"SELECT {', '.join(OUTFIT_FIELDS)} FROM outfits WHERE id IN ({placeholders})", list(ids))
+    found = {row['id']: serialize_row(dict(row)) for row in cur.fetchall()}
+    return attach_outfit_items(cur, [found[i] for i in ids if i in found])
+
+
+def fetch_outfits_with_items(cur, occasions=None, limit: int = OUTFIT_LIMIT):
+    """RAG 檢索：穿搭 + 單品，最多兩到三次查詢（不隨穿搭數量增加）"""
+    return attach_outfit_items(cur, fetch_outfits(cur, occasions, limit))
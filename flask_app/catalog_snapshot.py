@@ -0,0 +1,411 @@
+"""
+記憶體內型錄快照模組
+把 items / outfits / outfit_items 讀進記憶體（__slots__ 紀錄 + 反向索引），
+/items 篩選與 /recommend 的 RAG 檢索直接查快照，不必每次回到 MySQL
+
+- 反向索引：category、正規化顏色、occasion → 依 id 排序的 id 清單；outfit → 單品 id 清單
+- 快照本身不可變；增量更新時複製有異動的部分並換上新快照，讀取端不需要加鎖
+- 增量更新依據 catalog_changes 表（由 trigger 記錄每筆異動的表名與 id），
+  只重新讀取有異動的資料列；異動過多或紀錄已被清除時改為整份重建
+"""
+
+import bisect
+import heapq
+import sys
+import threading
+import time
+
+from catalog_queries import ITEM_FIELDS, OUTFIT_FIELDS, normalize_color, serialize_row
+
+# 單次增量更新最多處理的異動筆數，超過就整份重建
+MAX_INCREMENTAL_CHANGES = 5000
+# IN (...) 查詢每批的 id 數
+ID_CHUNK = 1000
+
+
+class ItemRecord:
+    __slots__ = ITEM_FIELDS + ('color_norm',)
+
+    def __init__(self, row):
+        for field in ITEM_FIELDS:
+            setattr(self, field, row.get(field))
+        self.color_norm = normalize_color(self.color)
+
+    def as_dict(self, fields=ITEM_FIELDS):
+        return {f: getattr(self, f) for f in fields}
+
+
+class OutfitRecord:
+    __slots__ = OUTFIT_FIELDS
+
+    def __init__(self, row):
+        for field in OUTFIT_FIELDS:
+            setattr(self, field, row.get(field))
+
+    def as_dict(self):
+        return {f: getattr(self, f) for f in OUTFIT_FIELDS}
+
+
+def _index_add(index, key, record_id, copied):
+    """把 id 加入 index[key]（依序插入）；同一次更新中第一次修改某個清單時先複製"""
+    if key is None:
+        return
+    ids = index.get(key)
+    if ids is None:
+        ids = index[key] = []
+        copied.add(key)
+    elif key not in copied:
+        ids = index[key] = list(ids)
+        copied.add(key)
+    pos = bisect.bisect_left(ids, record_id)
+    if pos == len(ids) or ids[pos] != record_id:
+        ids.insert(pos, record_id)
+
+
+def _index_remove(index, key, record_id, copied):
+    ids = index.get(key)
+    if not ids:
+        return
+    pos = bisect.bisect_left(ids, record_id)
+    if pos == len(ids) or ids[pos] != record_id:
+        return
+    if key not in copied:
+        ids = index[key] = list(ids)
+        copied.add(key)
+    del ids[pos]
+    if not ids:
+        del index[key]
+
+
+def _sorted_remove(ids, record_id):
+    pos = bisect.bisect_left(ids, record_id)
+    if pos < len(ids) and ids[pos] == record_id:
+        del ids[pos]
+
+
+class CatalogSnapshot:
+    """某個時間點的型錄（建立後不再修改）"""
+
+    def __init__(self, change_seq=0):
+        self.change_seq = change_seq  # 已套用到的 catalog_changes.seq
+        self.items = {}               # id -> ItemRecord
+        self.item_ids = []            # 依 id 排序
+        self.by_category = {}         # category -> [item id, ...]
+        self.by_color = {}            # color_norm -> [item id, ...]
+        self.outfits = {}             # id -> OutfitRecord
+        self.outfit_ids = []
+        self.by_occasion = {}         # occasion -> [outfit id, ...]
+        self.outfit_items = {}        # outfit id -> (item id, ...)，依 outfit_items.id 排序
+
+    # ---------- 建立 ----------
+
+    @classmethod
+    def build(cls, item_rows, outfit_rows, link_rows, change_seq=0):
+        """由完整的資料列建立快照；資料列需依 id（link_rows 依 outfit_id, id）排序"""
+        snap = cls(change_seq)
+        for row in item_rows:
+            item = ItemRecord(serialize_row(dict(row)))
+            snap.items[item.id] = item
+            snap.item_ids.append(item.id)
+            snap.by_category.setdefault(item.category, []).append(item.id)
+            if item.color_norm:
+                snap.by_color.setdefault(item.color_norm, []).append(item.id)
+        for row in outfit_rows:
+            outfit = OutfitRecord(serialize_row(dict(row)))
+            snap.outfits[outfit.id] = outfit
+            snap.outfit_ids.append(outfit.id)
+            snap.by_occasion.setdefault(outfit.occasion, []).append(outfit.id)
+        links = {}
+        for row in link_rows:
+            links.setdefault(row['outfit_id'], []).append(row['item_id'])
+        snap.outfit_items = {k: tuple(v) for k, v in links.items()}
+        return snap
+
+    def apply(self, change_seq, item_rows, removed_items, outfit_rows, removed_outfits, links):
+        """套用增量異動，回傳新快照（未異動的清單與自身共用）
+
+        Args:
+            item_rows / outfit_rows: 新增或修改後的資料列
+            removed_items / removed_outfits: 已刪除的 id
+            links: {outfit_id: [item_id, ...]}，需重設單品清單的穿搭
+        """
+        snap = CatalogSnapshot(change_seq)
+        snap.items = dict(self.items)
+        snap.by_category = dict(self.by_category)
+        snap.by_color = dict(self.by_color)
+        snap.outfits = dict(self.outfits)
+        snap.by_occasion = dict(self.by_occasion)
+        snap.outfit_items = dict(self.outfit_items)
+
+        copied_cat, copied_color, copied_occ = set(), set(), set()
+        item_ids = list(self.item_ids) if (item_rows or removed_items) else self.item_ids
+        outfit_ids = list(self.outfit_ids) if (outfit_rows or removed_outfits) else self.outfit_ids
+
+        def remove_item(item_id):
+            old = snap.items.pop(item_id, None)
+            if old is None:
+                return
+            _index_remove(snap.by_category, old.category, item_id, copied_cat)
+            _index_remove(snap.by_color, old.color_norm, item_id, copied_color)
+            _sorted_remove(item_ids, item_id)
+
+        def remove_outfit(outfit_id):
+            old = snap.outfits.pop(outfit_id, None)
+            if old is None:
+                return
+            _index_remove(snap.by_occasion, old.occasion, outfit_id, copied_occ)
+            _sorted_remove(outfit_ids, outfit_id)
+            snap.outfit_items.pop(outfit_id, None)
+
+        for item_id in removed_items:
+            remove_item(item_id)
+        for row in item_rows:
+            item = ItemRecord(serialize_row(dict(row)))
+            remove_item(item.id)
+            snap.items[item.id] = item
+            bisect.insort(item_ids, item.id)
+            _index_add(snap.by_category, item.category, item.id, copied_cat)
+            if item.color_norm:
+                _index_add(snap.by_color, item.color_norm, item.id, copied_color)
+
+        for outfit_id in removed_outfits:
+            remove_outfit(outfit_id)
+        for row in outfit_rows:
+            outfit = OutfitRecord(serialize_row(dict(row)))
+            old_links = snap.outfit_items.get(outfit.id)
+            remove_outfit(outfit.id)
+            snap.outfits[outfit.id] = outfit
+            bisect.insort(outfit_ids, outfit.id)
+            _index_add(snap.by_occasion, outfit.occasion, outfit.id, copied_occ)
+            if old_links:
+                snap.outfit_items[outfit.id] = old_links
+
+        for outfit_id, linked in links.items():
+            if linked and outfit_id in snap.outfits:
+                snap.outfit_items[outfit_id] = tuple(linked)
+            else:
+                snap.outfit_items.pop(outfit_id, None)
+
+        snap.item_ids = item_ids
+        snap.outfit_ids = outfit_ids
+        return snap
+
+    # ---------- 查詢 ----------
+
+    def _item_candidates(self, category=None, color=None):
+        """回傳 (依 id 排序的候選 id, 額外條件)；兩個條件都有時走較短的索引再過濾"""
+        color = normalize_color(color)
+        if category and color:
+            by_cat = self.by_category.get(category, [])
+            by_color = self.by_color.get(color, [])
+            if len(by_cat) <= len(by_color):
+                return by_cat, lambda item: item.color_norm == color
+            return by_color, lambda item: item.category == category
+        if category:
+            return self.by_category.get(category, []), None
+        if color:
+            return self.by_color.get(color, []), None
+        return self.item_ids, None
+
+    def page_items(self, category=None, color=None, after_id=None, limit=100, fields=None):
+        """與 catalog_queries.fetch_items_page 相同的分頁語意，回傳 (items, next_cursor)"""
+        fields = tuple(fields or ITEM_FIELDS)
+        ids, predicate = self._item_candidates(category, color)
+        start = bisect.bisect_right(ids, after_id) if after_id is not None else 0
+
+        page = []
+        for pos in range(start, len(ids)):
+            item = self.items[ids[pos]]
+            if predicate is not None and not predicate(item):
+                continue
+            page.append(item)
+            if len(page) > limit:
+                break
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1].id
+        return [item.as_dict(fields) for item in page], next_cursor
+
+    def count_items(self, category=None, color=None):
+        ids, predicate = self._item_candidates(category, color)
+        if predicate is None:
+            return len(ids)
+        return sum(1 for item_id in ids if predicate(self.items[item_id]))
+
+    def outfits_with_items(self, occasions=None, limit=5):
+        """與 catalog_queries.fetch_outfits_with_items 相同：依場合取穿搭，找不到時退回前 limit 組"""
+        ids = []
+        if occasions:
+            lists = [self.by_occasion[o] for o in set(occasions) if o in self.by_occasion]
+            for outfit_id in heapq.merge(*lists):
+                ids.append(outfit_id)
+                if len(ids) >= limit:
+                    break
+        if not ids:
+            ids = self.outfit_ids[:limit]
+        return self.outfit_dicts(ids)
+
+    def outfit_dicts(self, ids):
+        """依給定順序回傳穿搭（含單品），不存在的 id 略過"""
+        result = []
+        for outfit_id in ids:
+            if outfit_id not in self.outfits:
+                continue
+            outfit = self.outfits[outfit_id].as_dict()
+            # 單品被刪除時 FK 連鎖刪除不會觸發 trigger，這裡略過已不存在的單品
+            outfit['items'] = [self.items[i].as_dict() for i in self.outfit_items.get(outfit_id, ())
+                               if i in self.items]
+            result.append(outfit)
+        return result
+
+    def stats(self):
+        return {
+            "change_seq": self.change_seq,
+            "items": len(self.items),
+            "outfits": len(self.outfits),
+            "categories": len(self.by_category),
+            "colors": len(self.by_color),
+            "occasions": len(self.by_occasion),
+        }
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), ID_CHUNK):
+        yield ids[i:i + ID_CHUNK]
+
+
+def _fetch_by_ids(cur, sql, ids):
+    rows = []
+    for chunk in _chunks(ids):
+        cur.execute(sql.format(placeholders=','.join(['%s'] * len(chunk))), chunk)
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def load_snapshot(cur):
+    """從資料庫完整讀取型錄"""
+    cur.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM catalog_changes")
+    change_seq = cur.fetchall()[0]['seq']
+    cur.execute(f"SELECT {', '.join(ITEM_FIELDS)} FROM items ORDER BY id")
+    items = cur.fetchall()
+    cur.execute(f"SELECT {', '.join(OUTFIT_FIELDS)} FROM outfits ORDER BY id")
+    outfits = cur.fetchall()
+    cur.execute("SELECT outfit_id, item_id FROM outfit_items ORDER BY outfit_id, id")
+    links = cur.fetchall()
+    return CatalogSnapshot.build(items, outfits, links, change_seq)
+
+
+def refresh_snapshot(cur, snapshot):
+    """依 catalog_changes 增量更新快照；需要時整份重建。回傳 (新快照, 是否為整份重建)"""
+    if snapshot is None:
+        return load_snapshot(cur), True
+
+    cur.execute("SELECT MIN(seq) AS first_seq FROM catalog_changes")
+    first_seq = cur.fetchall()[0]['first_seq']
+    if first_seq is not None and first_seq > snapshot.change_seq + 1:
+        # 異動紀錄已被清除，無法得知中間的變化
+        return load_snapshot(cur), True
+
+    cur.execute(
+        "SELECT seq, table_name, row_id FROM catalog_changes WHERE seq > %s ORDER BY seq LIMIT %s",
+        (snapshot.change_seq, MAX_INCREMENTAL_CHANGES + 1)
+    )
+    changes = cur.fetchall()
+    if not changes:
+        return snapshot, False
+    if len(changes) > MAX_INCREMENTAL_CHANGES:
+        return load_snapshot(cur), True
+
+    changed = {'items': set(), 'outfits': set(), 'outfit_items': set()}
+    for change in changes:
+        changed.setdefault(change['table_name'], set()).add(change['row_id'])
+
+    item_rows = _fetch_by_ids(
+        cur, f"SELECT {', '.join(ITEM_FIELDS)} FROM items WHERE id IN ({{placeholders}}) ORDER BY id",
+        changed['items'])
+    outfit_rows = _fetch_by_ids(
+        cur, f"SELECT {', '.join(OUTFIT_FIELDS)} FROM outfits WHERE id IN ({{placeholders}}) ORDER BY id",
+        changed['outfits'])
+    link_rows = _fetch_by_ids(
+        cur, "SELECT outfit_id, item_id FROM outfit_items WHERE outfit_id IN ({placeholders}) ORDER BY outfit_id, id",
+        changed['outfit_items'])
+
+    links = {outfit_id: [] for outfit_id in changed['outfit_items']}
+    for row in link_rows:
+        links[row['outfit_id']].append(row['item_id'])
+
+    found_items = {row['id'] for row in item_rows}
+    found_outfits = {row['id'] for row in outfit_rows}
+    return snapshot.apply(
+        changes[-1]['seq'],
+        item_rows, changed['items'] - found_items,
+        outfit_rows, changed['outfits'] - found_outfits,
+        links
+    ), False
+
+
+class LiveCatalog:
+    def __init__(self, connect, retry_interval: float = 30.0):
+        """維護最新的型錄快照
+
+        Args:
+            connect: 回傳資料庫連線 context manager 的函數（例如 get_db_conn）
+            retry_interval: 更新失敗後隔多久才再嘗試（期間呼叫端改查資料庫）
+        """
+        self.connect = connect
+        self.retry_interval = retry_interval
+        self._failed_at = None
+        self.snapshot = None
+        self.version = None  # 快照對應的型錄版本
+        self._lock = threading.Lock()
+
+        self.full_loads = 0
+        self.incremental = 0
+        self.errors = 0
+        self.last_refresh_ms = 0.0
+
+    def get(self, version):
+        """回傳對應 version 的快照；版本改變時先更新，失敗時回傳 None（呼叫端改查資料庫）"""
+        if version is None:
+            return None
+        snapshot = self.snapshot
+        if snapshot is not None and self.version == version:
+            return snapshot
+
+        with self._lock:
+            if self.snapshot is not None and self.version == version:
+                return self.snapshot
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return None
+            start = time.perf_counter()
+            try:
+                with self.connect() as conn:
+                    with conn.cursor() as cur:
+                        snapshot, full = refresh_snapshot(cur, self.snapshot)
+            except Exception as e:
+                self.errors += 1
+                self._failed_at = time.monotonic()
+                print(f"⚠️ 型錄快照更新失敗，改查資料庫: {e}", file=sys.stderr)
+                return None
+            self.snapshot, self.version = snapshot, version
+            self._failed_at = None
+            self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 2)
+            if full:
+                self.full_loads += 1
+            else:
+                self.incremental += 1
+            return snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "version": self.version,
+            "full_loads": self.full_loads,
+            "incremental_refreshes": self.incremental,
+            "errors": self.errors,
+            "last_refresh_ms": self.last_refresh_ms,
+            **(snapshot.stats() if snapshot else {}),
+        }
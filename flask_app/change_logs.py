@@ -0,0 +1,49 @@
+"""
+異動紀錄保留模組
+catalog_changes（型錄）與 favorite_changes（收藏）由 trigger 持續寫入、只增不減，
+定期刪除舊紀錄，每張表只保留序號在最新 CHANGE_LOG_RETENTION 以內的部分：
+- 讀取端落後超過保留範圍時會發現序號不連續，改為整份重建（記憶體快照、個人化候選都已處理），結果仍正確
+- 至少保留最新一筆：MAX(seq) 用來判斷是否有新的異動
+- 分批刪除（每批一個交易），不會長時間鎖住表
+
+CandidateJob 每 CHANGE_LOG_PRUNE_INTERVAL 秒執行一次（持有工作鎖，多個 worker 中只有一個在刪）；
+也可單獨執行（例如排程）：
+    python change_logs.py
+"""
+
+import os
+import sys
+
+CHANGE_LOG_RETENTION = max(1, int(os.getenv("CHANGE_LOG_RETENTION", "100000")))
+CHANGE_LOG_PRUNE_INTERVAL = float(os.getenv("CHANGE_LOG_PRUNE_INTERVAL", "600"))
+PRUNE_BATCH = 10000
+CHANGE_LOG_TABLES = ("catalog_changes", "favorite_changes")
+
+
+def prune_change_log(conn, cur, table: str, keep: int = CHANGE_LOG_RETENTION, batch: int = PRUNE_BATCH) -> int:
+    """刪除 table 中序號比最新一筆小 keep 以上的紀錄，回傳刪除筆數"""
+    if table not in CHANGE_LOG_TABLES:
+        raise ValueError(f"未知的異動紀錄表: {table}")
+    cur.execute(f"SELECT COALESCE(MAX(seq), 0) AS seq FROM {table}")
+    cutoff = cur.fetchone()['seq'] - max(1, keep)
+    deleted = 0
+    while cutoff > 0:
+        cur.execute(f"DELETE FROM {table} WHERE seq <= %s ORDER BY seq LIMIT %s", (cutoff, batch))
+        conn.commit()
+        deleted += cur.rowcount
+        if cur.rowcount < batch:
+            break
+    return deleted
+
+
+def prune_change_logs(conn, cur, keep: int = CHANGE_LOG_RETENTION) -> dict:
+    """清除所有異動紀錄表的舊紀錄，回傳 {表名: 刪除筆數}"""
+    return {table: prune_change_log(conn, cur, table, keep) for table in CHANGE_LOG_TABLES}
+
+
+if __name__ == '__main__':
+    from app import get_db_conn
+
+    with get_db_conn() as conn, conn.cursor() as cur:
+        deleted = prune_change_logs(conn, cur)
+    print(f"🧹 清除異動紀錄：{deleted}（每張表保留最新 {CHANGE_LOG_RETENTION:,} 筆序號）", file=sys.stderr)
@@ -0,0 +1,490 @@
+"""
+對話記錄儲存模組
+可替換的對話儲存後端，多個 worker / 多台機器可以共用同一份對話記錄：
+- file：append-only JSONL 日誌 + 記憶體位移索引，每則訊息只追加一行（O(1) 寫入），
+        以檔案鎖（flock）協調多個行程，背景執行緒負責壓縮日誌
+- sqlite：SQLite WAL 模式，適合單機多 worker
+- redis：Redis（或相容服務）list，適合多台機器
+以 SESSION_STORE 環境變數選擇後端（預設 file）
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+try:
+    import fcntl  # 只有 Unix 有；Windows 本機開發時退回只用執行緒鎖
+except ImportError:
+    fcntl = None
+
+SESSION_STORE = os.getenv("SESSION_STORE", "file")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+# =========================
+# 📐 儲存介面
+# =========================
+class ConversationStore(ABC):
+    """對話儲存介面：每則訊息追加一筆，依 session 讀取 / 刪除（子類別少實作任何一個方法就無法建立）"""
+
+    @abstractmethod
+    def append_turn(self, session_id: str, message: dict, created_at: str = None):
+        """追加一則對話；created_at 只在 session 第一筆時寫入"""
+
+    @abstractmethod
+    def load_session(self, session_id: str):
+        """讀取單一 session，回傳 {"messages": [...], "created_at": ...}；不存在時回傳 None"""
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        """刪除 session，回傳是否存在"""
+
+    @abstractmethod
+    def message_count(self, session_id: str):
+        """session 目前的訊息數（不存在時回傳 None），用來判斷其他 worker 是否已更新"""
+
+    def close(self):
+        pass
+
+
+# =========================
+# 📄 JSONL 檔案後端
+# =========================
+# 日誌紀錄格式（每行一筆 JSON）：
+#   {"op": "turn",  "sid": ..., "msg": {...}, "created_at": ...}  created_at 只在 session 第一筆出現
+#   {"op": "clear", "sid": ...}
+
+class JsonlConversationStore(ConversationStore):
+    def __init__(self, path: str, legacy_json_path: str = None,
+                 compact_ratio: float = 0.5, compact_min_dead: int = 1000):
+        """開啟（或建立）對話日誌並重建索引
+
+        Args:
+            path: JSONL 日誌檔路徑
+            legacy_json_path: 舊版 conversations.json，日誌是空的時候會匯入一次
+            compact_ratio: 失效紀錄佔比超過此值時觸發背景壓縮
+            compact_min_dead: 失效紀錄至少達此數量才壓縮
+        """
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min_dead = compact_min_dead
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._compacting = False
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 行程間的鎖放在獨立檔案，日誌檔被壓縮替換時鎖仍然有效
+        self._lock_file = open(path + '.lock', 'a')
+        self._writer = None
+        self._reader = None
+
+        with self._locked(exclusive=True):
+            self._reopen()
+            self._repair_tail()
+            if legacy_json_path and os.path.exists(legacy_json_path) and self._file_size() == 0:
+                self._import_legacy(legacy_json_path)
+            self._sync()
+        self._maybe_compact()
+
+    # -------------------------
+    # 鎖與同步
+    # -------------------------
+    @contextmanager
+    def _locked(self, exclusive: bool = False):
+        """執行緒鎖 + 行程間檔案鎖（同一執行緒可重入，只有最外層會 flock）"""
+        with self._lock:
+            outer = self._lock_depth == 0
+            if outer and fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outer and fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _file_size(self):
+        return os.fstat(self._reader.fileno()).st_size
+
+    def _reopen(self):
+        """(重新)開啟日誌並清空索引，之後由 _sync 從頭讀取"""
+        for f in (self._writer, self._reader):
+            if f is not None:
+                f.close()
+        self._writer = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        self._ino = os.fstat(self._reader.fileno()).st_ino
+        self._index = {}  # session_id -> [offset, ...]
+        self._created = {}  # session_id -> created_at
+        self._total = 0  # 日誌中的紀錄數
+        self._dead = 0  # 已失效（被 clear）的紀錄數
+        self._end = 0  # 已讀入索引的位元組數
+
+    def _repair_tail(self):
+        """上次寫到一半就中斷時，截掉殘缺的最後一行（需持有排他鎖）"""
+        size = self._file_size()
+        if size == 0:
+            return
+        self._reader.seek(size - 1)
+        if self._reader.read(1) == b'\n':
+            return
+        self._reader.seek(0)
+        keep = self._reader.read().rfind(b'\n') + 1
+        self._writer.truncate(keep)
+        self._writer.seek(0, os.SEEK_END)
+        print(f"⚠️ 對話日誌最後一行不完整，已截斷 ({self.path})", file=sys.stderr)
+
+    def _sync(self):
+        """讀入其他行程追加的紀錄；日誌被其他行程壓縮替換時重新載入"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._ino or st.st_size < self._end:
+            self._reopen()
+        if self._file_size() == self._end:
+            return
+
+        self._reader.seek(self._end)
+        for line in self._reader:
+            if not line.endswith(b'\n'):
+                break  # 其他行程正在寫入（理論上持鎖時不會發生）
+            start = self._end
+            self._end += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self._total += 1
+                self._dead += 1
+                continue
+            self._apply(record, start)
+
+    def _apply(self, record, offset):
+        sid = record.get('sid')
+        self._total += 1
+        if record.get('op') == 'clear':
+            self._dead += len(self._index.pop(sid, ())) + 1
+            self._created.pop(sid, None)
+            return
+        offsets = self._index.setdefault(sid, [])
+        if not offsets and record.get('created_at'):
+            self._created[sid] = record['created_at']
+        offsets.append(offset)
+
+    def _import_legacy(self, legacy_json_path):
+        """將舊版整份 JSON 的對話轉成日誌格式，完成後改名避免重複匯入"""
+        try:
+            with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                conversations = json.load(f)
+        except Exception as e:
+            print(f"⚠️ 匯入舊版對話記錄失敗: {e}", file=sys.stderr)
+            return
+        for sid, session in conversations.items():
+            for msg in session.get('messages', []):
+                self.append_turn(sid, msg, created_at=session.get('created_at'))
+        os.replace(legacy_json_path, legacy_json_path + '.migrated')
+        print(f"📥 已匯入 {len(conversations)} 個舊版對話 session", file=sys.stderr)
+
+    # -------------------------
+    # 寫入
+    # -------------------------
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._locked(exclusive=True):
+            self._sync()
+            offset = self._end
+            self._writer.write(line)
+            self._writer.flush()
+            self._end += len(line)
+            self._apply(record, offset)
+
+    def append_turn(self, session_id: str, message: dict, created_at: str = None):
+        """追加一則對話（不重寫既有內容）"""
+        with self._locked(exclusive=True):
+            self._sync()
+            record = {"op": "turn", "sid": session_id, "msg": message}
+            if created_at and session_id not in self._index:
+                record["created_at"] = created_at
+            self._append(record)
+
+    def delete_session(self, session_id: str):
+        """刪除 session（寫入 clear 紀錄，實際空間由壓縮回收）"""
+        with self._locked(exclusive=True):
+            self._sync()
+            if session_id not in self._index:
+                return False
+            self._append({"op": "clear", "sid": session_id})
+        self._maybe_compact()
+        return True
+
+    # -------------------------
+    # 讀取
+    # -------------------------
+    def load_session(self, session_id: str):
+        """依索引讀取單一 session；不存在時回傳 None"""
+        with self._locked():
+            self._sync()
+            offsets = self._index.get(session_id)
+            if offsets is None:
+                return None
+            records = []
+            for offset in offsets:
+                self._reader.seek(offset)
+                records.append(json.loads(self._reader.readline()))
+            created_at = self._created.get(session_id)
+
+        return {
+            "messages": [r["msg"] for r in records],
+            "created_at": created_at
+        }
+
+    def message_count(self, session_id: str):
+        with self._locked():
+            self._sync()
+            offsets = self._index.get(session_id)
+            return len(offsets) if offsets is not None else None
+
+    def __contains__(self, session_id):
+        with self._locked():
+            self._sync()
+            return session_id in self._index
+
+    def __len__(self):
+        with self._locked():
+            self._sync()
+            return len(self._index)
+
+    # -------------------------
+    # 背景壓縮
+    # -------------------------
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting or self._dead < self.compact_min_dead:
+                return
+            if self._dead < self._total * self.compact_ratio:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="conversation-compact", daemon=True).start()
+
+    def compact(self):
+        """重寫日誌，只保留仍有效的 session
+
+        第一階段只持共用鎖取得快照，複製有效紀錄時不持鎖；
+        第二階段持排他鎖補上期間新追加的紀錄（包含其他行程寫入的）後原子替換。
+        """
+        tmp_path = f"{self.path}.compact.{os.getpid()}"
+        try:
+            with self._locked():
+                self._compacting = True
+                self._sync()
+                snapshot = {sid: list(offsets) for sid, offsets in self._index.items()}
+                end = self._end
+                ino = self._ino
+
+            kept = 0
+            with open(self.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                if os.fstat(src.fileno()).st_ino != ino:
+                    return  # 其他行程剛壓縮過
+                for offsets in snapshot.values():
+                    for offset in offsets:
+                        src.seek(offset)
+                        dst.write(src.readline())
+
+                with self._locked(exclusive=True):
+                    try:
+                        if os.stat(self.path).st_ino != ino:
+                            return  # 其他行程已經替換了日誌，放棄這次壓縮
+                    except FileNotFoundError:
+                        return
+
+                    # 補上壓縮期間新追加的紀錄（可能包含 clear，由重新載入時處理）
+                    src.seek(end)
+                    for line in src:
+                        dst.write(line)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+
+                    os.replace(tmp_path, self.path)
+                    self._reopen()
+                    self._sync()
+                    kept = len(self._index)
+            print(f"🧹 對話日誌壓縮完成，保留 {kept} 個 session", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️ 對話日誌壓縮失敗: {e}", file=sys.stderr)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._compacting = False
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            self._reader.close()
+            self._lock_file.close()
+
+
+# =========================
+# 🗄️ SQLite 後端
+# =========================
+class SqliteConversationStore(ConversationStore):
+    def __init__(self, path: str, timeout: float = 30.0):
+        """SQLite（WAL 模式）對話儲存；每個執行緒使用自己的連線，多個行程由 SQLite 的鎖協調"""
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_turn(self, session_id: str, message: dict, created_at: str = None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO sessions (session_id, created_at) VALUES (?, ?)",
+                         (session_id, created_at))
+            conn.execute("INSERT INTO messages (session_id, body) VALUES (?, ?)",
+                         (session_id, json.dumps(message, ensure_ascii=False)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load_session(self, session_id: str):
+        conn = self._conn()
+        row = conn.execute("SELECT created_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        bodies = conn.execute("SELECT body FROM messages WHERE session_id = ? ORDER BY id", (session_id,)).fetchall()
+        return {
+            "messages": [json.loads(b[0]) for b in bodies],
+            "created_at": row[0]
+        }
+
+    def delete_session(self, session_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            deleted = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+    def message_count(self, session_id: str):
+        conn = self._conn()
+        row = conn.execute("""
+            SELECT (SELECT COUNT(*) FROM messages WHERE session_id = s.session_id)
+            FROM sessions s WHERE s.session_id = ?
+        """, (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# =========================
+# 🧠 Redis 後端
+# =========================
+class RedisConversationStore(ConversationStore):
+    def __init__(self, client=None, url: str = REDIS_URL, prefix: str = "outfit:conv", ttl: int = None):
+        """Redis 對話儲存：每個 session 一個 list（RPUSH 追加）與一個 created_at 字串
+
+        Args:
+            client: redis-py 相容的 client（未提供時以 url 建立）
+            prefix: key 前綴
+            ttl: session 過期秒數（None 表示不過期）
+        """
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _keys(self, session_id):
+        return f"{self.prefix}:{session_id}:messages", f"{self.prefix}:{session_id}:created_at"
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def append_turn(self, session_id: str, message: dict, created_at: str = None):
+        messages_key, created_key = self._keys(session_id)
+        # MULTI/EXEC 一次送出：同時有 delete_session 或另一個寫入時，不會只留下 created_at 或沒有 TTL 的 key
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(created_key, created_at or "", nx=True)
+            pipe.rpush(messages_key, json.dumps(message, ensure_ascii=False))
+            if self.ttl:
+                pipe.expire(messages_key, self.ttl)
+                pipe.expire(created_key, self.ttl)
+            pipe.execute()
+
+    def load_session(self, session_id: str):
+        messages_key, created_key = self._keys(session_id)
+        created_at = self.client.get(created_key)
+        if created_at is None:
+            return None
+        return {
+            "messages": [json.loads(self._text(m)) for m in self.client.lrange(messages_key, 0, -1)],
+            "created_at": self._text(created_at) or None
+        }
+
+    def delete_session(self, session_id: str):
+        return self.client.delete(*self._keys(session_id)) > 0
+
+    def message_count(self, session_id: str):
+        messages_key, created_key = self._keys(session_id)
+        if self.client.get(created_key) is None:
+            return None
+        return self.client.llen(messages_key)
+
+
+# =========================
+# 🏭 建立儲存後端
+# =========================
+def create_conversation_store(backend: str = None, path: str = None, legacy_json_path: str = None):
+    """依設定建立對話儲存後端（file / sqlite / redis）"""
+    backend = (backend or SESSION_STORE).lower()
+    if backend == "sqlite":
+        return SqliteConversationStore(path or SESSION_STORE_PATH or "/app/data/conversations.db")
+    if backend == "redis":
+        return RedisConversationStore(url=REDIS_URL)
+    if backend == "file":
+        return JsonlConversationStore(path or SESSION_STORE_PATH or "/app/data/conversations.jsonl",
+                                      legacy_json_path=legacy_json_path)
+    raise ValueError(f"未知的 SESSION_STORE: {backend}")
@@ -0,0 +1,172 @@
+"""
+資料庫連線池模組
+有上限、執行緒安全的連線池，支援健康檢查、閒置回收與統計資訊
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(RuntimeError):
+    """等待連線逾時（連線池已滿且沒有連線被歸還）"""
+
+
+# =========================
+# 🔌 連線池
+# =========================
+class ConnectionPool:
+    def __init__(self, factory, max_size: int = 10, max_idle: float = 300.0,
+                 health_check_interval: float = 30.0, timeout: float = 10.0):
+        """建立連線池
+
+        Args:
+            factory: 建立新連線的函數（無參數）
+            max_size: 同時存在的連線數上限
+            max_idle: 連線閒置超過此秒數即回收（關閉）
+            health_check_interval: 連線閒置超過此秒數，借出前先 ping 一次
+            timeout: 連線池已滿時，等待歸還的最長秒數
+        """
+        if max_size < 1:
+            raise ValueError("max_size 至少為 1")
+
+        self._factory = factory
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._idle = deque()  # (conn, last_used)，右端為最近歸還
+        self._cond = threading.Condition()
+        self._size = 0  # 目前存在（借出 + 閒置）的連線數
+
+        # 統計
+        self._checked_out = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _reserve(self):
+        """在鎖內取得一條閒置連線，或預留一個新連線名額
+
+        回傳 (conn, idle_for)；conn 為 None 表示已預留名額、需要自行建立。
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+
+                # 優先使用最近歸還的連線（LIFO），讓冷連線自然閒置到被回收
+                while self._idle:
+                    conn, last_used = self._idle.pop()
+                    idle_for = now - last_used
+                    if self.max_idle and idle_for > self.max_idle:
+                        self._size -= 1
+                        self._recycled += 1
+                        self._close_quietly(conn)
+                        continue
+                    self._checked_out += 1
+                    return conn, idle_for
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._checked_out += 1
+                    return None, 0.0
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"等待資料庫連線逾時（{self.timeout} 秒）")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _forget(self, conn=None):
+        """放棄一條已借出的連線（壞掉或建立失敗）"""
+        if conn is not None:
+            self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._checked_out -= 1
+            self._cond.notify()
+
+    def acquire(self):
+        """借出一條連線（必要時建立新連線）"""
+        while True:
+            conn, idle_for = self._reserve()
+
+            if conn is None:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._created += 1
+                return conn
+
+            # 閒置過久的連線先做健康檢查，失敗就丟棄重來
+            if idle_for > self.health_check_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._forget(conn)
+                    with self._cond:
+                        self._recycled += 1
+                    continue
+            return conn
+
+    def release(self, conn, discard: bool = False):
+        """歸還連線；discard=True 時直接關閉"""
+        if discard:
+            self._forget(conn)
+            return
+        with self._cond:
+            self._checked_out -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """以 with 語法借用連線，離開時一定歸還（try/finally，任何例外都不會佔住名額）
+
+        Exception：回滾後歸還，回滾失敗（連線已損壞）則丟棄；
+        其他 BaseException（KeyboardInterrupt、SystemExit、產生器被關閉時的 GeneratorExit）：
+        查詢可能停在一半，連線狀態不明，直接丟棄
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self):
+        """連線池統計（用於調整 max_size）"""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "waiting": self._waiting,
+                "created": self._created,
+                "recycled": self._recycled,
+            }
@@ -0,0 +1,152 @@
+"""
+關鍵字比對模組（Aho-Corasick 多字串比對）
+啟動時由同義詞檔建立自動機，掃描一次輸入就找出所有詞彙，
+回傳每個比對的位置、所屬欄位（occasion / color / category ...）與資料庫中的標準值（例如 約會 → date）
+
+同義詞檔格式（JSON）：
+    {
+      "occasion": [
+        {"label": "約會", "value": "date", "terms": ["約會", "date", "浪漫", "晚餐"]},
+        ...
+      ],
+      "color": [...]
+    }
+"""
+
+import json
+from collections import deque, namedtuple
+
+KeywordMatch = namedtuple("KeywordMatch", ["start", "end", "term", "field", "value", "label"])
+
+
+def _fold(text: str) -> str:
+    """轉小寫但維持字元位置不變（少數轉小寫後長度改變的字元保留原樣）"""
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isascii() and c.isalnum()
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        """由字串清單建立自動機；比對結果以 patterns 中的索引表示"""
+        self.patterns = list(patterns)
+        self._goto = [{}]   # 節點 -> {字元: 下一個節點}
+        self._fail = [0]
+        self._out = [()]    # 節點 -> 在此結束的 pattern 索引（含 fail 鏈上的）
+
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (index,)
+
+        # BFS 建立失敗連結，並把 fail 節點的輸出併入（比對時不必再沿 fail 鏈找輸出）
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def iter(self, text: str):
+        """產出所有比對 (start, end, pattern 索引)，包含重疊的比對"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                yield pos + 1 - len(self.patterns[index]), pos + 1, index
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+class KeywordExtractor:
+    def __init__(self, synonyms: dict):
+        """由 {欄位: [{"label", "value", "terms"}, ...]} 建立關鍵字比對器"""
+        self._entries = []  # pattern 索引 -> (term, field, value, label)
+        seen = set()
+        for field, groups in synonyms.items():
+            for group in groups:
+                value = group["value"]
+                label = group.get("label", value)
+                for term in group["terms"]:
+                    key = (_fold(term), field, value)
+                    if not term or key in seen:
+                        continue
+                    seen.add(key)
+                    self._entries.append((term, field, value, label))
+        self._matcher = AhoCorasick(_fold(term) for term, _, _, _ in self._entries)
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def extract(self, text: str, overlapping: bool = False):
+        """回傳 [KeywordMatch, ...]，依位置排序
+
+        英數詞彙需在單字邊界上（date 不會比對到 update）；
+        overlapping=False 時重疊的比對只保留最左、最長的一個（深藍 優先於 藍）。
+        """
+        if not text:
+            return []
+        folded = _fold(text)
+        matches = []
+        for start, end, index in self._matcher.iter(folded):
+            term, field, value, label = self._entries[index]
+            if _is_word_char(term[0]) and start > 0 and _is_word_char(folded[start - 1]):
+                continue
+            if _is_word_char(term[-1]) and end < len(folded) and _is_word_char(folded[end]):
+                continue
+            matches.append(KeywordMatch(start, end, text[start:end], field, value, label))
+
+        matches.sort(key=lambda m: (m.start, -(m.end - m.start)))
+        if overlapping:
+            return matches
+        result, covered_until, kept_span = [], 0, None
+        for m in matches:
+            if (m.start, m.end) == kept_span:
+                result.append(m)  # 同一段文字對應多個欄位 / 值時全部保留
+            elif m.start >= covered_until:
+                result.append(m)
+                covered_until, kept_span = m.end, (m.start, m.end)
+        return result
+
+    @staticmethod
+    def values(matches, field=None):
+        """比對結果的標準值（去重、保持出現順序）；指定 field 時回傳清單，否則回傳 {欄位: [值, ...]}"""
+        grouped = {}
+        for m in matches:
+            values = grouped.setdefault(m.field, [])
+            if m.value not in values:
+                values.append(m.value)
+        return grouped.get(field, []) if field else grouped
+
+    @staticmethod
+    def labels(matches):
+        """比對結果的顯示標籤（去重、保持出現順序）"""
+        labels = []
+        for m in matches:
+            if m.label not in labels:
+                labels.append(m.label)
+        return labels
+
+    def __len__(self):
+        return len(self._entries)
@@ -8,10 +8,16 @@ from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 import os
+import asyncio
 import json
 import sys
+import time
 from datetime import datetime
-from threading import Lock
+from conversation_store import ConversationStore, create_conversation_store
+from session_cache import SessionCache
+from llm_router import (hedged_invoke, hedged_ainvoke, invoke_with_timeout, AllProvidersFailedError,
+                        ProviderHealth, SingleFlight, AsyncSingleFlight)
+from response_cache import ResponseCache
 
 # 確保 Python 使用 UTF-8 編碼
 if hasattr(sys.stdout, 'reconfigure'):
@@ -19,15 +25,33 @@ if hasattr(sys.stdout, 'reconfigure'):
 if hasattr(sys.stderr, 'reconfigure'):
     sys.stderr.reconfigure(encoding='utf-8')
 
-# JSON 對話記錄檔案路徑
+# 舊版 JSON 對話記錄（file 後端第一次啟動時匯入）；儲存後端由 SESSION_STORE 設定
 CONVERSATIONS_FILE = "/app/data/conversations.json"
-file_lock = Lock()  # 防止多執行緒同時寫入
+
+# 記憶體中 session 快取上限（超過時以 LRU / 閒置 TTL 淘汰，需要時再從日誌載入）
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "1000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "1800"))
+
+# AI 回應快取（RESPONSE_CACHE_FUZZY 設定 0~1 的相似度門檻即啟用模糊比對）
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_FUZZY = os.getenv("RESPONSE_CACHE_FUZZY")
+
+# 自動模式對沖設定：LLM_HEDGE_DELAY 未設定時依序嘗試；設為 0 表示所有模型同時啟動
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_TIMEOUTS = {
+    name: float(os.getenv(f"LLM_TIMEOUT_{name.upper()}", LLM_TIMEOUT))
+    for name in ("Gemini", "Groq", "DeepSeek")
+}
 
 # =========================
 # 🔧 初始化 LangChain 模型
 # =========================
 class OutfitAIAgent:
-    def __init__(self, gemini_key: str = None, groq_key: str = None, deepseek_key: str = None):
+    def __init__(self, gemini_key: str = None, groq_key: str = None, deepseek_key: str = None,
+                 store: ConversationStore = None, hedge_delay: float = None, timeouts: dict = None):
         """初始化 AI Agent（使用 LangChain，支援多模型備援）"""
         
         # 初始化多個 LLM（按優先順序：Gemini -> Groq -> DeepSeek）
@@ -84,8 +108,37 @@ class OutfitAIAgent:
         
         print(f"✅ 已初始化 {len(self.llms)} 個 LLM: {[m['name'] for m in self.llms]}")
         
-        # 對話記憶（每個 session 一個）
-        self.sessions = {}
+        # 自動模式的對沖延遲（None 表示依序嘗試）與個別模型逾時
+        if hedge_delay is None and LLM_HEDGE_DELAY:
+            hedge_delay = float(LLM_HEDGE_DELAY)
+        self.hedge_delay = hedge_delay
+        self.timeouts = {**LLM_TIMEOUTS, **(timeouts or {})}
+        
+        # 每個模型的斷路器（自動模式會跳過 open 的模型，並依 p50 延遲排序）
+        self.health = ProviderHealth()
+        
+        # 同時進行中的相同提示合併成一次模型呼叫
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
+        
+        # 相同提問 + 相同檢索結果直接回傳先前的 AI 回應
+        self.response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_SIZE,
+            ttl=RESPONSE_CACHE_TTL,
+            fuzzy_threshold=float(RESPONSE_CACHE_FUZZY) if RESPONSE_CACHE_FUZZY else None
+        )
+        
+        # 對話持久化（file / sqlite / redis，每則訊息只追加一筆，多個 worker 可共用）
+        self.store = store or create_conversation_store(legacy_json_path=CONVERSATIONS_FILE)
+        
+        # 對話記憶（每個 session 一個，有上限的快取，未命中或已被其他 worker 更新時從儲存載入）
+        self.sessions = SessionCache(
+            loader=self.store.load_session,
+            validator=self.store.message_count,
+            max_sessions=SESSION_CACHE_MAX,
+            max_bytes=SESSION_CACHE_MAX_BYTES,
+            ttl=SESSION_CACHE_TTL
+        )
         
         # System Prompt - 超自然對話版
         self.system_prompt = """你是「搭搭」，一個活潑親切的穿搭顧問。
@@ -122,57 +175,23 @@ class OutfitAIAgent:
 1. 休閒約會裝 - 白T + 牛仔褲，輕鬆自在
 2. 浪漫約會裝 - 碎花洋裝，溫柔甜美"""
     
-    def _load_conversations(self):
-        """從 JSON 檔案載入對話記錄"""
-        try:
-            if os.path.exists(CONVERSATIONS_FILE):
-                with file_lock:
-                    with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-        except Exception as e:
-            print(f"⚠️ 載入對話記錄失敗: {e}", file=sys.stderr)
-        return {}
-    
-    def _save_conversations(self, conversations):
-        """儲存對話記錄到 JSON 檔案"""
-        try:
-            os.makedirs(os.path.dirname(CONVERSATIONS_FILE), exist_ok=True)
-            with file_lock:
-                with open(CONVERSATIONS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(conversations, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"⚠️ 儲存對話記錄失敗: {e}", file=sys.stderr)
-    
     def get_or_create_session(self, session_id: str):
-        """取得或建立對話 session（從 JSON 載入或建立新的）"""
-        if session_id not in self.sessions:
-            # 嘗試從 JSON 載入
-            all_conversations = self._load_conversations()
-            if session_id in all_conversations:
-                self.sessions[session_id] = all_conversations[session_id]
-                print(f"📂 載入 {session_id} 的歷史對話 ({len(all_conversations[session_id]['messages'])} 則)", file=sys.stderr)
-            else:
-                # 建立新 session
-                self.sessions[session_id] = {
-                    "history": [],
-                    "messages": [],
-                    "created_at": datetime.now().isoformat()
-                }
-                print(f"🆕 建立新的對話 session: {session_id}", file=sys.stderr)
-        
-        return self.sessions[session_id]
-    
-    def chat(self, session_id: str, user_input: str, db_outfits=None, preferred_model: str = "auto"):
-        """對話式推薦（使用 LangChain，支援多模型備援和手動選擇）
-        
-        Args:
-            session_id: 對話 session ID
-            user_input: 用戶輸入
-            db_outfits: 資料庫檢索的穿搭資料
-            preferred_model: 偏好模型 ("auto", "gemini", "groq", "deepseek")
-        """
-        session = self.get_or_create_session(session_id)
+        """取得或建立對話 session（從日誌載入或建立新的）"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
         
+        # 快取與日誌都沒有：建立新 session
+        session = {
+            "messages": [],
+            "created_at": datetime.now().isoformat()
+        }
+        self.sessions.put(session_id, session)
+        print(f"🆕 建立新的對話 session: {session_id}", file=sys.stderr)
+        return session
+    
+    def _build_prompt(self, session, user_input: str, db_outfits=None):
+        """組合 system prompt、最近對話與資料庫穿搭成完整提示"""
         # 建立對話上下文
         context = ""
         if db_outfits and len(db_outfits) > 0:
@@ -193,40 +212,87 @@ class OutfitAIAgent:
         for msg in session["messages"][-3:]:  # 只保留最近3輪對話
             history_text += f"使用者: {msg['user']}\nAI: {msg['ai']}\n\n"
         
-        # 建立完整提示
-        full_prompt = f"{self.system_prompt}\n\n{history_text}使用者: {user_input}{context}\nAI:"
-        
         # 調試信息
-        import sys
         print(f"\n{'='*50}", flush=True, file=sys.stderr)
         print(f"📝 用戶輸入: {user_input}", flush=True, file=sys.stderr)
         print(f"📦 資料庫穿搭數量: {len(db_outfits) if db_outfits else 0}", flush=True, file=sys.stderr)
         print(f"{'='*50}\n", flush=True, file=sys.stderr)
         
-        # 根據用戶選擇決定使用哪些模型
+        # 建立完整提示
+        return f"{self.system_prompt}\n\n{history_text}使用者: {user_input}{context}\nAI:"
+    
+    def _select_models(self, preferred_model: str):
+        """根據用戶選擇決定使用哪些模型（手動模式找不到時回傳空清單）"""
         if preferred_model != "auto":
             # 手動選擇模式：只嘗試指定的模型
             models_to_try = [m for m in self.llms if m["name"].lower() == preferred_model.lower()]
-            if not models_to_try:
-                return f"❌ 模型 {preferred_model} 未設定或不可用"
-            print(f"🎯 手動選擇使用 {preferred_model}", flush=True, file=sys.stderr)
+            if models_to_try:
+                print(f"🎯 手動選擇使用 {preferred_model}", flush=True, file=sys.stderr)
         else:
-            # 自動模式：依序嘗試所有模型
-            models_to_try = self.llms
+            # 自動模式：略過斷路器 open 的模型，健康的依最近延遲排序後依序嘗試
+            models_to_try = self.health.route(self.llms)
             print(f"🔄 自動模式：依序嘗試 {[m['name'] for m in models_to_try]}", flush=True, file=sys.stderr)
+        return models_to_try
+    
+    @staticmethod
+    def _manual_error_message(model_name: str, error_msg: str):
+        """手動模式失敗時的友善錯誤訊息"""
+        if "Insufficient Balance" in error_msg or "402" in error_msg:
+            return f"❌ {model_name} 餘額不足,請切換到「自動切換」模式或選擇其他模型 (Gemini/Groq)"
+        return f"❌ {model_name} 回應失敗: {error_msg}\n\n💡 建議切換到「自動切換」模式或選擇其他模型"
+    
+    def _record_turn(self, session_id: str, session, user_input: str, response_text: str, used_model: str):
+        """儲存對話（附註使用的模型和時間戳）"""
+        message = {
+            "user": user_input,
+            "ai": response_text,
+            "model": used_model,
+            "timestamp": datetime.now().isoformat()
+        }
+        session["messages"].append(message)
+        self.sessions.add_message(session_id, message)
         
+        # 追加到對話日誌（只寫入這一則）
+        try:
+            self.store.append_turn(session_id, message, created_at=session["created_at"])
+        except Exception as e:
+            print(f"⚠️ 儲存對話記錄失敗: {e}", file=sys.stderr)
+    
+    def _call_llms(self, full_prompt: str, models_to_try, preferred_model: str):
+        """呼叫模型取得回應，回傳 (response_text, used_model, manual_error)
+        
+        response_text 為 None 表示全部失敗；manual_error 為手動模式失敗時要直接回給使用者的訊息
+        """
         # 依序嘗試 LLM
         response_text = None
         used_model = None
         
+        if preferred_model == "auto" and self.hedge_delay is not None:
+            # 對沖模式：前一個模型慢或失敗時平行啟動下一個，取第一個成功的回應
+            try:
+                response_text, used_model = hedged_invoke(
+                    models_to_try, full_prompt,
+                    hedge_delay=self.hedge_delay,
+                    timeouts=self.timeouts,
+                    default_timeout=LLM_TIMEOUT,
+                    on_result=self.health.record,
+                    allow=self.health.allow
+                )
+            except AllProvidersFailedError as e:
+                print(f"❌ 對沖模式全部失敗: {e}", flush=True, file=sys.stderr)
+            models_to_try = []  # 不再依序重試
+        
         for model_info in models_to_try:
+            llm = model_info["llm"]
+            model_name = model_info["name"]
+            if preferred_model == "auto" and not self.health.allow(model_name):
+                continue
             try:
-                llm = model_info["llm"]
-                model_name = model_info["name"]
-                
                 print(f"🔄 嘗試使用 {model_name}...", flush=True, file=sys.stderr)
-                response = llm.invoke(full_prompt)
-                response_text = response.content if hasattr(response, 'content') else str(response)
+                # 與對沖模式相同的逾時：超過就換下一個模型（卡住的呼叫在背景跑完後丟棄）；
+                # 延遲與逾時從真正開始執行算起，結果由 invoke_with_timeout 回報斷路器
+                response_text = invoke_with_timeout(llm, full_prompt, self.timeouts.get(model_name, LLM_TIMEOUT),
+                                                    model_name, on_result=self.health.record)
                 used_model = model_name
                 print(f"✅ {model_name} 回應成功", flush=True, file=sys.stderr)
                 break
@@ -236,56 +302,266 @@ class OutfitAIAgent:
                 print(f"❌ {model_name} 失敗: {error_msg}", flush=True, file=sys.stderr)
                 
                 if preferred_model != "auto":
-                    # 手動模式失敗時返回友善的錯誤訊息
-                    if "Insufficient Balance" in error_msg or "402" in error_msg:
-                        return f"❌ {model_name} 餘額不足,請切換到「自動切換」模式或選擇其他模型 (Gemini/Groq)"
-                    else:
-                        return f"❌ {model_name} 回應失敗: {error_msg}\n\n💡 建議切換到「自動切換」模式或選擇其他模型"
+                    return None, None, self._manual_error_message(model_name, error_msg)
                 continue
         
+        return response_text, used_model, None
+    
+    def chat(self, session_id: str, user_input: str, db_outfits=None, preferred_model: str = "auto",
+             keywords=None):
+        """對話式推薦（使用 LangChain，支援多模型備援和手動選擇）
+        
+        Args:
+            session_id: 對話 session ID
+            user_input: 用戶輸入
+            db_outfits: 資料庫檢索的穿搭資料
+            preferred_model: 偏好模型 ("auto", "gemini", "groq", "deepseek")
+            keywords: RAG 偵測到的關鍵字（回應快取 key 的一部分）
+        """
+        session = self.get_or_create_session(session_id)
+        
+        cached = self.response_cache.get(user_input, keywords, db_outfits, preferred_model)
+        if cached is not None:
+            response_text, used_model = cached
+            print(f"⚡ 回應快取命中 ({used_model})", flush=True, file=sys.stderr)
+            self._record_turn(session_id, session, user_input, response_text, used_model)
+            return response_text
+        
+        full_prompt = self._build_prompt(session, user_input, db_outfits)
+        
+        models_to_try = self._select_models(preferred_model)
+        if not models_to_try:
+            return f"❌ 模型 {preferred_model} 未設定或不可用"
+        
+        # 相同提示同時只呼叫一次模型，其餘請求等待並共用結果
+        fingerprint = SingleFlight.fingerprint(preferred_model.lower(), full_prompt)
+        response_text, used_model, manual_error = self.inflight.do(
+            fingerprint, lambda: self._call_llms(full_prompt, models_to_try, preferred_model)
+        )
+        if manual_error:
+            return manual_error
+        
         # 如果所有模型都失敗
         if response_text is None:
             response_text = "抱歉，目前所有 AI 服務都無法使用，請稍後再試。"
             used_model = "None"
+        else:
+            self.response_cache.put(user_input, keywords, db_outfits, preferred_model, response_text, used_model)
         
-        # 儲存對話（附註使用的模型和時間戳）
-        session["messages"].append({
-            "user": user_input,
-            "ai": response_text,
-            "model": used_model,
-            "timestamp": datetime.now().isoformat()
-        })
+        self._record_turn(session_id, session, user_input, response_text, used_model)
+        return response_text
+    
+    async def _acall_llms(self, full_prompt: str, models_to_try, preferred_model: str, before_call=None):
+        """_call_llms 的 async 版本（使用 llm.ainvoke，等待模型時不佔用執行緒）
         
-        session["history"].append({
-            "user": user_input,
-            "ai": response_text
-        })
+        before_call: 每次呼叫模型前 await before_call(模型名稱)（例如批次工作的速率限制），
+                     有設定時不使用對沖模式（對沖會多花額度）
+        """
+        response_text = None
+        used_model = None
+        
+        if preferred_model == "auto" and self.hedge_delay is not None and before_call is None:
+            try:
+                response_text, used_model = await hedged_ainvoke(
+                    models_to_try, full_prompt,
+                    hedge_delay=self.hedge_delay,
+                    timeouts=self.timeouts,
+                    default_timeout=LLM_TIMEOUT,
+                    on_result=self.health.record,
+                    allow=self.health.allow
+                )
+            except AllProvidersFailedError as e:
+                print(f"❌ 對沖模式全部失敗: {e}", flush=True, file=sys.stderr)
+            return response_text, used_model, None
+        
+        for model_info in models_to_try:
+            model_name = model_info["name"]
+            if preferred_model == "auto" and not self.health.allow(model_name):
+                continue
+            started = None
+            try:
+                if before_call is not None:
+                    await before_call(model_name)
+                # 速率限制的排隊時間不算進延遲（否則會被斷路器當成慢呼叫）
+                started = time.monotonic()
+                print(f"🔄 嘗試使用 {model_name}...", flush=True, file=sys.stderr)
+                response = await asyncio.wait_for(
+                    model_info["llm"].ainvoke(full_prompt),
+                    timeout=self.timeouts.get(model_name, LLM_TIMEOUT)
+                )
+                response_text = response.content if hasattr(response, 'content') else str(response)
+                used_model = model_name
+                self.health.record(model_name, True, time.monotonic() - started)
+                print(f"✅ {model_name} 回應成功", flush=True, file=sys.stderr)
+                break
+                
+            except Exception as e:
+                error_msg = str(e) or type(e).__name__
+                if started is not None:  # before_call 本身失敗時模型沒有被呼叫，不計入斷路器
+                    self.health.record(model_name, False, time.monotonic() - started, error_msg, e)
+                print(f"❌ {model_name} 失敗: {error_msg}", flush=True, file=sys.stderr)
+                
+                if preferred_model != "auto":
+                    return None, None, self._manual_error_message(model_name, error_msg)
+                continue
+        
+        return response_text, used_model, None
+    
+    async def achat(self, session_id: str, user_input: str, db_outfits=None, preferred_model: str = "auto",
+                    keywords=None):
+        """chat 的 async 版本，參數與回傳值相同
         
-        # 儲存到 JSON 檔案
-        all_conversations = self._load_conversations()
-        all_conversations[session_id] = session
-        self._save_conversations(all_conversations)
+        對話儲存的讀寫（JSONL 檔案鎖、SQLite、Redis）都是阻塞 I/O，交給預設執行緒池，不在事件迴圈上執行
+        """
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(None, self.get_or_create_session, session_id)
         
+        cached = self.response_cache.get(user_input, keywords, db_outfits, preferred_model)
+        if cached is not None:
+            response_text, used_model = cached
+            print(f"⚡ 回應快取命中 ({used_model})", flush=True, file=sys.stderr)
+            await loop.run_in_executor(None, self._record_turn, session_id, session, user_input,
+                                       response_text, used_model)
+            return response_text
+        
+        full_prompt = self._build_prompt(session, user_input, db_outfits)
+        
+        models_to_try = self._select_models(preferred_model)
+        if not models_to_try:
+            return f"❌ 模型 {preferred_model} 未設定或不可用"
+        
+        fingerprint = SingleFlight.fingerprint(preferred_model.lower(), full_prompt)
+        response_text, used_model, manual_error = await self.ainflight.do(
+            fingerprint, lambda: self._acall_llms(full_prompt, models_to_try, preferred_model)
+        )
+        if manual_error:
+            return manual_error
+        
+        if response_text is None:
+            response_text = "抱歉，目前所有 AI 服務都無法使用，請稍後再試。"
+            used_model = "None"
+        else:
+            self.response_cache.put(user_input, keywords, db_outfits, preferred_model, response_text, used_model)
+        
+        await loop.run_in_executor(None, self._record_turn, session_id, session, user_input,
+                                   response_text, used_model)
         return response_text
     
+    async def acomplete(self, user_input: str, db_outfits=None, preferred_model: str = "auto", before_call=None):
+        """不帶對話紀錄的單次推薦（批次工作用），回傳 (response_text, used_model)
+        
+        不讀寫 session；相同提示同時只呼叫一次模型，成功的回應寫入回應快取。
+        response_text 為 None 表示全部模型失敗，手動模式失敗時回傳錯誤訊息。
+        """
+        cached = self.response_cache.get(user_input, None, db_outfits, preferred_model)
+        if cached is not None:
+            return cached
+        
+        full_prompt = self._build_prompt({"messages": []}, user_input, db_outfits)
+        models_to_try = self._select_models(preferred_model)
+        if not models_to_try:
+            return f"❌ 模型 {preferred_model} 未設定或不可用", None
+        
+        fingerprint = SingleFlight.fingerprint(preferred_model.lower(), full_prompt)
+        response_text, used_model, manual_error = await self.ainflight.do(
+            fingerprint, lambda: self._acall_llms(full_prompt, models_to_try, preferred_model, before_call)
+        )
+        if manual_error:
+            return manual_error, None
+        if response_text is not None:
+            self.response_cache.put(user_input, None, db_outfits, preferred_model, response_text, used_model)
+        return response_text, used_model
+    
+    def chat_stream(self, session_id: str, user_input: str, db_outfits=None, preferred_model: str = "auto",
+                    keywords=None):
+        """串流版對話：逐段 yield 模型輸出的文字，串流結束後才儲存對話
+        
+        自動模式下，模型在送出第一段文字之前失敗會改用下一個模型；
+        已開始輸出後才失敗則保留已輸出的內容結束。
+        """
+        session = self.get_or_create_session(session_id)
+        
+        cached = self.response_cache.get(user_input, keywords, db_outfits, preferred_model)
+        if cached is not None:
+            response_text, used_model = cached
+            print(f"⚡ 回應快取命中 ({used_model})", flush=True, file=sys.stderr)
+            yield response_text
+            self._record_turn(session_id, session, user_input, response_text, used_model)
+            return
+        
+        full_prompt = self._build_prompt(session, user_input, db_outfits)
+        
+        models_to_try = self._select_models(preferred_model)
+        if not models_to_try:
+            yield f"❌ 模型 {preferred_model} 未設定或不可用"
+            return
+        
+        chunks = []
+        used_model = None
+        completed = False
+        
+        for model_info in models_to_try:
+            model_name = model_info["name"]
+            if preferred_model == "auto" and not self.health.allow(model_name):
+                continue
+            started = time.monotonic()
+            try:
+                print(f"🔄 嘗試串流使用 {model_name}...", flush=True, file=sys.stderr)
+                for chunk in model_info["llm"].stream(full_prompt):
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if not text:
+                        continue
+                    chunks.append(text)
+                    yield text
+                used_model = model_name
+                completed = True
+                self.health.record(model_name, True, time.monotonic() - started)
+                print(f"✅ {model_name} 串流完成", flush=True, file=sys.stderr)
+                break
+                
+            except Exception as e:
+                error_msg = str(e)
+                self.health.record(model_name, False, time.monotonic() - started, error_msg, e)
+                print(f"❌ {model_name} 串流失敗: {error_msg}", flush=True, file=sys.stderr)
+                
+                if chunks:
+                    # 已經送出部分內容，無法再換模型
+                    used_model = model_name
+                    break
+                if preferred_model != "auto":
+                    yield self._manual_error_message(model_name, error_msg)
+                    return
+                continue
+        
+        # 如果所有模型都失敗
+        if used_model is None:
+            chunks = ["抱歉，目前所有 AI 服務都無法使用，請稍後再試。"]
+            used_model = "None"
+            yield chunks[0]
+        
+        response_text = "".join(chunks)
+        if completed:
+            self.response_cache.put(user_input, keywords, db_outfits, preferred_model, response_text, used_model)
+        self._record_turn(session_id, session, user_input, response_text, used_model)
+    
     def clear_session(self, session_id: str):
-        """清除對話記憶（記憶體和 JSON 檔案）"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        """清除對話記憶（記憶體和對話日誌）"""
+        self.sessions.discard(session_id)
         
-        # 同時從 JSON 移除
-        all_conversations = self._load_conversations()
-        if session_id in all_conversations:
-            del all_conversations[session_id]
-            self._save_conversations(all_conversations)
+        # 同時從日誌移除
+        try:
+            self.store.delete_session(session_id)
+        except Exception as e:
+            print(f"⚠️ 清除對話記錄失敗: {e}", file=sys.stderr)
         
         return True
     
     def get_session_history(self, session_id: str):
-        """取得對話歷史"""
-        if session_id in self.sessions:
-            return self.sessions[session_id]["history"]
-        return None
+        """取得對話歷史（由 messages 產生，不另外保存一份）"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return [{"user": m["user"], "ai": m["ai"]} for m in session["messages"]]
 
 
 # =========================
@@ -0,0 +1,684 @@
+"""
+LLM 路由模組
+- 對沖（hedged）請求：依優先順序啟動模型，若前一個在 hedge_delay 秒內沒有回應（或已失敗）
+  就同時啟動下一個，採用第一個成功的回應，其餘的結果直接丟棄
+- 斷路器：每個模型一個 closed / open / half-open 斷路器，路由時跳過 open 的模型，
+  並依最近的 p50 延遲排序健康的模型
+- 速率限制：每個模型一個 token bucket（批次工作大量呼叫時不超過供應商的每秒請求數）
+- 被捨棄的同步呼叫（對沖落敗、逾時）無法中斷，會繼續佔用執行緒；另外計數並設上限，
+  超過上限或執行緒池滿載時不再啟動額外的對沖，只依序備援
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+# 共用執行緒池（每個對沖請求最多同時佔用 len(llms) 個執行緒）
+ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "32"))
+# 已被捨棄但還在背景跑的呼叫最多幾個；達到上限時不再啟動新的對沖
+MAX_ABANDONED = int(os.getenv("LLM_ROUTER_MAX_ABANDONED", str(ROUTER_WORKERS // 2)))
+# 呼叫在執行緒池排隊超過此秒數還沒開始就放棄（本地滿載，不算供應商失敗）
+QUEUE_TIMEOUT = float(os.getenv("LLM_ROUTER_QUEUE_TIMEOUT", "30"))
+_executor = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix="llm-hedge")
+
+_budget_lock = threading.Lock()
+_in_flight = 0   # 已送進 _executor 還沒結束的呼叫（含被捨棄的）
+_abandoned = 0   # 其中已被捨棄、結果沒人要的呼叫
+
+
+class AllProvidersFailedError(RuntimeError):
+    """所有模型都失敗或逾時"""
+
+    def __init__(self, errors):
+        self.errors = errors  # [(model_name, error_msg), ...]
+        super().__init__("; ".join(f"{name}: {msg}" for name, msg in errors))
+
+
+class RouterSaturatedError(RuntimeError):
+    """本地執行緒池滿載，呼叫排隊超過 QUEUE_TIMEOUT 還沒開始執行（不是供應商的問題，不計入斷路器）"""
+
+
+def _invoke(llm, prompt):
+    response = llm.invoke(prompt)
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+class _Call:
+    """送進 _executor 的一次呼叫；started 為 worker 執行緒真正開始執行的時間（還在排隊時為 None），
+    逾時與延遲都從這裡算起，排隊等執行緒的時間不算在供應商頭上"""
+
+    def __init__(self, llm, prompt):
+        self.started = None
+        self._running = threading.Event()
+        self.future = _executor.submit(self._run, llm, prompt)
+
+    def _run(self, llm, prompt):
+        self.started = time.monotonic()
+        self._running.set()
+        return _invoke(llm, prompt)
+
+    def wait_started(self, timeout: float) -> bool:
+        return self._running.wait(timeout)
+
+
+def _finished(_):
+    global _in_flight
+    with _budget_lock:
+        _in_flight -= 1
+
+
+def _submit(llm, prompt) -> _Call:
+    global _in_flight
+    with _budget_lock:
+        _in_flight += 1
+    call = _Call(llm, prompt)
+    call.future.add_done_callback(_finished)
+    return call
+
+
+def _abandon_finished(_):
+    global _abandoned
+    with _budget_lock:
+        _abandoned -= 1
+
+
+def _abandon(future):
+    """捨棄呼叫：還沒開始的直接取消；已經在跑的無法中斷，計入 _abandoned 直到它跑完"""
+    global _abandoned
+    if future.cancel() or future.done():
+        return
+    with _budget_lock:
+        _abandoned += 1
+    future.add_done_callback(_abandon_finished)
+
+
+def can_hedge() -> bool:
+    """是否還能啟動額外的對沖呼叫（被捨棄的呼叫未達上限，且執行緒池還有空閒）"""
+    with _budget_lock:
+        return _abandoned < MAX_ABANDONED and _in_flight < ROUTER_WORKERS
+
+
+def router_stats():
+    with _budget_lock:
+        return {"workers": ROUTER_WORKERS, "in_flight": _in_flight,
+                "abandoned": _abandoned, "max_abandoned": MAX_ABANDONED}
+
+
+def invoke_with_timeout(llm, prompt, timeout: float, name: str = None, on_result=None):
+    """在共用執行緒池中呼叫 llm.invoke（依序備援用）
+
+    逾時從 worker 真正開始執行算起，超過 timeout 秒就捨棄並丟出 TimeoutError；
+    on_result 與 hedged_invoke 相同，延遲也不含排隊時間。
+    排隊超過 QUEUE_TIMEOUT 還沒開始時丟出 RouterSaturatedError，不呼叫 on_result。
+    """
+    call = _submit(llm, prompt)
+    if not call.wait_started(QUEUE_TIMEOUT):
+        _abandon(call.future)
+        raise RouterSaturatedError(f"router queue full for {QUEUE_TIMEOUT:g}s")
+    try:
+        text = call.future.result(timeout=max(0.0, call.started + timeout - time.monotonic()))
+    except FuturesTimeoutError:
+        _abandon(call.future)
+        if on_result:
+            on_result(name, False, time.monotonic() - call.started, "timeout")
+        raise TimeoutError(f"timeout after {timeout:g}s") from None
+    except Exception as e:
+        if on_result:
+            on_result(name, False, time.monotonic() - call.started, str(e), e)
+        raise
+    if on_result:
+        on_result(name, True, time.monotonic() - call.started, None)
+    return text
+
+
+def hedged_invoke(models, prompt, hedge_delay: float = 0.0, timeouts=None, default_timeout: float = 30.0,
+                  on_result=None, allow=None):
+    """對沖呼叫多個模型，回傳 (response_text, model_name)
+
+    Args:
+        models: [{"name": ..., "llm": ...}, ...]，依優先順序排列
+        prompt: 完整提示
+        hedge_delay: 前一個模型多久沒回應就啟動下一個（0 表示全部同時啟動）
+        timeouts: {model_name: 秒數}，個別模型逾時設定
+        default_timeout: 未在 timeouts 指定的模型逾時秒數
+        on_result: 每個模型有結果時呼叫 on_result(name, ok, latency, error_msg, error)（例如回報斷路器；
+                   error 為例外物件，逾時為 None）
+        allow: 真正啟動某個模型前才呼叫 allow(name)，回傳 False 就略過（例如斷路器的 half-open 試探名額）
+
+    說明：同步的 llm.invoke 無法真正中斷，被捨棄的呼叫會在背景跑完後丟棄結果；
+    這類呼叫達到 MAX_ABANDONED 或執行緒池滿載時，不再提前啟動下一個模型（只在失敗 / 逾時後備援）。
+    逾時與延遲都從 worker 真正開始執行算起；在執行緒池排隊超過 QUEUE_TIMEOUT 的呼叫直接放棄，不回報 on_result。
+    """
+    if not models:
+        raise AllProvidersFailedError([])
+
+    timeouts = timeouts or {}
+    queue = list(models)
+    pending = {}  # future -> (model_name, _Call, launched)
+    errors = []
+    next_launch = time.monotonic()
+
+    def launch():
+        nonlocal next_launch
+        model_info = queue.pop(0)
+        name = model_info["name"]
+        if allow is not None and not allow(name):
+            print(f"⛔ {name} 斷路器不放行，略過", flush=True, file=sys.stderr)
+            return
+        now = time.monotonic()
+        print(f"🚀 對沖啟動 {name}", flush=True, file=sys.stderr)
+        call = _submit(model_info["llm"], prompt)
+        pending[call.future] = (name, call, now)
+        next_launch = now + hedge_delay
+
+    def deadline(name, call, launched):
+        # 還在排隊的呼叫只受 QUEUE_TIMEOUT 限制；開始執行後才計算模型逾時
+        if call.started is None:
+            return launched + QUEUE_TIMEOUT
+        return call.started + timeouts.get(name, default_timeout)
+
+    try:
+        while queue or pending:
+            now = time.monotonic()
+
+            # 目前沒有進行中的呼叫 → 啟動下一個；到了對沖時間則每啟動一個前都要還有預算
+            # （hedge_delay=0 時也不會一次把所有模型送進已滿的執行緒池）
+            blocked = False
+            while queue and (not pending or time.monotonic() >= next_launch):
+                if pending and not can_hedge():
+                    blocked = True
+                    break
+                launch()
+            if not pending:
+                break  # 剩下的模型都被斷路器略過
+
+            deadlines = [deadline(*entry) for entry in pending.values()]
+            if blocked or any(call.started is None for _, call, _ in pending.values()):
+                # 預算用完或有呼叫還在排隊：每 0.05 秒再檢查一次預算與開始時間
+                deadlines.append(now + 0.05)
+            wake_at = min(deadlines + ([next_launch] if queue and now < next_launch else []))
+            done, _ = wait(list(pending), timeout=max(0.0, wake_at - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, call, launched = pending.pop(future)
+                latency = time.monotonic() - (call.started or launched)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"❌ {name} 失敗: {e}", flush=True, file=sys.stderr)
+                    errors.append((name, str(e)))
+                    if on_result:
+                        on_result(name, False, latency, str(e), e)
+                    next_launch = time.monotonic()  # 失敗時立即啟動下一個
+                    continue
+                print(f"✅ {name} 對沖勝出", flush=True, file=sys.stderr)
+                if on_result:
+                    on_result(name, True, latency, None)
+                return text, name
+
+            # 處理逾時的呼叫（排隊逾時是本地滿載，不回報給 on_result）
+            now = time.monotonic()
+            for future, (name, call, launched) in list(pending.items()):
+                if now < deadline(name, call, launched):
+                    continue
+                del pending[future]
+                _abandon(future)
+                next_launch = now
+                if call.started is None:
+                    print(f"🚧 {name} 排隊逾時（執行緒池滿載）", flush=True, file=sys.stderr)
+                    errors.append((name, "router queue full"))
+                    continue
+                print(f"⏱️ {name} 逾時", flush=True, file=sys.stderr)
+                errors.append((name, "timeout"))
+                if on_result:
+                    on_result(name, False, now - call.started, "timeout")
+    finally:
+        for future in pending:
+            _abandon(future)
+
+    raise AllProvidersFailedError(errors)
+
+
+async def _ainvoke(llm, prompt):
+    response = await llm.ainvoke(prompt)
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+async def hedged_ainvoke(models, prompt, hedge_delay: float = 0.0, timeouts=None, default_timeout: float = 30.0,
+                         on_result=None, allow=None):
+    """hedged_invoke 的 asyncio 版本（使用 llm.ainvoke），落敗的呼叫會被真正取消"""
+    if not models:
+        raise AllProvidersFailedError([])
+
+    loop = asyncio.get_running_loop()
+    timeouts = timeouts or {}
+    queue = list(models)
+    pending = {}  # task -> (model_name, start, deadline)
+    errors = []
+    next_launch = loop.time()
+
+    def launch():
+        nonlocal next_launch
+        model_info = queue.pop(0)
+        name = model_info["name"]
+        if allow is not None and not allow(name):
+            print(f"⛔ {name} 斷路器不放行，略過", flush=True, file=sys.stderr)
+            return
+        now = loop.time()
+        print(f"🚀 對沖啟動 {name}", flush=True, file=sys.stderr)
+        task = asyncio.ensure_future(_ainvoke(model_info["llm"], prompt))
+        pending[task] = (name, now, now + timeouts.get(name, default_timeout))
+        next_launch = now + hedge_delay
+
+    try:
+        while queue or pending:
+            now = loop.time()
+            while queue and (not pending or now >= next_launch):
+                launch()
+            if not pending:
+                break
+
+            deadlines = [deadline for _, _, deadline in pending.values()]
+            wake_at = min(deadlines + ([next_launch] if queue else []))
+            done, _ = await asyncio.wait(list(pending), timeout=max(0.0, wake_at - loop.time()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                name, start, _ = pending.pop(task)
+                latency = loop.time() - start
+                try:
+                    text = task.result()
+                except Exception as e:
+                    print(f"❌ {name} 失敗: {e}", flush=True, file=sys.stderr)
+                    errors.append((name, str(e)))
+                    if on_result:
+                        on_result(name, False, latency, str(e), e)
+                    next_launch = loop.time()
+                    continue
+                print(f"✅ {name} 對沖勝出", flush=True, file=sys.stderr)
+                if on_result:
+                    on_result(name, True, latency, None)
+                return text, name
+
+            now = loop.time()
+            for task, (name, start, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[task]
+                    task.cancel()
+                    print(f"⏱️ {name} 逾時", flush=True, file=sys.stderr)
+                    errors.append((name, "timeout"))
+                    if on_result:
+                        on_result(name, False, now - start, "timeout")
+                    next_launch = now
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise AllProvidersFailedError(errors)
+
+
+# =========================
+# 🔌 斷路器與健康路由
+# =========================
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 這些錯誤代表短時間內不會恢復（配額 / 餘額），直接打開斷路器：
+# 依 SDK 例外帶的 HTTP 狀態碼或例外類別判斷，不在訊息裡找 "429" 之類的字串（延遲毫秒數、id 都可能含有）
+FATAL_STATUS_CODES = {402, 429}
+FATAL_ERROR_TYPES = {"RateLimitError", "ResourceExhausted", "TooManyRequests"}
+# 沒有例外物件時（只有訊息）才比對的供應商固定字樣
+FATAL_ERROR_MARKERS = ("insufficient balance", "exceeded your current quota", "resource_exhausted")
+
+
+def _status_code(error):
+    """SDK 例外上的 HTTP 狀態碼（openai / groq: status_code，google: code，requests: response.status_code）"""
+    for holder in (error, getattr(error, "response", None)):
+        for attr in ("status_code", "code", "http_status"):
+            value = getattr(holder, attr, None)
+            if isinstance(value, int):
+                return value
+            if isinstance(getattr(value, "value", None), int):  # grpc StatusCode 等列舉
+                return value.value
+    return None
+
+
+def is_fatal_error(error) -> bool:
+    """error 可以是例外物件或錯誤訊息"""
+    if error is None:
+        return False
+    if isinstance(error, BaseException):
+        if _status_code(error) in FATAL_STATUS_CODES:
+            return True
+        if any(cls.__name__ in FATAL_ERROR_TYPES for cls in type(error).__mro__):
+            return True
+        error = str(error)
+    msg = error.lower()
+    return any(marker in msg for marker in FATAL_ERROR_MARKERS)
+
+
+class CircuitBreaker:
+    def __init__(self, window: int = 20, min_calls: int = 5, error_rate: float = 0.5,
+                 slow_call: float = 20.0, cooldown: float = 30.0, fatal_cooldown: float = 300.0):
+        """單一模型的斷路器
+
+        Args:
+            window: 統計最近幾次呼叫
+            min_calls: 視窗內至少幾次呼叫才依錯誤率判斷
+            error_rate: 錯誤率（含慢呼叫）超過此值就打開斷路器
+            slow_call: 超過此秒數的成功呼叫也算一次錯誤
+            cooldown: 打開後多久進入 half-open 試探
+            fatal_cooldown: 配額 / 餘額錯誤的冷卻時間
+        """
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.fatal_cooldown = fatal_cooldown
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = 失敗（含慢呼叫）
+        self._latencies = deque(maxlen=window)  # 成功呼叫的延遲
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._open_for = cooldown
+        self._probe_started = None
+        self.last_error = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self.times_opened = 0
+
+    def _open_locked(self, cooldown):
+        if self.state != OPEN:
+            self.times_opened += 1
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._open_for = cooldown
+        self._probe_started = None
+
+    def available(self) -> bool:
+        """不改變狀態地判斷目前是否可能放行（路由排序用；真正呼叫前仍要 allow()）"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                return now - self._opened_at >= self._open_for
+            if self.state == HALF_OPEN:
+                return self._probe_started is None or now - self._probe_started >= self.cooldown
+            return True
+
+    def allow(self) -> bool:
+        """是否允許呼叫；half-open 時一次只放行一個試探呼叫（放行即佔用試探名額，呼叫前一刻才呼叫）"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self._opened_at < self._open_for:
+                    return False
+                self.state = HALF_OPEN
+                self._probe_started = None
+            if self.state == HALF_OPEN:
+                # 試探呼叫被對沖捨棄而沒有回報時，冷卻時間過後再放行一次
+                if self._probe_started is not None and now - self._probe_started < self.cooldown:
+                    return False
+                self._probe_started = now
+            return True
+
+    def record(self, ok: bool, latency: float, error_msg: str = None, error: BaseException = None):
+        with self._lock:
+            self.total_calls += 1
+            failed = (not ok) or latency > self.slow_call
+            self._outcomes.append(failed)
+            if ok:
+                self._latencies.append(latency)
+            else:
+                self.total_failures += 1
+                self.last_error = error_msg
+
+            if not ok and is_fatal_error(error if error is not None else error_msg):
+                self._open_locked(self.fatal_cooldown)
+                return
+
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open_locked(self.cooldown)
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            if len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.error_rate:
+                    self._open_locked(self.cooldown)
+
+    def p50(self):
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+            return ordered[len(ordered) // 2]
+
+    def stats(self):
+        p50 = self.p50()
+        with self._lock:
+            outcomes = len(self._outcomes)
+            return {
+                "state": self.state,
+                "error_rate": round(sum(self._outcomes) / outcomes, 3) if outcomes else 0.0,
+                "p50_latency": round(p50, 3) if p50 is not None else None,
+                "calls": self.total_calls,
+                "failures": self.total_failures,
+                "times_opened": self.times_opened,
+                "last_error": self.last_error,
+            }
+
+
+class ProviderHealth:
+    """所有模型的斷路器集合，負責健康路由"""
+
+    def __init__(self, **breaker_options):
+        self._breaker_options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(**self._breaker_options)
+            return self._breakers[name]
+
+    def record(self, name: str, ok: bool, latency: float, error_msg: str = None, error: BaseException = None):
+        self.breaker(name).record(ok, latency, error_msg, error)
+
+    def allow(self, name: str) -> bool:
+        """真正呼叫模型前一刻才呼叫（half-open 時會佔用試探名額）"""
+        return self.breaker(name).allow()
+
+    def route(self, models):
+        """跳過斷路器 open 的模型，其餘依 p50 延遲排序（尚無資料的維持原本優先順序排在前面）
+
+        這裡只做排序、不佔用 half-open 的試探名額；呼叫端在啟動每個模型前再呼叫 allow()，
+        否則排在後面、實際上沒被呼叫的模型也會卡住試探名額直到冷卻結束
+        """
+        available = [m for m in models if self.breaker(m["name"]).available()]
+        skipped = [m["name"] for m in models if m not in available]
+        if skipped:
+            print(f"⛔ 斷路器開啟，略過 {skipped}", flush=True, file=sys.stderr)
+        return sorted(available, key=lambda m: self.breaker(m["name"]).p50() or 0.0)
+
+    def stats(self):
+        with self._lock:
+            names = list(self._breakers)
+        return {name: self.breaker(name).stats() for name in names}
+
+
+# =========================
+# 🔗 進行中請求合併（single-flight）
+# =========================
+class SingleFlight:
+    """相同 key 的並行呼叫只執行一次，其餘呼叫等待並共用結果（或例外）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [Event, result, error, waiters]
+        self.leaders = 0
+        self.followers = 0
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = [threading.Event(), None, None, 0]
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call[3] += 1
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = fn()
+        except BaseException as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+            if call[3]:
+                print(f"🔗 合併 {call[3]} 個相同請求", flush=True, file=sys.stderr)
+        return call[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.followers,
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight 的 asyncio 版本（同一個 event loop 內使用）"""
+
+    def __init__(self):
+        self._calls = {}  # key -> (Future, [waiters])
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, coro_fn):
+        """共用的工作在獨立的 task 中執行，所有呼叫者（包含發起者）都經由 shield 等待：
+        任何一個請求被取消（客戶端斷線、逾時）只會取消它自己的等待，不會讓其他人一起收到 CancelledError"""
+        call = self._calls.get(key)
+        if call is not None:
+            call[1][0] += 1
+            self.followers += 1
+            return await asyncio.shield(call[0])
+
+        task = asyncio.ensure_future(coro_fn())
+        call = (task, [0])
+        self._calls[key] = call
+        self.leaders += 1
+
+        def done(_):
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if not task.cancelled():
+                task.exception()  # 所有等待者都已取消時避免 "exception never retrieved" 警告
+            if call[1][0]:
+                print(f"🔗 合併 {call[1][0]} 個相同請求", flush=True, file=sys.stderr)
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+        }
+
+
+# =========================
+# 🚦 速率限制（批次工作）
+# =========================
+class AsyncRateLimiter:
+    """asyncio 版 token bucket：平均每秒 rate 次，最多累積 burst 次（同一個 event loop 內使用）"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = None
+        self.acquired = 0
+        self.waited = 0.0
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 持有鎖等待，後到的請求依序排隊（FIFO）
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                self.waited += delay
+                self._tokens = 1.0
+                self._updated = time.monotonic()
+            self._tokens -= 1
+            self.acquired += 1
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "acquired": self.acquired,
+                "waited": round(self.waited, 3)}
+
+
+def parse_rate_limits(spec: str):
+    """解析 "Gemini=2,Groq=5" 形式的每秒請求數（模型名稱不分大小寫）"""
+    limits = {}
+    for part in (spec or "").split(","):
+        name, sep, rate = part.partition("=")
+        if not sep or not name.strip():
+            continue
+        limits[name.strip().lower()] = float(rate)
+    return limits
+
+
+class ProviderRateLimits:
+    """每個模型各自的 AsyncRateLimiter；未設定的模型不限速。可直接當作 before_call 使用"""
+
+    def __init__(self, limits: dict):
+        self._limiters = {name.lower(): AsyncRateLimiter(rate) for name, rate in limits.items() if rate > 0}
+
+    async def __call__(self, model_name: str):
+        limiter = self._limiters.get(model_name.lower())
+        if limiter is not None:
+            await limiter.acquire()
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
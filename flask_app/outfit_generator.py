@@ -0,0 +1,369 @@
+"""
+穿搭組合產生模組
+從 items 自動組出 上衣 / 下身 / 外套 / 鞋子 / 配件 的穿搭，依場合規則與顏色相容度評分：
+- 單品分數：名稱關鍵字對場合的加減分 + 顏色在該場合的偏好
+- 兩兩分數：顏色相容矩陣（中性色百搭、撞色扣分、同色系過於單調），男裝女裝混搭扣分
+- 每個類別先依單品分數取前 M 名候選，再以 beam search 逐一加入類別，
+  每一步用 NumPy 一次算出 (beam × 候選) 的總分
+- 有時間預算：超時後剩下的類別改為貪婪選擇，保證在預算內回傳
+- 產生器依型錄快照建立，結果依場合快取（型錄更新時整個產生器重建）
+"""
+
+import threading
+import time
+
+import numpy as np
+
+SLOTS = ('top', 'bottom', 'shoes', 'outer', 'accessory')
+REQUIRED_SLOTS = ('top', 'bottom', 'shoes')
+OCCASIONS = ('casual', 'formal', 'street', 'sport', 'date')
+
+OCCASION_NAMES = {
+    'casual': '休閒', 'formal': '正式', 'street': '街頭', 'sport': '運動', 'date': '約會',
+}
+
+# 原始資料（Kaggle articleType 等）的類別 → items.category
+ARTICLE_TYPE_SLOTS = {
+    'tshirts': 'top', 'shirts': 'top', 'tops': 'top', 'kurtas': 'top', 'sweatshirts': 'top',
+    'sweaters': 'top', 'tunics': 'top', 'kurtis': 'top', 'innerwear vests': 'top',
+    'jeans': 'bottom', 'trousers': 'bottom', 'shorts': 'bottom', 'track pants': 'bottom',
+    'capris': 'bottom', 'skirts': 'bottom', 'leggings': 'bottom', 'jeggings': 'bottom', 'churidar': 'bottom',
+    'jackets': 'outer', 'blazers': 'outer', 'coats': 'outer', 'waistcoat': 'outer', 'rain jacket': 'outer',
+    'casual shoes': 'shoes', 'sports shoes': 'shoes', 'formal shoes': 'shoes', 'heels': 'shoes',
+    'flats': 'shoes', 'sandals': 'shoes', 'flip flops': 'shoes', 'sports sandals': 'shoes',
+    'watches': 'accessory', 'belts': 'accessory', 'sunglasses': 'accessory', 'caps': 'accessory',
+    'handbags': 'accessory', 'backpacks': 'accessory', 'wallets': 'accessory', 'ties': 'accessory',
+    'clutches': 'accessory', 'earrings': 'accessory', 'ring': 'accessory', 'bracelet': 'accessory',
+    'scarves': 'accessory', 'socks': 'accessory', 'pendant': 'accessory', 'necklace and chains': 'accessory',
+}
+
+# 顏色 → 色系（比對不到時取最後一個字，例如 sea green → green）
+COLOR_GROUPS = ('black', 'white', 'grey', 'navy', 'beige', 'brown', 'metallic',
+                'blue', 'red', 'pink', 'green', 'purple', 'yellow', 'orange', 'multi', 'other')
+COLOR_ALIASES = {
+    'navy blue': 'navy', 'off white': 'white', 'cream': 'beige', 'skin': 'beige', 'nude': 'beige',
+    'khaki': 'beige', 'tan': 'brown', 'taupe': 'brown', 'coffee brown': 'brown', 'mushroom brown': 'brown',
+    'charcoal': 'grey', 'grey melange': 'grey', 'gray': 'grey', 'silver': 'metallic', 'gold': 'metallic',
+    'bronze': 'metallic', 'copper': 'metallic', 'steel': 'metallic', 'metallic': 'metallic',
+    'maroon': 'red', 'burgundy': 'red', 'rust': 'orange', 'peach': 'orange', 'mustard': 'yellow',
+    'magenta': 'pink', 'rose': 'pink', 'lavender': 'purple', 'mauve': 'purple', 'olive': 'green',
+    'teal': 'blue', 'turquoise blue': 'blue',
+    '白': 'white', '黑': 'black', '灰': 'grey', '深藍': 'navy', '藍': 'blue', '紅': 'red', '綠': 'green',
+    '米': 'beige', '卡其': 'beige', '棕': 'brown', '咖啡': 'brown', '粉': 'pink', '黃': 'yellow', '紫': 'purple',
+}
+NEUTRALS = {'black', 'white', 'grey', 'navy', 'beige', 'brown', 'metallic'}
+CLASHES = {
+    ('red', 'green'): 0.1, ('red', 'pink'): 0.2, ('red', 'orange'): 0.3, ('orange', 'pink'): 0.2,
+    ('purple', 'yellow'): 0.3, ('green', 'pink'): 0.4, ('multi', 'multi'): 0.2, ('black', 'navy'): 0.6,
+    ('brown', 'black'): 0.6,
+}
+GOOD_PAIRS = {
+    ('blue', 'brown'): 0.85, ('green', 'brown'): 0.8, ('blue', 'beige'): 0.9, ('pink', 'grey'): 0.9,
+    ('blue', 'white'): 1.0, ('navy', 'white'): 1.0, ('black', 'white'): 1.0,
+}
+
+# 場合規則：名稱含關鍵字時加 / 減分，以及各色系在該場合的偏好
+OCCASION_RULES = {
+    'casual': {
+        '+': ['tshirt', 't-shirt', 'jeans', 'casual', 'sneaker', 'shorts', 'cap', 'backpack', 'polo',
+              't恤', '牛仔', '球鞋', '休閒'],
+        '-': ['formal', 'tie', 'blazer', 'heels', 'saree', '西裝', '皮鞋'],
+        'colors': {},
+    },
+    'formal': {
+        '+': ['shirt', 'trouser', 'formal', 'blazer', 'suit', 'tie', 'watch', 'belt', 'chinos',
+              '襯衫', '西裝', '皮鞋', '外套'],
+        '-': ['tshirt', 't-shirt', 'shorts', 'flip flop', 'track', 'sports', 'cap', 'printed', 'graphic',
+              '短褲', '拖鞋', '運動', 't恤'],
+        'colors': {'black': 0.3, 'navy': 0.3, 'grey': 0.25, 'white': 0.25, 'beige': 0.1, 'brown': 0.1,
+                   'multi': -0.4, 'yellow': -0.3, 'orange': -0.3, 'pink': -0.2},
+    },
+    'street': {
+        '+': ['sweatshirt', 'hoodie', 'jeans', 'sneaker', 'casual shoes', 'cap', 'jacket', 'graphic',
+              'printed', 'backpack', '帽t', '牛仔', '球鞋', '外套'],
+        '-': ['formal', 'tie', 'saree', 'heels', 'kurta', '西裝', '皮鞋'],
+        'colors': {'black': 0.2, 'multi': 0.1},
+    },
+    'sport': {
+        '+': ['sports', 'track', 'running', 'training', 'tshirt', 'shorts', 'cap', 'socks', 'dri-fit',
+              '運動', '球鞋', '短褲'],
+        '-': ['formal', 'heels', 'blazer', 'watch', 'tie', 'jeans', 'clutch', 'saree', '皮鞋', '西裝', '牛仔'],
+        'colors': {},
+    },
+    'date': {
+        '+': ['shirt', 'dress', 'heels', 'jeans', 'watch', 'perfume', 'clutch', 'earrings', 'chinos',
+              'slim', '襯衫', '洋裝', '外套'],
+        '-': ['track', 'sports', 'flip flop', 'socks', 'briefs', '運動', '拖鞋'],
+        'colors': {'red': 0.15, 'pink': 0.1, 'white': 0.1, 'navy': 0.1},
+    },
+}
+# 選配類別「不穿」的分數（相對於加入一件單品）
+OPTIONAL_NONE_SCORE = {
+    'casual': {'outer': 0.3, 'accessory': 0.2},
+    'formal': {'outer': -0.2, 'accessory': 0.1},
+    'street': {'outer': 0.1, 'accessory': 0.2},
+    'sport': {'outer': 0.8, 'accessory': 0.3},
+    'date': {'outer': 0.2, 'accessory': 0.0},
+}
+# 兩兩顏色相容度的權重（配件的顏色影響較小）
+PAIR_WEIGHT = {'accessory': 0.5}
+KEYWORD_WEIGHT = 0.5
+# 名稱標示的性別不同（男裝配女裝）時的扣分；中性 / 未標示不扣分
+GENDER_MISMATCH_PENALTY = 2.0
+GENDER_WORDS = {'men': 1, 'man': 1, 'boys': 1, 'boy': 1, "men's": 1, '男': 1,
+                'women': 2, 'woman': 2, 'girls': 2, 'girl': 2, "women's": 2, '女': 2}
+
+
+def color_group(color) -> str:
+    color = (color or '').strip().lower()
+    if not color:
+        return 'other'
+    if color in COLOR_GROUPS:
+        return color
+    if color in COLOR_ALIASES:
+        return COLOR_ALIASES[color]
+    last = color.split()[-1]
+    if last in COLOR_GROUPS:
+        return last
+    for alias, group in COLOR_ALIASES.items():
+        if alias in color:
+            return group
+    return 'other'
+
+
+def name_gender(name) -> int:
+    """由名稱判斷性別：0 = 中性 / 未標示，1 = 男，2 = 女"""
+    name = (name or '').lower()
+    for word in name.split():
+        if word in GENDER_WORDS:
+            return GENDER_WORDS[word]
+    for word in ('男', '女'):
+        if word in name:
+            return GENDER_WORDS[word]
+    return 0
+
+
+def build_color_matrix():
+    """色系兩兩相容度（0~1）"""
+    n = len(COLOR_GROUPS)
+    matrix = np.full((n, n), 0.55, dtype=np.float32)
+    for i, a in enumerate(COLOR_GROUPS):
+        for j, b in enumerate(COLOR_GROUPS):
+            if a in NEUTRALS and b in NEUTRALS:
+                score = 0.95
+            elif a in NEUTRALS or b in NEUTRALS:
+                score = 0.85
+            elif a == b:
+                score = 0.4  # 同一個亮色從頭到腳太單調
+            else:
+                score = 0.55
+            score = CLASHES.get((a, b), CLASHES.get((b, a), score))
+            score = GOOD_PAIRS.get((a, b), GOOD_PAIRS.get((b, a), score))
+            matrix[i, j] = score
+    return matrix
+
+
+COLOR_MATRIX = build_color_matrix()
+GENDER_MATRIX = np.array([[0, 0, 0],
+                          [0, 0, -GENDER_MISMATCH_PENALTY],
+                          [0, -GENDER_MISMATCH_PENALTY, 0]], dtype=np.float32)
+_GROUP_INDEX = {g: i for i, g in enumerate(COLOR_GROUPS)}
+
+
+class OutfitGenerator:
+    def __init__(self, items, change_seq=None, candidates_per_slot: int = 40, beam_width: int = 128):
+        """
+        Args:
+            items: 單品紀錄（需有 id、name、category、color），category 為 SLOTS 之一
+                   或 ARTICLE_TYPE_SLOTS 中的原始類別
+            change_seq: 建立時的型錄快照序號（用來判斷是否需要重建）
+            candidates_per_slot: 每個類別保留的候選數 M
+            beam_width: beam search 保留的部分組合數
+        """
+        self.change_seq = change_seq
+        self.candidates_per_slot = candidates_per_slot
+        self.beam_width = beam_width
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.budget_exceeded = 0
+
+        self.items = []
+        slots, colors, genders, names = [], [], [], []
+        for item in items:
+            category = (getattr(item, 'category', None) or '').strip().lower()
+            slot = category if category in SLOTS else ARTICLE_TYPE_SLOTS.get(category)
+            if slot is None:
+                continue
+            self.items.append(item)
+            slots.append(SLOTS.index(slot))
+            colors.append(_GROUP_INDEX[color_group(getattr(item, 'color', None))])
+            genders.append(name_gender(getattr(item, 'name', None)))
+            names.append(f"{getattr(item, 'name', '') or ''} {category}".lower())
+
+        self.slot_of = np.asarray(slots, dtype=np.int8)
+        self.color_of = np.asarray(colors, dtype=np.int16)
+        self.gender_of = np.asarray(genders, dtype=np.int8)
+        self.slot_members = {s: np.flatnonzero(self.slot_of == i) for i, s in enumerate(SLOTS)}
+
+        # 單品 × 場合 的分數（關鍵字規則只在建立時跑一次）
+        self.unary = np.zeros((len(OCCASIONS), len(self.items)), dtype=np.float32)
+        for o, occasion in enumerate(OCCASIONS):
+            rules = OCCASION_RULES[occasion]
+            keyword = np.fromiter(
+                (sum(k in name for k in rules['+']) - sum(k in name for k in rules['-']) for name in names),
+                dtype=np.float32, count=len(names))
+            color_bonus = np.asarray([rules['colors'].get(g, 0.0) for g in COLOR_GROUPS], dtype=np.float32)
+            self.unary[o] = KEYWORD_WEIGHT * np.clip(keyword, -2, 2) + color_bonus[self.color_of]
+
+    @classmethod
+    def from_snapshot(cls, snapshot, **kwargs):
+        items = [snapshot.items[i] for i in snapshot.item_ids]
+        return cls(items, snapshot.change_seq, **kwargs)
+
+    def _candidates(self, o, slot, excluded=None):
+        """該類別依單品分數排序的前 M 名（單品在 self.items 中的位置），略過 excluded 標記的單品"""
+        members = self.slot_members[slot]
+        if excluded is not None:
+            members = members[~excluded[members]]
+        if len(members) <= self.candidates_per_slot:
+            return members[np.argsort(-self.unary[o, members], kind='stable')]
+        scores = self.unary[o, members]
+        top = np.argpartition(scores, -self.candidates_per_slot)[-self.candidates_per_slot:]
+        return members[top[np.argsort(-scores[top], kind='stable')]]
+
+    def generate(self, occasion: str = 'casual', top_n: int = 5, budget_ms: float = 50.0, max_item_reuse: int = 1):
+        """產生前 top_n 組穿搭，回傳 [(分數, {slot: 單品紀錄}), ...]
+
+        Args:
+            budget_ms: 時間預算；超過時剩下的類別改為貪婪選擇
+            max_item_reuse: 同一件單品最多出現在幾組結果中（避免結果只差一件配件）
+        """
+        if occasion not in OCCASIONS:
+            occasion = 'casual'
+        key = (occasion, top_n, max_item_reuse, budget_ms)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        result, degraded = self._search(occasion, top_n, budget_ms, max_item_reuse)
+        with self._lock:
+            if degraded:
+                # 超過預算改用貪婪選擇的結果品質較差（也受當下負載影響），不快取，下次重新搜尋
+                self.budget_exceeded += 1
+            else:
+                self._cache[key] = result
+        return result
+
+    def _search(self, occasion, top_n, budget_ms, max_item_reuse):
+        """反覆執行 beam search：每輪依分數挑出不衝突的組合，
+        用滿 max_item_reuse 次的單品在下一輪排除，直到湊滿 top_n 組或沒有新組合。
+        回傳 (結果, 是否曾因超過預算而降級)"""
+        deadline = time.perf_counter() + budget_ms / 1000
+        o = OCCASIONS.index(occasion)
+        used = np.zeros(len(self.items), dtype=np.int32)
+        results = []
+        degraded = False
+        while len(results) < top_n:
+            beam_scores, beam_choices, chosen_slots, narrowed = self._beam(o, occasion, deadline,
+                                                                          used >= max_item_reuse)
+            degraded |= narrowed
+            added = 0
+            for score, choices in zip(beam_scores, beam_choices):
+                picked = choices[choices >= 0]
+                if (used[picked] >= max_item_reuse).any():
+                    continue
+                used[picked] += 1
+                outfit = {slot: self.items[int(c)] for slot, c in zip(chosen_slots, choices) if c >= 0}
+                results.append((round(float(score), 4), outfit))
+                added += 1
+                if len(results) >= top_n:
+                    break
+            if not added:
+                break
+        return results, degraded
+
+    def _beam(self, o, occasion, deadline, excluded):
+        """一輪 beam search，回傳 (分數, 各類別選擇, 類別順序, 是否超過預算)，依分數由高到低"""
+        beam_scores = np.zeros(1, dtype=np.float32)
+        beam_choices = np.zeros((1, 0), dtype=np.int64)  # 每欄一個類別；-1 表示不穿
+        chosen_slots = []
+        width = self.beam_width
+
+        for slot in SLOTS:
+            cands = self._candidates(o, slot, excluded)
+            optional = slot not in REQUIRED_SLOTS
+            if not len(cands):
+                if not optional:
+                    return [], [], chosen_slots, width < self.beam_width
+                beam_choices = np.hstack([beam_choices, np.full((len(beam_scores), 1), -1)])
+                chosen_slots.append(slot)
+                continue
+
+            # (beam, 候選) 總分 = 目前分數 + 單品分數 + 與已選單品的顏色相容度 / 性別一致性
+            total = beam_scores[:, None] + self.unary[o, cands][None, :]
+            cand_colors = self.color_of[cands]
+            cand_genders = self.gender_of[cands]
+            weight = PAIR_WEIGHT.get(slot, 1.0)
+            for col, prev_slot in enumerate(chosen_slots):
+                prev = beam_choices[:, col]
+                picked = prev >= 0
+                if not picked.any():
+                    continue
+                prev = np.where(picked, prev, 0)
+                pair = (COLOR_MATRIX[self.color_of[prev][:, None], cand_colors[None, :]]
+                        * weight * PAIR_WEIGHT.get(prev_slot, 1.0)
+                        + GENDER_MATRIX[self.gender_of[prev][:, None], cand_genders[None, :]])
+                total += np.where(picked[:, None], pair, 0.0)
+
+            choice_ids = np.broadcast_to(cands[None, :], total.shape)
+            if optional:
+                # 加上「不穿」這個選項
+                none = beam_scores[:, None] + OPTIONAL_NONE_SCORE[occasion].get(slot, 0.0)
+                total = np.hstack([total, none])
+                choice_ids = np.hstack([choice_ids, np.full((len(beam_scores), 1), -1)])
+
+            if time.perf_counter() > deadline and width > 1:
+                width = 1  # 超過預算：剩下的類別只保留最好的一個
+
+            flat = total.ravel()
+            keep = min(width, flat.size)
+            top = np.argpartition(flat, -keep)[-keep:]
+            top = top[np.argsort(-flat[top], kind='stable')]
+            rows, cols = np.divmod(top, total.shape[1])
+            beam_scores = flat[top].astype(np.float32)
+            beam_choices = np.hstack([beam_choices[rows], choice_ids[rows, cols][:, None]])
+            chosen_slots.append(slot)
+
+        return beam_scores, beam_choices, chosen_slots, width < self.beam_width
+
+    def generate_dicts(self, occasion: str = 'casual', top_n: int = 5, budget_ms: float = 50.0):
+        """與 RAG 檢索結果相同格式的穿搭（id 為 None，generated=True）"""
+        if occasion not in OCCASIONS:
+            occasion = 'casual'
+        outfits = []
+        for rank, (score, slots) in enumerate(self.generate(occasion, top_n, budget_ms), 1):
+            outfits.append({
+                "id": None,
+                "name": f"{OCCASION_NAMES[occasion]}推薦組合 {rank}",
+                "occasion": occasion,
+                "description": "系統依場合與顏色搭配規則自動組合",
+                "items": [slots[s].as_dict() for s in SLOTS if s in slots],
+                "score": score,
+                "generated": True,
+            })
+        return outfits
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self.items),
+                "change_seq": self.change_seq,
+                "cached_occasions": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "budget_exceeded": self.budget_exceeded,
+            }
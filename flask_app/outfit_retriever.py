@@ -0,0 +1,455 @@
+"""
+穿搭向量檢索模組（RAG）
+以雜湊字元 n-gram TF-IDF 把穿搭（場合、名稱、描述，以及所含單品的名稱、類別、顏色，依欄位加權）轉成向量，
+查詢時取餘弦相似度最高的前 k 組，不需要外部模型或網路
+
+- n-gram 雜湊到固定的 dim 維，矩陣以 CSR（維度 × 穿搭，NumPy 陣列）存放：
+  查詢只讀取出現的 n-gram 那幾列的非零值，一次 bincount 算出所有穿搭的餘弦相似度
+- 內容完全相同的列只存一份（例如「約」「會」「約會」都只出現在 date 場合的穿搭中），
+  其餘維度以 alias 指向它；查詢時先把權重加總到同一列，每份清單只讀一次，結果與展開前完全相同
+- 英文的場合 / 類別 / 顏色值會附上中文說法，中文查詢也能對到英文 ENUM
+- 索引可存到磁碟，載入時使用 memory-map，多個 worker 共用同一份分頁快取；
+  型錄異動時以檔案鎖讓一個 worker 重建並存檔，其餘 worker 直接載入它的結果
+- 查詢略過 df 超過 MAX_DF_RATIO 的 n-gram，分數是近似值（排序幾乎不受影響，但不是完整的餘弦相似度）
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from response_cache import normalize_text
+
+try:
+    import fcntl  # 只有 Unix 有；Windows 本機開發時每個 worker 各自重建
+except ImportError:
+    fcntl = None
+
+INDEX_VERSION = 3
+
+# 英文 ENUM 值的中文說法（建立向量時一併加入）
+OCCASION_LABELS = {
+    'casual': '休閒 日常 逛街 週末 旅遊',
+    'formal': '正式 上班 辦公 商務',
+    'street': '街頭 潮流 派對 聚會',
+    'sport': '運動 健身 跑步',
+    'date': '約會 浪漫 晚餐',
+}
+CATEGORY_LABELS = {
+    'top': '上衣',
+    'bottom': '褲子 裙子 下身',
+    'outer': '外套',
+    'shoes': '鞋子',
+    'accessory': '配件',
+}
+COLOR_LABELS = {
+    'white': '白色', 'black': '黑色', 'grey': '灰色', 'gray': '灰色', 'navy': '深藍',
+    'blue': '藍色', 'red': '紅色', 'green': '綠色', 'beige': '米色', 'brown': '棕色 咖啡色',
+    'pink': '粉色', 'yellow': '黃色', 'purple': '紫色',
+}
+
+
+# 欄位權重：場合最能代表穿搭用途，其次是穿搭名稱與描述，單品欄位最低
+OCCASION_WEIGHT = 3
+OUTFIT_WEIGHT = 2
+ITEM_WEIGHT = 1
+# 出現在超過此比例穿搭中的 n-gram 查詢時略過（幾乎沒有區別力，卻要讀取最長的清單）
+MAX_DF_RATIO = 0.5
+# 雜湊空間大小（夠大時不同 n-gram 幾乎不會落在同一維）
+DEFAULT_DIM = 1 << 20
+# 取前 k 名時依序嘗試的門檻（最高分的比例；0 表示所有分數 > 0 的穿搭）
+TOP_K_THRESHOLDS = (0.8, 0.5, 0.2, 0)
+
+
+def outfit_fields(outfit, items):
+    """穿搭的檢索欄位 [(文字, 權重), ...]；outfit / items 為 CatalogSnapshot 的紀錄"""
+    fields = [
+        (outfit.occasion or '', OCCASION_WEIGHT),
+        (OCCASION_LABELS.get(outfit.occasion, ''), OCCASION_WEIGHT),
+        (outfit.name or '', OUTFIT_WEIGHT),
+        (outfit.description or '', OUTFIT_WEIGHT),
+    ]
+    for item in items:
+        fields += [
+            (item.name or '', ITEM_WEIGHT),
+            (item.category or '', ITEM_WEIGHT),
+            (CATEGORY_LABELS.get(item.category, ''), ITEM_WEIGHT),
+            (item.color or '', ITEM_WEIGHT),
+            (COLOR_LABELS.get(item.color_norm, ''), ITEM_WEIGHT),
+        ]
+    return fields
+
+
+class HashedNgramVectorizer:
+    def __init__(self, dim: int = DEFAULT_DIM, ngram_range=(1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._token_cache = {}
+
+    def _token_buckets(self, token):
+        """片語 → 所有 n-gram 的維度（快取；同一個片語在型錄中會重複出現很多次）"""
+        buckets = self._token_cache.get(token)
+        if buckets is None:
+            text = normalize_text(token)
+            if text.isdigit():  # 編號、尺寸等純數字沒有檢索意義
+                text = ''
+            low, high = self.ngram_range
+            # crc32 在不同程序間結果固定（內建 hash() 每次啟動都不同，無法存檔）
+            buckets = tuple(
+                zlib.crc32(text[i:i + n].encode('utf-8')) % self.dim
+                for n in range(low, high + 1) for i in range(len(text) - n + 1)
+            )
+            if len(self._token_cache) < 200_000:
+                self._token_cache[token] = buckets
+        return buckets
+
+    def text_buckets(self, text):
+        """文字 → 所有 n-gram 的維度（可重複）；每個片語各自切 n-gram，不跨越空白"""
+        buckets = self._token_cache.get((text,))
+        if buckets is None:
+            buckets = tuple(b for token in text.split() for b in self._token_buckets(token))
+            if len(self._token_cache) < 200_000:
+                self._token_cache[(text,)] = buckets
+        return buckets
+
+    def counts(self, text):
+        """文字 → {維度: 次數}"""
+        return Counter(self.text_buckets(text))
+
+    def field_counts(self, fields):
+        """[(文字, 權重), ...] → {維度: 加權次數}"""
+        buckets = []
+        for text, weight in fields:
+            buckets.extend(self.text_buckets(text) * weight)
+        return Counter(buckets)
+
+
+class OutfitIndex:
+    ARRAYS = ('indptr', 'indices', 'data', 'ids', 'idf', 'alias')
+
+    def __init__(self, indptr, indices, data, ids, idf, alias, vectorizer, change_seq=None):
+        """以 CSR 格式（維度 × 穿搭）存放的 TF-IDF 矩陣，每欄是一組穿搭的單位向量
+
+        Args:
+            indptr: (dim + 1,) 第 d 維的非零值位於 indices / data[indptr[d]:indptr[d + 1]]
+            indices: (nnz,) 非零值所在的欄（穿搭的位置）
+            data: (nnz,) float32 權重
+            ids: (n,) 穿搭 id
+            idf: (dim,) float32
+            alias: (dim,) int32，第 d 維的非零值實際存放在第 alias[d] 列（與另一列完全相同時只存一份）
+            change_seq: 建立索引時的型錄快照序號
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.ids = ids
+        self.idf = idf
+        self.alias = alias
+        self.aliased_dims = int(np.count_nonzero(alias != np.arange(len(alias), dtype=alias.dtype)))
+        self.vectorizer = vectorizer
+        self.change_seq = change_seq
+
+    @classmethod
+    def build(cls, ids, documents, dim: int = DEFAULT_DIM, change_seq=None):
+        """documents 為每組穿搭的 [(文字, 權重), ...]"""
+        vectorizer = HashedNgramVectorizer(dim)
+        n = len(ids)
+        rows, cols, tf = [], [], []
+        for col, fields in enumerate(documents):
+            counts = vectorizer.field_counts(fields)
+            rows.extend(counts.keys())
+            cols.extend([col] * len(counts))
+            tf.extend(counts.values())
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int32)
+        df = np.bincount(rows, minlength=dim)
+        idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+        data = (1.0 + np.log(np.asarray(tf, dtype=np.float32))) * idf[rows]  # sublinear tf × idf
+
+        norms = np.sqrt(np.bincount(cols, weights=data * data, minlength=n)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        data /= norms[cols]
+
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(dim + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        indptr, indices, data, alias = cls._dedupe(indptr, cols[order], data[order].astype(np.float32))
+        return cls(indptr, indices, data, np.asarray(ids, dtype=np.int64), idf, alias, vectorizer, change_seq)
+
+    @staticmethod
+    def _dedupe(indptr, indices, data):
+        """內容（穿搭與權重）完全相同的列只保留第一列，回傳 (indptr, indices, data, alias)
+
+        相同的列 df 一樣、idf 也一樣，所以權重逐一相同；查詢時把這些維度的權重加總後乘一次即可
+        """
+        dim = len(indptr) - 1
+        alias = np.arange(dim, dtype=np.int32)
+        lengths = np.diff(indptr)
+        first = {}
+        for d in np.flatnonzero(lengths):
+            a, b = indptr[d], indptr[d + 1]
+            key = (int(b - a), hashlib.blake2b(indices[a:b]).digest(), hashlib.blake2b(data[a:b]).digest())
+            canonical = first.setdefault(key, d)
+            if canonical != d:
+                c = indptr[canonical]
+                if np.array_equal(indices[a:b], indices[c:c + b - a]) and np.array_equal(data[a:b], data[c:c + b - a]):
+                    alias[d] = canonical
+        duplicate = alias != np.arange(dim)
+        if not duplicate.any():
+            return indptr, indices, data, alias
+        keep = np.repeat(~duplicate, lengths)
+        lengths = np.where(duplicate, 0, lengths)
+        indptr = np.zeros(dim + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return indptr, indices[keep], data[keep], alias
+
+    @classmethod
+    def from_snapshot(cls, snapshot, dim: int = DEFAULT_DIM):
+        ids = snapshot.outfit_ids
+        documents = []
+        for outfit_id in ids:
+            items = [snapshot.items[i] for i in snapshot.outfit_items.get(outfit_id, ()) if i in snapshot.items]
+            documents.append(outfit_fields(snapshot.outfits[outfit_id], items))
+        return cls.build(ids, documents, dim, snapshot.change_seq)
+
+    def search(self, query: str, k: int = 5, max_df_ratio: float = MAX_DF_RATIO):
+        """回傳相似度最高的 [(outfit_id, score), ...]（只含 score > 0）
+
+        只讀取查詢中出現的 n-gram 對應的非零值；型錄中沒有的 n-gram 不花任何成本。
+        """
+        n = len(self.ids)
+        counts = self.vectorizer.counts(query)
+        if not n or not counts:
+            return []
+        dims = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights = (1.0 + np.log(tf)) * self.idf[dims]
+        weights /= np.linalg.norm(weights)
+
+        # 內容相同的維度共用一列：權重先加總，每列只讀一次
+        dims, inverse = np.unique(self.alias[dims], return_inverse=True)
+        weights = np.bincount(inverse, weights=weights)
+        dims = dims.astype(np.int64)
+
+        starts, ends = self.indptr[dims], self.indptr[dims + 1]
+        present = ends > starts
+        if not present.any():
+            return []
+        selective = present & (ends - starts <= max_df_ratio * n)
+        if selective.any():
+            present = selective
+        cols = [self.indices[a:b] for a, b in zip(starts[present], ends[present])]
+        vals = [self.data[a:b] * w for a, b, w in zip(starts[present], ends[present], weights[present])]
+        # indices 以 int32 存放省空間；bincount 遇到非 intp 的輸入會走慢很多的路徑，先轉型（只多一次複製）
+        cols = np.concatenate(cols).astype(np.intp, copy=False)
+        scores = np.bincount(cols, weights=np.concatenate(vals), minlength=n)
+
+        top = self._top_k(scores, k)
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    @staticmethod
+    def _top_k(scores, k):
+        """分數 > 0 的前 k 名位置（由高到低）
+
+        先以最高分的一定比例為門檻篩出候選，候選數 ≥ k 時前 k 名一定都在其中，
+        只需對這一小部分做 argpartition（整個陣列做 argpartition 在十萬組時就要約 0.5 ms）
+        """
+        best = scores.max()
+        if best <= 0:
+            return []
+        for ratio in TOP_K_THRESHOLDS:
+            cand = np.flatnonzero(scores >= best * ratio) if ratio else np.flatnonzero(scores > 0)
+            if len(cand) >= k:
+                break
+        if len(cand) > k:
+            cand = cand[np.argpartition(scores[cand], -k)[-k:]]
+        return cand[np.argsort(-scores[cand], kind='stable')]
+
+    # ---------- 存檔 / 載入 ----------
+
+    def save(self, directory):
+        """寫入暫存目錄後再換名，避免其他 worker 讀到寫一半的檔案"""
+        tmp = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "dim": self.vectorizer.dim,
+                "ngram_range": list(self.vectorizer.ngram_range),
+                "change_seq": self.change_seq,
+            }, f)
+        if os.path.isdir(directory):
+            old = f"{directory}.old{os.getpid()}"
+            os.rename(directory, old)
+            os.rename(tmp, directory)
+            for name in os.listdir(old):
+                os.remove(os.path.join(old, name))
+            os.rmdir(old)
+        else:
+            os.rename(tmp, directory)
+
+    @classmethod
+    def load(cls, directory):
+        """以 memory-map 載入索引；檔案不存在或格式不符時回傳 None"""
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            vectorizer = HashedNgramVectorizer(meta["dim"], tuple(meta["ngram_range"]))
+            arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in cls.ARRAYS]
+            return cls(*arrays, vectorizer, meta.get("change_seq"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def stats(self):
+        return {
+            "outfits": int(len(self.ids)),
+            "dim": self.vectorizer.dim,
+            "nnz": int(len(self.data)),
+            "aliased_dims": self.aliased_dims,
+            "change_seq": self.change_seq,
+            "mmap": isinstance(self.data, np.memmap),
+        }
+
+
+class OutfitRetriever:
+    def __init__(self, index_dir=None, dim: int = DEFAULT_DIM, min_rebuild_interval: float = 30.0):
+        """維護與型錄快照同步的向量索引
+
+        型錄異動時在背景執行緒重建索引，重建期間沿用舊索引（已刪除的穿搭在組裝結果時略過）；
+        有 index_dir 時以 {index_dir}.lock 檔案鎖排隊，先拿到鎖的 worker 重建並存檔，
+        後面的 worker 發現存檔已是同一個快照序號就直接 memory-map 載入，不必各自重建
+
+        Args:
+            index_dir: 索引存放目錄（None 表示只放在記憶體）
+            dim: 向量維度
+            min_rebuild_interval: 兩次重建之間至少間隔幾秒（型錄連續異動時不會一直重建）
+        """
+        self.index_dir = index_dir
+        self.dim = dim
+        self.min_rebuild_interval = min_rebuild_interval
+        self._built_at = float('-inf')
+        self.index = OutfitIndex.load(index_dir) if index_dir else None
+        if self.index is not None and self.index.vectorizer.dim != dim:
+            self.index = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # 重建結束時通知 current(wait=True)
+        self._building = False
+
+        self.rebuilds = 0
+        self.shared_loads = 0
+        self.searches = 0
+        self.last_build_ms = 0.0
+        self.last_search_ms = 0.0
+
+    @contextmanager
+    def _build_lock(self):
+        """跨 worker 的重建鎖（沒有 index_dir 或不支援 fcntl 時不鎖）"""
+        if not self.index_dir or fcntl is None:
+            yield
+            return
+        with open(f"{self.index_dir}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_shared(self, snapshot):
+        """其他 worker 已存好、不比這份快照舊的索引；沒有時回傳 None
+
+        存檔比快照新時也直接使用（不可用舊快照重建而蓋掉較新的存檔），已不存在的穿搭在組裝結果時略過
+        """
+        if not self.index_dir:
+            return None
+        index = OutfitIndex.load(self.index_dir)
+        if index is None or index.vectorizer.dim != self.dim or index.change_seq is None:
+            return None
+        return index if index.change_seq >= snapshot.change_seq else None
+
+    def _rebuild(self, snapshot):
+        try:
+            with self._build_lock():
+                index = self._load_shared(snapshot)
+                if index is not None:
+                    self.shared_loads += 1
+                else:
+                    start = time.perf_counter()
+                    index = OutfitIndex.from_snapshot(snapshot, self.dim)
+                    self.last_build_ms = round((time.perf_counter() - start) * 1000, 2)
+                    if self.index_dir:
+                        try:
+                            index.save(self.index_dir)
+                        except OSError as e:
+                            print(f"⚠️ 向量索引存檔失敗: {e}", file=sys.stderr)
+                    self.rebuilds += 1
+            self.index = index
+            self._built_at = time.monotonic()
+        except Exception as e:
+            print(f"⚠️ 向量索引建立失敗: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._building = False
+                self._idle.notify_all()
+
+    def current(self, snapshot, wait: bool = False):
+        """回傳索引；與快照不同步時觸發重建
+
+        wait=False 時不等待，先用舊索引；wait=True 時若其他執行緒正在重建會等它完成，
+        結果仍與快照不同步（例如它用的是較舊的快照）再自己重建
+        """
+        index = self.index
+        if index is not None and index.change_seq == snapshot.change_seq:
+            return index
+        if index is not None and not wait and time.monotonic() - self._built_at < self.min_rebuild_interval:
+            return index
+        with self._lock:
+            if wait:
+                while self._building:
+                    self._idle.wait()
+                index = self.index
+                if index is not None and index.change_seq == snapshot.change_seq:
+                    return index
+            start = not self._building
+            self._building = True
+        if start:
+            if wait:
+                self._rebuild(snapshot)
+            else:
+                threading.Thread(target=self._rebuild, args=(snapshot,), daemon=True).start()
+        return self.index
+
+    def retrieve(self, snapshot, query: str, k: int = 5):
+        """回傳最相關的穿搭（含單品）；索引尚未就緒或沒有任何相關結果時回傳空清單"""
+        index = self.current(snapshot)
+        if index is None:
+            return []
+        start = time.perf_counter()
+        # 多取一些，扣掉索引建立後才被刪除的穿搭
+        hits = index.search(query, k + 5 if index.change_seq != snapshot.change_seq else k)
+        self.last_search_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.searches += 1
+        return snapshot.outfit_dicts([outfit_id for outfit_id, _ in hits])[:k]
+
+    def stats(self):
+        index = self.index
+        return {
+            "rebuilds": self.rebuilds,
+            "shared_loads": self.shared_loads,
+            "searches": self.searches,
+            "building": self._building,
+            "last_build_ms": self.last_build_ms,
+            "last_search_ms": self.last_search_ms,
+            **(index.stats() if index else {}),
+        }
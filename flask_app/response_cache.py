@@ -0,0 +1,153 @@
+"""
+AI 回應快取模組
+以「正規化後的使用者輸入 + 關鍵字 + 檢索到的穿搭 + 模型選擇」為 key 快取 LLM 回應：
+- 精確比對：完全相同的 key
+- 模糊比對（可選）：相同關鍵字 / 穿搭 / 模型下，輸入的字元 n-gram 相似度超過門檻
+檢索到的穿搭內容會算進 key 的摘要，資料庫的穿搭或單品一改就不會再命中舊回應
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """全形轉半形、轉小寫、移除空白與標點"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCT_RE.sub("", text)
+
+
+def char_ngrams(text: str, n: int = 2):
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def outfits_digest(db_outfits) -> str:
+    """穿搭與單品內容的摘要（資料變動時摘要也會變）"""
+    payload = json.dumps(db_outfits or [], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 600.0, fuzzy_threshold: float = None):
+        """建立回應快取
+
+        Args:
+            max_entries: 最多保留幾筆回應（LRU 淘汰）
+            ttl: 回應保留秒數
+            fuzzy_threshold: 模糊比對的 Jaccard 門檻（None 表示只做精確比對）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (response, model, expires_at, bucket, ngrams)
+        self._buckets = {}  # bucket -> {key, ...}（模糊比對只在同一 bucket 內進行）
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_bucket(keywords, db_outfits, preferred_model: str):
+        outfit_ids = sorted(o.get('id') for o in (db_outfits or []) if o.get('id') is not None)
+        return (
+            tuple(sorted(keywords or [])),
+            tuple(outfit_ids),
+            outfits_digest(db_outfits),
+            (preferred_model or "auto").lower(),
+        )
+
+    def _drop_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._buckets.get(entry[3])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[entry[3]]
+
+    def get(self, user_input: str, keywords, db_outfits, preferred_model: str):
+        """查詢快取，命中時回傳 (response, model)，否則 None"""
+        normalized = normalize_text(user_input)
+        bucket = self.make_bucket(keywords, db_outfits, preferred_model)
+        key = (normalized, bucket)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._entries.move_to_end(key)
+                    self.exact_hits += 1
+                    return entry[0], entry[1]
+                self._drop_locked(key)
+
+            if self.fuzzy_threshold is not None:
+                grams = char_ngrams(normalized)
+                best_key, best_score = None, self.fuzzy_threshold
+                for candidate in list(self._buckets.get(bucket, ())):
+                    cand = self._entries[candidate]
+                    if cand[2] <= now:
+                        self._drop_locked(candidate)
+                        continue
+                    score = jaccard(grams, cand[4])
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.fuzzy_hits += 1
+                    cand = self._entries[best_key]
+                    return cand[0], cand[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, user_input: str, keywords, db_outfits, preferred_model: str, response: str, model: str):
+        normalized = normalize_text(user_input)
+        bucket = self.make_bucket(keywords, db_outfits, preferred_model)
+        key = (normalized, bucket)
+        grams = char_ngrams(normalized) if self.fuzzy_threshold is not None else None
+
+        with self._lock:
+            self._drop_locked(key)
+            self._entries[key] = (response, model, time.monotonic() + self.ttl, bucket, grams)
+            self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+    def invalidate(self):
+        """清空快取（穿搭或單品資料異動時呼叫）"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.fuzzy_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,150 @@
+"""
+對話 session 快取模組
+以數量與估計位元組數為上限的 LRU 快取，閒置超過 TTL 的 session 會被淘汰；
+被淘汰的 session 需要時再由 loader（持久化儲存）重新載入；
+多個 worker 共用儲存時，以 validator 確認快取內容沒有被其他 worker 更新
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_message_size(message: dict) -> int:
+    """估計一則訊息在記憶體中的大小（bytes）"""
+    return sys.getsizeof(message) + sum(sys.getsizeof(v) for v in message.values())
+
+
+def estimate_session_size(session: dict) -> int:
+    return sys.getsizeof(session) + sum(estimate_message_size(m) for m in session.get("messages", []))
+
+
+class SessionCache:
+    def __init__(self, loader=None, max_sessions: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: float = 1800.0, validator=None):
+        """建立 session 快取
+
+        Args:
+            loader: 快取未命中時呼叫 loader(session_id) 載入 session，回傳 None 表示不存在
+            max_sessions: 最多保留的 session 數
+            max_bytes: 所有 session 估計大小總和上限
+            ttl: 閒置超過此秒數的 session 會被淘汰（0 表示不限）
+            validator: validator(session_id) 回傳儲存中的訊息數（不存在為 None），
+                       與快取不一致時視為未命中並重新載入
+        """
+        self.loader = loader
+        self.validator = validator
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # session_id -> [session, size, last_access]，尾端為最近使用
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale = 0
+
+    def _evict_locked(self, now):
+        # 淘汰閒置過久的 session（最久未用的在最前面）
+        if self.ttl:
+            while self._entries:
+                sid, entry = next(iter(self._entries.items()))
+                if now - entry[2] <= self.ttl:
+                    break
+                self._drop_locked(sid)
+                self.expirations += 1
+
+        # 超過數量或大小上限時淘汰最久未用的，但至少保留最新的一個
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            sid = next(iter(self._entries))
+            self._drop_locked(sid)
+            self.evictions += 1
+
+    def _drop_locked(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def get(self, session_id: str):
+        """取得 session；不在快取時透過 loader 載入，都沒有則回傳 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and not (self.ttl and now - entry[2] > self.ttl):
+                session = entry[0]
+            else:
+                session = None
+
+        if session is not None and self.validator is not None:
+            # 其他 worker 可能已追加或清除這個 session
+            if (self.validator(session_id) or 0) != len(session["messages"]):
+                session = None
+                with self._lock:
+                    self.stale += 1
+
+        with self._lock:
+            if session is not None and session_id in self._entries:
+                entry = self._entries[session_id]
+                entry[2] = now
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return session
+            self.misses += 1
+            self._drop_locked(session_id)
+
+        session = self.loader(session_id) if self.loader else None
+        if session is not None:
+            self.put(session_id, session)
+        return session
+
+    def put(self, session_id: str, session: dict):
+        """放入（或取代）session"""
+        size = estimate_session_size(session)
+        now = time.monotonic()
+        with self._lock:
+            self._drop_locked(session_id)
+            self._entries[session_id] = [session, size, now]
+            self._bytes += size
+            self._evict_locked(now)
+
+    def add_message(self, session_id: str, message: dict):
+        """session 新增訊息後更新其估計大小（訊息本身由呼叫端附加）"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            size = estimate_message_size(message)
+            entry[1] += size
+            self._bytes += size
+            self._evict_locked(time.monotonic())
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._drop_locked(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale": self.stale,
+            }
@@ -0,0 +1,52 @@
+# 批次推薦測試（不需要 MySQL / 模型）：共用檢索與模型呼叫、結果快取上限
+#     python -m unittest test_batch_recommend
+
+import asyncio
+import unittest
+
+from batch_recommend import BatchRecommender
+
+
+def retrieve(query, user_id):
+    return [{"id": len(query), "name": query, "items": []}]
+
+
+async def complete(user_input, outfits, model):
+    await asyncio.sleep(0.01)
+    return f"reply:{user_input}", "Stub"
+
+
+def run(recommender, requests):
+    async def collect():
+        return [record async for record in recommender.run(requests)]
+    return asyncio.run(collect())
+
+
+class BatchRecommenderTest(unittest.TestCase):
+    def test_identical_requests_share_work(self):
+        recommender = BatchRecommender(retrieve, complete, concurrency=4)
+        requests = [{"id": i, "occasion": "約會"} for i in range(6)] + [{"id": 6, "occasion": "運動"}]
+        records = run(recommender, requests)
+        self.assertEqual(len(records), 7)
+        self.assertFalse(any(r["error"] for r in records))
+        self.assertEqual((recommender.retrievals, recommender.llm_calls), (2, 2))
+
+    def test_shared_results_bounded(self):
+        recommender = BatchRecommender(retrieve, complete, concurrency=2, cache_size=3)
+        records = run(recommender, [{"id": i, "message": f"查詢 {i}"} for i in range(20)])
+        self.assertEqual(len(records), 20)
+        self.assertEqual(len(recommender._retrievals), 3)
+        self.assertEqual(len(recommender._completions), 3)
+
+    def test_resume_skips_done_ids(self):
+        recommender = BatchRecommender(retrieve, concurrency=2)
+
+        async def collect():
+            return [r["id"] async for r in recommender.run([{"id": 1}, {"id": 2}, {"id": 1}], skip={"2"})]
+
+        self.assertEqual(asyncio.run(collect()), ["1"])
+        self.assertEqual((recommender.skipped, recommender.duplicates), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
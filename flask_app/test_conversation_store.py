@@ -0,0 +1,220 @@
+# 對話儲存後端測試（不需要 Redis 伺服器）：JSONL / SQLite / Redis（以 InMemoryRedis 代替）
+#     python -m unittest test_conversation_store
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from conversation_store import JsonlConversationStore, RedisConversationStore, SqliteConversationStore
+
+
+class InMemoryRedis:
+    """Redis 替身（只實作 RedisConversationStore 用到的指令）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()  # pipeline 執行時持有，期間逐一呼叫各指令
+        self._data = {}
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+    def set(self, key, value, nx=False):
+        with self._lock:
+            if nx and key in self._data:
+                return None
+            self._data[key] = value.encode('utf-8')
+            return True
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            return value if isinstance(value, bytes) else None
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._data.setdefault(key, [])
+            items.extend(v.encode('utf-8') for v in values)
+            return len(items)
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = self._data.get(key, [])
+            return list(items[start:None if end == -1 else end + 1])
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._data.get(key, []))
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            return key in self._data
+
+
+class _InMemoryPipeline:
+    """InMemoryRedis 的 pipeline：指令先排隊，execute() 時在鎖內一次執行（相當於 MULTI/EXEC）"""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((getattr(self._client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        with self._client._lock:
+            return [command(*args, **kwargs) for command, args, kwargs in commands]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands = []
+
+
+def turn(i):
+    return {"user": f"問題 {i}", "ai": f"回答 {i}", "model": "Stub"}
+
+
+class StoreContract:
+    """三種後端共用的測試；子類別提供 open_store()，回傳的多個 store 共用同一份資料（模擬多個 worker）"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+
+    def store(self):
+        store = self.open_store()
+        self.stores.append(store)
+        return store
+
+    def test_round_trip(self):
+        store = self.store()
+        self.assertIsNone(store.load_session("s1"))
+        self.assertIsNone(store.message_count("s1"))
+
+        store.append_turn("s1", turn(1), created_at="2024-01-01T00:00:00")
+        store.append_turn("s1", turn(2), created_at="2099-01-01T00:00:00")  # 只有第一筆的 created_at 有效
+        store.append_turn("s2", turn(9), created_at="2024-02-01T00:00:00")
+
+        self.assertEqual(store.load_session("s1"),
+                         {"messages": [turn(1), turn(2)], "created_at": "2024-01-01T00:00:00"})
+        self.assertEqual(store.message_count("s1"), 2)
+
+        self.assertTrue(store.delete_session("s1"))
+        self.assertFalse(store.delete_session("s1"))
+        self.assertIsNone(store.load_session("s1"))
+        self.assertEqual(store.load_session("s2")["messages"], [turn(9)])
+
+    def test_other_writer_visible(self):
+        a, b = self.store(), self.store()
+        a.append_turn("s", turn(1), created_at="t0")
+        self.assertEqual(b.message_count("s"), 1)
+        b.append_turn("s", turn(2))
+        self.assertEqual(a.load_session("s")["messages"], [turn(1), turn(2)])
+        b.delete_session("s")
+        self.assertIsNone(a.load_session("s"))
+
+    def test_concurrent_writers(self):
+        writers, per_writer = 4, 25
+        stores = [self.store() for _ in range(2)]
+
+        def write(w):
+            store = stores[w % len(stores)]
+            for i in range(per_writer):
+                store.append_turn(f"s{w % 2}", {"writer": w, "i": i}, created_at="t0")
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for sid in ("s0", "s1"):
+            messages = stores[0].load_session(sid)["messages"]
+            self.assertEqual(len(messages), writers // 2 * per_writer)
+            # 每個寫入者自己的訊息順序不變
+            for w in {m["writer"] for m in messages}:
+                self.assertEqual([m["i"] for m in messages if m["writer"] == w], list(range(per_writer)))
+
+
+class JsonlStoreTest(StoreContract, unittest.TestCase):
+    def open_store(self, **kwargs):
+        return JsonlConversationStore(os.path.join(self.dir, "conversations.jsonl"), **kwargs)
+
+    def test_compaction_keeps_live_sessions(self):
+        store = self.store()
+        other = self.store()
+        for i in range(10):
+            store.append_turn(f"dead{i}", turn(i), created_at="t0")
+            store.delete_session(f"dead{i}")
+        store.append_turn("live", turn(1), created_at="t0")
+        size = os.path.getsize(store.path)
+
+        store.compact()
+        self.assertLess(os.path.getsize(store.path), size)
+        self.assertEqual(len(store), 1)
+        # 另一個 store 發現日誌被替換後重新載入
+        self.assertEqual(other.load_session("live"), {"messages": [turn(1)], "created_at": "t0"})
+        self.assertNotIn("dead0", other)
+
+    def test_truncated_tail_repaired(self):
+        store = self.store()
+        store.append_turn("s", turn(1), created_at="t0")
+        store.close()
+        self.stores.remove(store)
+        with open(store.path, "ab") as f:
+            f.write(b'{"op": "turn", "sid": "s", "msg": {"us')
+
+        reopened = self.store()
+        self.assertEqual(reopened.message_count("s"), 1)
+        reopened.append_turn("s", turn(2))
+        self.assertEqual(reopened.load_session("s")["messages"], [turn(1), turn(2)])
+
+    def test_legacy_import(self):
+        legacy = os.path.join(self.dir, "conversations.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"old": {"messages": [turn(1)], "created_at": "t0"}}, f)
+        store = self.open_store(legacy_json_path=legacy)
+        self.stores.append(store)
+        self.assertEqual(store.load_session("old"), {"messages": [turn(1)], "created_at": "t0"})
+        self.assertTrue(os.path.exists(legacy + ".migrated"))
+
+
+class SqliteStoreTest(StoreContract, unittest.TestCase):
+    def open_store(self):
+        return SqliteConversationStore(os.path.join(self.dir, "conversations.db"))
+
+
+class RedisStoreTest(StoreContract, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = InMemoryRedis()
+
+    def open_store(self):
+        return RedisConversationStore(client=self.client)
+
+    def test_ttl_applied_with_turn(self):
+        calls = []
+        self.client.expire = lambda key, seconds: calls.append((key, seconds)) or True
+        RedisConversationStore(client=self.client, ttl=60).append_turn("s", turn(1), created_at="t0")
+        self.assertEqual(sorted(calls), [("outfit:conv:s:created_at", 60), ("outfit:conv:s:messages", 60)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# 連線池測試（不需要 MySQL）：以假連線驗證歸還、回滾、丟棄與逾時
+#     python -m unittest test_db_pool
+
+import unittest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, rollback_fails=False):
+        self.rollback_fails = rollback_fails
+        self.rollbacks = 0
+        self.closed = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.rollback_fails:
+            raise ConnectionError("lost connection")
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        self.connections = []
+
+        def factory():
+            conn = FakeConnection(**kwargs)
+            self.connections.append(conn)
+            return conn
+
+        return ConnectionPool(factory, max_size=1, timeout=0.05)
+
+    def assert_slot_free(self, pool):
+        stats = pool.stats()
+        self.assertEqual(stats["checked_out"], 0)
+        with pool.connection():
+            pass  # 名額已歸還才借得到（max_size=1）
+
+    def test_reuses_connection(self):
+        pool = self.make_pool()
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+
+    def test_exception_rolls_back_and_returns(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                raise ValueError("bad query")
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertFalse(conn.closed)
+        self.assertEqual(pool.stats()["idle"], 1)
+        self.assert_slot_free(pool)
+
+    def test_broken_connection_discarded(self):
+        pool = self.make_pool(rollback_fails=True)
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                raise ValueError("bad query")
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+        self.assert_slot_free(pool)
+
+    def test_base_exception_discards_without_leaking(self):
+        pool = self.make_pool()
+        with self.assertRaises(KeyboardInterrupt):
+            with pool.connection() as conn:
+                raise KeyboardInterrupt
+        self.assertTrue(conn.closed)
+        self.assert_slot_free(pool)
+
+    def test_closed_generator_releases(self):
+        pool = self.make_pool()
+
+        def rows():
+            with pool.connection():
+                yield 1
+                yield 2
+
+        gen = rows()
+        next(gen)
+        gen.close()  # GeneratorExit 在 with 區塊內拋出
+        self.assert_slot_free(pool)
+
+    def test_timeout_when_exhausted(self):
+        pool = self.make_pool()
+        with pool.connection():
+            with self.assertRaises(PoolTimeoutError):
+                pool.acquire()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+# 模型路由測試（不連外）：以 StubLLM 模擬延遲與錯誤，驗證對沖、逾時、執行緒預算與斷路器
+#     python -m unittest test_llm_router
+
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import llm_router
+from llm_router import (AllProvidersFailedError, CircuitBreaker, ProviderHealth, RouterSaturatedError,
+                        hedged_ainvoke, hedged_invoke, invoke_with_timeout, is_fatal_error)
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """模擬 LLM：可注入延遲與錯誤（benchmarks 也用它取代真正的模型）"""
+
+    def __init__(self, reply: str = "ok", latency: float = 0.0, error: Exception = None):
+        self.reply = reply
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.error:
+            raise self.error
+        return StubResponse(self.reply)
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.error:
+            raise self.error
+        return StubResponse(self.reply)
+
+    def stream(self, prompt):
+        yield self.invoke(prompt)
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def model(name, *args, **kwargs):
+    return {"name": name, "llm": StubLLM(*args, **kwargs)}
+
+
+class Results:
+    """收集 on_result 回報：[(name, ok, latency, error_msg), ...]"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, ok, latency, error_msg=None, error=None):
+        self.calls.append((name, ok, latency, error_msg))
+
+
+class HedgedInvokeTest(unittest.TestCase):
+    def test_fast_primary_wins_before_hedge(self):
+        models = [model("A", "a", latency=0.01), model("B", "b")]
+        self.assertEqual(hedged_invoke(models, "hi", hedge_delay=0.5), ("a", "A"))
+        self.assertEqual(models[1]["llm"].calls, 0)
+
+    def test_slow_primary_is_hedged(self):
+        models = [model("A", "a", latency=0.5), model("B", "b", latency=0.01)]
+        start = time.monotonic()
+        self.assertEqual(hedged_invoke(models, "hi", hedge_delay=0.05), ("b", "B"))
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_failure_launches_next_immediately(self):
+        results = Results()
+        models = [model("A", error=RuntimeError("boom")), model("B", "b")]
+        start = time.monotonic()
+        self.assertEqual(hedged_invoke(models, "hi", hedge_delay=5.0, on_result=results), ("b", "B"))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual([(name, ok, msg) for name, ok, _, msg in results.calls],
+                         [("A", False, "boom"), ("B", True, None)])
+
+    def test_timeout_reported_and_next_used(self):
+        results = Results()
+        models = [model("A", "a", latency=0.5), model("B", "b", latency=0.01)]
+        text = hedged_invoke(models, "hi", hedge_delay=5.0, timeouts={"A": 0.05}, on_result=results)
+        self.assertEqual(text, ("b", "B"))
+        self.assertEqual(results.calls[0][:2], ("A", False))
+        self.assertEqual(results.calls[0][3], "timeout")
+
+    def test_all_failed(self):
+        models = [model("A", error=RuntimeError("x")), model("B", error=RuntimeError("y"))]
+        with self.assertRaises(AllProvidersFailedError) as ctx:
+            hedged_invoke(models, "hi", hedge_delay=0.0)
+        self.assertCountEqual(ctx.exception.errors, [("A", "x"), ("B", "y")])
+
+    def test_allow_skips_model(self):
+        models = [model("A", "a"), model("B", "b")]
+        self.assertEqual(hedged_invoke(models, "hi", allow=lambda name: name != "A"), ("b", "B"))
+        self.assertEqual(models[0]["llm"].calls, 0)
+
+    def test_budget_checked_before_each_launch(self):
+        # 執行緒預算只剩一個：hedge_delay=0 也只能先啟動第一個，後面的等它失敗才啟動
+        models = [model("A", "a", latency=0.1), model("B", "b"), model("C", "c")]
+        with mock.patch.object(llm_router, "ROUTER_WORKERS", 1):
+            self.assertEqual(hedged_invoke(models, "hi", hedge_delay=0.0), ("a", "A"))
+        self.assertEqual([m["llm"].calls for m in models], [1, 0, 0])
+
+    def test_budget_restored_after_calls(self):
+        models = [model("A", "a", latency=0.2), model("B", "b", latency=0.01)]
+        hedged_invoke(models, "hi", hedge_delay=0.0)
+        time.sleep(0.3)  # 被捨棄的 A 跑完
+        self.assertEqual(llm_router.router_stats()["in_flight"], 0)
+        self.assertEqual(llm_router.router_stats()["abandoned"], 0)
+
+
+class InvokeWithTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        # 只有一個執行緒的池，用來模擬本地滿載
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        patcher = mock.patch.object(llm_router, "_executor", self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.executor.shutdown)
+
+    def occupy(self, seconds):
+        thread = threading.Thread(target=invoke_with_timeout, args=(StubLLM(latency=seconds), "x", 5.0))
+        thread.start()
+        time.sleep(0.02)
+        return thread
+
+    def test_queue_time_not_counted(self):
+        results = Results()
+        busy = self.occupy(0.3)
+        text = invoke_with_timeout(StubLLM("ok", latency=0.05), "hi", 0.2, "A", on_result=results)
+        busy.join()
+        self.assertEqual(text, "ok")
+        (name, ok, latency, _), = results.calls
+        self.assertTrue(ok)
+        self.assertLess(latency, 0.2)
+
+    def test_saturation_not_reported(self):
+        results = Results()
+        busy = self.occupy(0.3)
+        with mock.patch.object(llm_router, "QUEUE_TIMEOUT", 0.05):
+            with self.assertRaises(RouterSaturatedError):
+                invoke_with_timeout(StubLLM(), "hi", 1.0, "A", on_result=results)
+        busy.join()
+        self.assertEqual(results.calls, [])
+
+    def test_timeout(self):
+        results = Results()
+        with self.assertRaises(TimeoutError):
+            invoke_with_timeout(StubLLM(latency=0.3), "hi", 0.05, "A", on_result=results)
+        self.assertEqual(results.calls[0][1], False)
+        self.assertEqual(results.calls[0][3], "timeout")
+
+
+class HedgedAinvokeTest(unittest.TestCase):
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        models = [model("A", "a", latency=1.0), model("B", "b", latency=0.01)]
+
+        async def run():
+            start = time.monotonic()
+            result = await hedged_ainvoke(models, "hi", hedge_delay=0.05)
+            return result, time.monotonic() - start
+
+        (text, name), elapsed = asyncio.run(run())
+        self.assertEqual((text, name), ("b", "B"))
+        self.assertLess(elapsed, 0.5)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_on_error_rate_and_probes_once(self):
+        breaker = CircuitBreaker(min_calls=3, error_rate=0.5, cooldown=0.05)
+        for _ in range(3):
+            breaker.record(False, 0.1, "boom")
+        self.assertEqual(breaker.state, llm_router.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow())       # 佔用 half-open 試探名額
+        self.assertFalse(breaker.allow())      # 同時只放行一個
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, llm_router.CLOSED)
+
+    def test_available_does_not_claim_probe(self):
+        breaker = CircuitBreaker(min_calls=1, cooldown=0.01)
+        breaker.record(False, 0.1, "boom")
+        time.sleep(0.02)
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow())
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker(min_calls=2, error_rate=0.5, slow_call=1.0)
+        breaker.record(True, 2.0)
+        breaker.record(True, 2.0)
+        self.assertEqual(breaker.state, llm_router.OPEN)
+
+    def test_fatal_error_uses_fatal_cooldown(self):
+        breaker = CircuitBreaker(cooldown=0.01, fatal_cooldown=60)
+        error = StatusError("quota", 429)
+        breaker.record(False, 0.1, str(error), error)
+        time.sleep(0.02)
+        self.assertFalse(breaker.allow())
+
+    def test_fatal_classification(self):
+        self.assertTrue(is_fatal_error(StatusError("x", 402)))
+        self.assertTrue(is_fatal_error(type("RateLimitError", (Exception,), {})("slow down")))
+        self.assertTrue(is_fatal_error("Insufficient Balance"))
+        self.assertFalse(is_fatal_error(RuntimeError("request 4291 took 429ms")))
+        self.assertFalse(is_fatal_error(StatusError("x", 500)))
+
+    def test_route_skips_open_and_sorts_by_latency(self):
+        health = ProviderHealth(min_calls=1, cooldown=60)
+        health.record("A", True, 2.0)
+        health.record("B", True, 0.5)
+        health.record("C", False, 0.1, "boom")
+        routed = health.route([{"name": "A"}, {"name": "B"}, {"name": "C"}, {"name": "D"}])
+        self.assertEqual([m["name"] for m in routed], ["D", "B", "A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
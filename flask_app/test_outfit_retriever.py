@@ -0,0 +1,91 @@
+# 向量檢索測試（不需要 MySQL）：以小型快照驗證查詢、wait=True 等待進行中的重建與跨 worker 共用存檔
+#     python -m unittest test_outfit_retriever
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import outfit_retriever
+from catalog_snapshot import CatalogSnapshot
+from outfit_retriever import OutfitIndex, OutfitRetriever
+
+DIM = 1 << 12
+
+
+def snapshot(change_seq, occasions=('date', 'formal', 'sport')):
+    items = [{"id": i + 1, "name": f"單品 {i}", "category": "top", "color": "black"} for i in range(len(occasions))]
+    outfits = [{"id": i + 1, "name": f"穿搭 {i}", "occasion": occasion, "description": ""}
+               for i, occasion in enumerate(occasions)]
+    links = [{"outfit_id": i + 1, "item_id": i + 1} for i in range(len(occasions))]
+    return CatalogSnapshot.build(items, outfits, links, change_seq)
+
+
+class OutfitRetrieverTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.index_dir = f"{self.dir}/index"
+
+    def test_search_matches_occasion_label(self):
+        index = OutfitIndex.from_snapshot(snapshot(1), DIM)
+        self.assertEqual(index.search("明天要約會", 1)[0][0], 1)
+        self.assertEqual(index.search("去健身房運動", 1)[0][0], 3)
+
+    def test_wait_blocks_on_build_in_progress(self):
+        retriever = OutfitRetriever(dim=DIM)
+        started, release = threading.Event(), threading.Event()
+        from_snapshot = OutfitIndex.from_snapshot
+
+        def slow_build(snap, dim):
+            started.set()
+            release.wait(5)
+            return from_snapshot(snap, dim)
+
+        with mock.patch.object(OutfitIndex, "from_snapshot", side_effect=slow_build):
+            snap = snapshot(1)
+            self.assertIsNone(retriever.current(snap))  # 背景重建
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            start = time.monotonic()
+            index = retriever.current(snap, wait=True)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(index.change_seq, 1)
+        self.assertEqual(retriever.rebuilds, 1)
+
+    def test_wait_rebuilds_when_finished_build_is_stale(self):
+        retriever = OutfitRetriever(dim=DIM)
+        retriever.current(snapshot(1), wait=True)
+        self.assertEqual(retriever.current(snapshot(2), wait=True).change_seq, 2)
+        self.assertEqual(retriever.rebuilds, 2)
+
+    def test_workers_share_saved_index(self):
+        first = OutfitRetriever(self.index_dir, DIM)
+        first.current(snapshot(1), wait=True)
+        second = OutfitRetriever(self.index_dir, DIM)
+        self.assertEqual(second.index.change_seq, 1)  # 啟動時直接載入
+
+        # 型錄異動：first 重建並存檔後，second 載入而不重建
+        first.current(snapshot(2), wait=True)
+        self.assertEqual(second.current(snapshot(2), wait=True).change_seq, 2)
+        self.assertEqual((first.rebuilds, second.rebuilds, second.shared_loads), (2, 0, 1))
+        self.assertTrue(second.stats()["mmap"])
+
+    def test_newer_saved_index_not_overwritten(self):
+        OutfitRetriever(self.index_dir, DIM).current(snapshot(5), wait=True)
+        lagging = OutfitRetriever(dim=DIM)
+        lagging.index_dir = self.index_dir
+        self.assertEqual(lagging.current(snapshot(4), wait=True).change_seq, 5)
+        self.assertEqual(lagging.rebuilds, 0)
+        self.assertEqual(OutfitIndex.load(self.index_dir).change_seq, 5)
+
+    def test_without_fcntl_still_builds(self):
+        with mock.patch.object(outfit_retriever, "fcntl", None):
+            retriever = OutfitRetriever(self.index_dir, DIM)
+            self.assertEqual(retriever.current(snapshot(1), wait=True).change_seq, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
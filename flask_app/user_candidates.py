@@ -0,0 +1,339 @@
+"""
+個人化推薦候選模組
+由 user_favorites 與 outfit_items 計算穿搭之間的相似度，為每位使用者預先算好前 K 組候選，
+寫入 user_candidates 表（/recommend 以 user_id 主鍵一次查到）
+
+相似度（穿搭 a、b）：
+- 共同收藏：同時收藏 a、b 的人數 / sqrt(收藏 a 的人數 × 收藏 b 的人數)
+- 共同單品：a、b 共用的單品數 / sqrt(a 的單品數 × b 的單品數)，乘上 CONTENT_WEIGHT
+- 以上任一不為 0 且場合相同時再加 OCCASION_BONUS
+使用者對候選 c 的分數 = Σ sim(已收藏的穿搭, c)，已收藏的不列入
+
+更新方式：
+- user_favorites 的 trigger 把異動寫入 favorite_changes（序號依提交順序連續配發），背景工作依序套用到記憶體中的模型，
+  只重算受影響的使用者（新增 / 取消收藏的人，以及也收藏了該穿搭的人）
+- 型錄（outfit_items / outfits）異動、異動紀錄不連續或超過 FULL_REBUILD_INTERVAL 時整份重建
+- 以 MySQL GET_LOCK 確保多個 worker 中同時只有一個在執行（持有鎖時順便定期清除舊的異動紀錄，見 change_logs.py）
+
+也可單獨執行（例如排程）：
+    python user_candidates.py           # 執行一次（增量，首次為整份重建）
+    python user_candidates.py --loop    # 持續執行
+"""
+
+import heapq
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from change_logs import CHANGE_LOG_PRUNE_INTERVAL, prune_change_logs
+
+DEFAULT_TOP_K = 20
+CONTENT_WEIGHT = 0.5
+OCCASION_BONUS = 0.1
+# 每個穿搭保留的「共同單品」鄰居數（熱門單品可能出現在很多穿搭中）
+CONTENT_NEIGHBORS = 50
+# 單次增量更新最多處理的異動筆數，超過就整份重建
+MAX_INCREMENTAL_CHANGES = 5000
+# 每個異動最多連帶重算的使用者數（其餘等下一次整份重建）
+MAX_AFFECTED_USERS = 1000
+FULL_REBUILD_INTERVAL = 3600
+WRITE_BATCH = 500
+JOB_LOCK = 'user_candidates_job'
+
+
+class CandidateModel:
+    def __init__(self):
+        self.user_favs = defaultdict(Counter)    # user_id -> {outfit_id: 收藏筆數}
+        self.outfit_users = defaultdict(set)     # outfit_id -> {user_id}
+        self.co = defaultdict(Counter)           # outfit_id -> {outfit_id: 共同收藏人數}
+        self.outfit_items = {}                   # outfit_id -> frozenset(item_id)
+        self.item_outfits = defaultdict(set)     # item_id -> {outfit_id}
+        self.occasion = {}                       # outfit_id -> occasion
+        self._content = {}                       # outfit_id -> [(outfit_id, sim)]（依需要計算）
+
+    @classmethod
+    def build(cls, favorite_rows, link_rows, outfit_rows):
+        model = cls()
+        for row in outfit_rows:
+            model.occasion[row['id']] = row['occasion']
+        items = defaultdict(set)
+        for row in link_rows:
+            items[row['outfit_id']].add(row['item_id'])
+        for outfit_id, item_ids in items.items():
+            model.outfit_items[outfit_id] = frozenset(item_ids)
+            for item_id in item_ids:
+                model.item_outfits[item_id].add(outfit_id)
+        for row in favorite_rows:
+            model.add_favorite(row['user_id'], row['outfit_id'])
+        return model
+
+    def add_favorite(self, user_id, outfit_id):
+        favs = self.user_favs[user_id]
+        if not favs[outfit_id]:
+            for other in favs:
+                if other != outfit_id and favs[other]:
+                    self.co[outfit_id][other] += 1
+                    self.co[other][outfit_id] += 1
+            self.outfit_users[outfit_id].add(user_id)
+        favs[outfit_id] += 1
+
+    def remove_favorite(self, user_id, outfit_id):
+        favs = self.user_favs.get(user_id)
+        if not favs or not favs[outfit_id]:
+            return
+        favs[outfit_id] -= 1
+        if favs[outfit_id]:
+            return  # 同一組穿搭收藏了不只一次
+        del favs[outfit_id]
+        for other in favs:
+            for a, b in ((outfit_id, other), (other, outfit_id)):
+                self.co[a][b] -= 1
+                if self.co[a][b] <= 0:
+                    del self.co[a][b]
+        self.outfit_users[outfit_id].discard(user_id)
+
+    def affected_users(self, user_id, outfit_id):
+        """收藏異動後需要重算的使用者"""
+        users = {user_id}
+        for other in self.outfit_users.get(outfit_id, ()):
+            if len(users) >= MAX_AFFECTED_USERS:
+                break
+            users.add(other)
+        return users
+
+    def content_neighbors(self, outfit_id):
+        neighbors = self._content.get(outfit_id)
+        if neighbors is not None:
+            return neighbors
+        items = self.outfit_items.get(outfit_id, frozenset())
+        shared = Counter()
+        for item_id in items:
+            shared.update(self.item_outfits[item_id])
+        shared.pop(outfit_id, None)
+        scored = ((other, n / math.sqrt(len(items) * len(self.outfit_items[other])))
+                  for other, n in shared.items())
+        neighbors = heapq.nlargest(CONTENT_NEIGHBORS, scored, key=lambda x: x[1])
+        self._content[outfit_id] = neighbors
+        return neighbors
+
+    def similar(self, outfit_id):
+        """與 outfit_id 相似的穿搭 {outfit_id: sim}"""
+        sims = Counter()
+        n = len(self.outfit_users.get(outfit_id, ()))
+        for other, both in self.co.get(outfit_id, {}).items():
+            sims[other] += both / math.sqrt(n * len(self.outfit_users[other]))
+        for other, sim in self.content_neighbors(outfit_id):
+            sims[other] += CONTENT_WEIGHT * sim
+        occasion = self.occasion.get(outfit_id)
+        if occasion is not None:
+            for other in sims:
+                if self.occasion.get(other) == occasion:
+                    sims[other] += OCCASION_BONUS
+        return sims
+
+    def candidates(self, user_id, k: int = DEFAULT_TOP_K):
+        """使用者的前 k 組候選 [(outfit_id, 分數), ...]"""
+        favs = [o for o, n in self.user_favs.get(user_id, {}).items() if n]
+        scores = Counter()
+        for outfit_id in favs:
+            scores.update(self.similar(outfit_id))
+        for outfit_id in favs:
+            scores.pop(outfit_id, None)
+        # 已刪除的穿搭不推薦
+        ranked = ((o, s) for o, s in scores.items() if o in self.occasion)
+        return [(o, round(s, 4)) for o, s in heapq.nlargest(k, ranked, key=lambda x: (x[1], -x[0]))]
+
+
+def load_model(cur):
+    """讀取整份收藏與型錄關聯，回傳 (模型, 收藏異動序號, 型錄異動序號)"""
+    # 在同一個一致性快照中讀序號與資料（trigger 與收藏寫入在同一個交易），之後的增量不會重複套用
+    cur.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    try:
+        # 以配號列為準：favorite_changes 的舊紀錄可能已被清除
+        cur.execute("SELECT seq FROM favorite_seq WHERE id = 1")
+        favorite_seq = cur.fetchone()['seq']
+        cur.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM catalog_changes")
+        catalog_seq = cur.fetchone()['seq']
+        cur.execute("SELECT user_id, outfit_id FROM user_favorites")
+        favorites = cur.fetchall()
+        cur.execute("SELECT outfit_id, item_id FROM outfit_items")
+        links = cur.fetchall()
+        cur.execute("SELECT id, occasion FROM outfits")
+        outfits = cur.fetchall()
+    finally:
+        cur.execute("COMMIT")
+    return CandidateModel.build(favorites, links, outfits), favorite_seq, catalog_seq
+
+
+def write_candidates(cur, model, user_ids, k: int = DEFAULT_TOP_K):
+    """重算並寫入 user_ids 的候選；沒有候選的使用者刪除其紀錄"""
+    rows, empty = [], []
+    for user_id in user_ids:
+        ranked = model.candidates(user_id, k)
+        if ranked:
+            rows.append((user_id, json.dumps([o for o, _ in ranked]), json.dumps([s for _, s in ranked])))
+        else:
+            empty.append(user_id)
+    for start in range(0, len(rows), WRITE_BATCH):
+        cur.executemany(
+            "INSERT INTO user_candidates (user_id, outfit_ids, scores) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE outfit_ids = VALUES(outfit_ids), scores = VALUES(scores)",
+            rows[start:start + WRITE_BATCH]
+        )
+    for start in range(0, len(empty), WRITE_BATCH):
+        chunk = empty[start:start + WRITE_BATCH]
+        cur.execute(f"DELETE FROM user_candidates WHERE user_id IN ({','.join(['%s'] * len(chunk))})", chunk)
+    return len(rows)
+
+
+def fetch_user_candidates(cur, user_id):
+    """讀取使用者的候選穿搭 id（主鍵查詢）；尚未計算時回傳空清單"""
+    cur.execute("SELECT outfit_ids FROM user_candidates WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    if not row:
+        return []
+    ids = row['outfit_ids']
+    return json.loads(ids) if isinstance(ids, (str, bytes)) else ids
+
+
+class CandidateJob:
+    def __init__(self, connect, top_k: int = DEFAULT_TOP_K, interval: float = 10.0,
+                 full_rebuild_interval: float = FULL_REBUILD_INTERVAL):
+        """維護 user_candidates 表的背景工作
+
+        Args:
+            connect: 回傳資料庫連線 context manager 的函數（例如 get_db_conn）
+            top_k: 每位使用者保留的候選數
+            interval: 兩次檢查收藏異動之間的間隔（秒）
+            full_rebuild_interval: 至少每隔幾秒整份重建一次（修正增量更新略過的連帶影響）
+        """
+        self.connect = connect
+        self.top_k = top_k
+        self.interval = interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self.model = None
+        self.favorite_seq = 0
+        self.catalog_seq = 0
+        self._built_at = float('-inf')
+        self._pruned_at = float('-inf')
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.full_builds = 0
+        self.incremental = 0
+        self.users_written = 0
+        self.errors = 0
+        self.last_run_ms = 0.0
+        self.pruned = 0
+
+    def run_once(self):
+        """套用新的收藏異動；回傳這次重算的使用者數，沒拿到鎖（其他 worker 正在執行）時回傳 None"""
+        with self._lock, self.connect() as conn, conn.cursor() as cur:
+            cur.execute("SELECT GET_LOCK(%s, 0) AS locked", (JOB_LOCK,))
+            if not cur.fetchone()['locked']:
+                return None
+            try:
+                start = time.perf_counter()
+                written = self._run(conn, cur)
+                self.last_run_ms = round((time.perf_counter() - start) * 1000, 2)
+                if time.monotonic() - self._pruned_at >= CHANGE_LOG_PRUNE_INTERVAL:
+                    self.pruned += sum(prune_change_logs(conn, cur).values())
+                    self._pruned_at = time.monotonic()
+                return written
+            finally:
+                cur.execute("DO RELEASE_LOCK(%s)", (JOB_LOCK,))
+
+    def _run(self, conn, cur):
+        cur.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM catalog_changes")
+        catalog_seq = cur.fetchone()['seq']
+        changes = []
+        full = (self.model is None or catalog_seq != self.catalog_seq
+                or time.monotonic() - self._built_at >= self.full_rebuild_interval)
+        if not full:
+            cur.execute(
+                "SELECT seq, user_id, outfit_id, delta FROM favorite_changes WHERE seq > %s ORDER BY seq LIMIT %s",
+                (self.favorite_seq, MAX_INCREMENTAL_CHANGES + 1)
+            )
+            changes = cur.fetchall()
+            # 序號由 trigger 依提交順序連續配發（見 init/outfit_db.sql 的 favorite_seq）：
+            # 整批中任何一處不連續都表示舊紀錄已被清除，增量結果不可靠；異動太多也整份重建
+            full = len(changes) > MAX_INCREMENTAL_CHANGES or any(
+                change['seq'] != self.favorite_seq + i for i, change in enumerate(changes, 1))
+            if not changes and not full:
+                return 0
+
+        if full:
+            model, favorite_seq, catalog_seq = load_model(cur)
+            users = list(model.user_favs)
+            cur.execute("SELECT user_id FROM user_candidates")
+            users += [row['user_id'] for row in cur.fetchall() if row['user_id'] not in model.user_favs]
+        else:
+            model = self.model
+            users = set()
+            for change in changes:
+                if change['delta'] > 0:
+                    model.add_favorite(change['user_id'], change['outfit_id'])
+                else:
+                    model.remove_favorite(change['user_id'], change['outfit_id'])
+                users |= model.affected_users(change['user_id'], change['outfit_id'])
+            favorite_seq = changes[-1]['seq']
+
+        conn.begin()
+        try:
+            written = write_candidates(cur, model, users, self.top_k)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if not full:
+                self.model = None  # 記憶體中的模型已套用異動但沒寫入，下一輪整份重建
+            raise
+
+        self.model, self.favorite_seq, self.catalog_seq = model, favorite_seq, catalog_seq
+        if full:
+            self.full_builds += 1
+            self._built_at = time.monotonic()
+        else:
+            self.incremental += 1
+        self.users_written += written
+        return written
+
+    def start(self):
+        """啟動背景執行緒（每 interval 秒執行一次 run_once）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ 個人化候選更新失敗: {e}", file=sys.stderr)
+            time.sleep(self.interval)
+
+    def stats(self):
+        return {
+            "users": len(self.model.user_favs) if self.model else None,
+            "favorite_seq": self.favorite_seq,
+            "full_builds": self.full_builds,
+            "incremental": self.incremental,
+            "users_written": self.users_written,
+            "errors": self.errors,
+            "last_run_ms": self.last_run_ms,
+            "change_logs_pruned": self.pruned,
+        }
+
+
+if __name__ == '__main__':
+    from app import get_db_conn, CANDIDATES_TOP_K, CANDIDATES_INTERVAL
+
+    job = CandidateJob(get_db_conn, CANDIDATES_TOP_K, CANDIDATES_INTERVAL)
+    if '--loop' in sys.argv:
+        job._loop()
+    else:
+        print(f"✅ 已更新 {job.run_once()} 位使用者的推薦候選")
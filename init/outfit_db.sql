@@ -14,7 +14,13 @@ CREATE TABLE IF NOT EXISTS items (
   size VARCHAR(10),
   price DECIMAL(10,2),
   image_url VARCHAR(255),
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  -- 正規化顏色（小寫、去空白），/items 的 color 篩選以等值比對走索引
+  color_norm VARCHAR(50) GENERATED ALWAYS AS (LOWER(TRIM(color))) STORED,
+  -- /items keyset 分頁：篩選欄位 + id，WHERE ... AND id > 游標 ORDER BY id 直接走索引
+  INDEX idx_items_category_id (category, id),
+  INDEX idx_items_color_norm_id (color_norm, id),
+  INDEX idx_items_category_color_id (category, color_norm, id)
 );
 
 -- 範例衣物資料
@@ -66,6 +72,98 @@ INSERT INTO outfit_items (outfit_id, item_id) VALUES
 INSERT INTO outfit_items (outfit_id, item_id) VALUES
 (3, 1), (3, 4);
 
+-- =============================
+-- 型錄版本 catalog_version / 異動紀錄 catalog_changes
+-- items / outfits / outfit_items 任何寫入都會遞增版本（API 以此產生 ETag 並讓快取失效），
+-- 並記錄異動的表名與 id（outfit_items 記錄 outfit_id），讓記憶體快照只重新讀取有變動的資料列。
+-- 注意：外鍵 ON DELETE CASCADE 連帶刪除的 outfit_items 不會觸發 trigger。
+-- catalog_changes 由 flask_app/change_logs.py 定期清除舊紀錄（只保留最新的一段），快照發現紀錄不連續時會整份重建。
+-- 大量匯入（dataset/load_items_mysql.py）時 session 先 SET @skip_catalog_triggers = 1 略過逐列的 trigger，
+-- 改為每個 chunk 自行遞增一次版本並一次寫入整批異動紀錄，避免每一列都去搶 catalog_version 這一列的鎖。
+-- =============================
+CREATE TABLE IF NOT EXISTS catalog_version (
+  id TINYINT PRIMARY KEY,
+  version BIGINT UNSIGNED NOT NULL DEFAULT 1
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 1);
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+  seq BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+  table_name VARCHAR(20) NOT NULL,
+  row_id INT NOT NULL
+);
+
+DELIMITER $$
+CREATE TRIGGER trg_items_ins AFTER INSERT ON items FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('items', NEW.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_items_upd AFTER UPDATE ON items FOR EACH ROW
+BEGIN
+  -- INSERT ... ON DUPLICATE KEY UPDATE 重新匯入相同資料時內容沒變，不必讓快取失效
+  IF @skip_catalog_triggers IS NULL
+     AND NOT (OLD.sku <=> NEW.sku AND OLD.name <=> NEW.name AND OLD.category <=> NEW.category
+              AND OLD.color <=> NEW.color AND OLD.size <=> NEW.size AND OLD.price <=> NEW.price
+              AND OLD.image_url <=> NEW.image_url) THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('items', NEW.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_items_del AFTER DELETE ON items FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('items', OLD.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfits_ins AFTER INSERT ON outfits FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfits', NEW.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfits_upd AFTER UPDATE ON outfits FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfits', NEW.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfits_del AFTER DELETE ON outfits FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfits', OLD.id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfit_items_ins AFTER INSERT ON outfit_items FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfit_items', NEW.outfit_id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfit_items_upd AFTER UPDATE ON outfit_items FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfit_items', OLD.outfit_id), ('outfit_items', NEW.outfit_id);
+  END IF;
+END$$
+CREATE TRIGGER trg_outfit_items_del AFTER DELETE ON outfit_items FOR EACH ROW
+BEGIN
+  IF @skip_catalog_triggers IS NULL THEN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    INSERT INTO catalog_changes (table_name, row_id) VALUES ('outfit_items', OLD.outfit_id);
+  END IF;
+END$$
+DELIMITER ;
+
 -- =============================
 -- 標籤表 tags（可選，用於AI分類）
 -- =============================
@@ -106,6 +204,61 @@ CREATE TABLE IF NOT EXISTS user_favorites (
   FOREIGN KEY (outfit_id) REFERENCES outfits(id) ON DELETE CASCADE
 );
 
+-- =============================
+-- 個人化推薦候選（flask_app/user_candidates.py 維護）
+-- user_favorites 異動時由 trigger 寫入 favorite_changes（delta：+1 收藏、-1 取消），
+-- 背景工作依序套用並重算受影響使用者的前 K 組候選，寫入 user_candidates（/recommend 以主鍵讀取）
+-- seq 不用 AUTO_INCREMENT，而是由 trigger 鎖住 favorite_seq 這一列遞增配號：鎖到交易結束才釋放，
+-- 序號的先後就是提交的先後，交易 rollback 時序號也一併退回，所以已提交的序號連續、不會「晚到」
+-- favorite_changes 與 catalog_changes 一樣由 flask_app/change_logs.py 定期清除舊紀錄
+-- =============================
+CREATE TABLE IF NOT EXISTS favorite_seq (
+  id TINYINT PRIMARY KEY,
+  seq BIGINT UNSIGNED NOT NULL DEFAULT 0
+);
+
+INSERT INTO favorite_seq (id, seq) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS favorite_changes (
+  seq BIGINT UNSIGNED PRIMARY KEY,
+  user_id INT NOT NULL,
+  outfit_id INT NOT NULL,
+  delta TINYINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_candidates (
+  user_id INT PRIMARY KEY,
+  outfit_ids JSON NOT NULL,
+  scores JSON NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+DELIMITER $$
+CREATE TRIGGER trg_user_favorites_ins AFTER INSERT ON user_favorites FOR EACH ROW
+BEGIN
+  DECLARE next_seq BIGINT UNSIGNED;
+  UPDATE favorite_seq SET seq = seq + 1 WHERE id = 1;
+  SELECT seq INTO next_seq FROM favorite_seq WHERE id = 1;
+  INSERT INTO favorite_changes (seq, user_id, outfit_id, delta) VALUES (next_seq, NEW.user_id, NEW.outfit_id, 1);
+END$$
+CREATE TRIGGER trg_user_favorites_upd AFTER UPDATE ON user_favorites FOR EACH ROW
+BEGIN
+  DECLARE next_seq BIGINT UNSIGNED;
+  UPDATE favorite_seq SET seq = seq + 2 WHERE id = 1;
+  SELECT seq INTO next_seq FROM favorite_seq WHERE id = 1;
+  INSERT INTO favorite_changes (seq, user_id, outfit_id, delta)
+  VALUES (next_seq - 1, OLD.user_id, OLD.outfit_id, -1), (next_seq, NEW.user_id, NEW.outfit_id, 1);
+END$$
+CREATE TRIGGER trg_user_favorites_del AFTER DELETE ON user_favorites FOR EACH ROW
+BEGIN
+  DECLARE next_seq BIGINT UNSIGNED;
+  UPDATE favorite_seq SET seq = seq + 1 WHERE id = 1;
+  SELECT seq INTO next_seq FROM favorite_seq WHERE id = 1;
+  INSERT INTO favorite_changes (seq, user_id, outfit_id, delta) VALUES (next_seq, OLD.user_id, OLD.outfit_id, -1);
+END$$
+DELIMITER ;
+
 -- 收藏範例
 INSERT INTO user_favorites (user_id, outfit_id) VALUES
 (1, 1),
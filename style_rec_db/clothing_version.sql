@@ -0,0 +1,42 @@
+-- =============================
+-- 衣櫃版本 clothing_version
+-- Clothing 任何寫入都會遞增該使用者的版本，data_processor 的衣櫃快取以此判斷是否需要重新讀取
+-- （UPDATE 改了 user_id 時，新舊兩位使用者都會遞增）
+-- 需在 Clothing 表建立之後執行：
+--   mysql -h 127.0.0.1 -u user -p style_rec_db < clothing_version.sql
+-- 沒有這張表時快取仍可運作，只是改為每 WARDROBE_CACHE_TTL 秒整份重新讀取
+-- =============================
+CREATE TABLE IF NOT EXISTS clothing_version (
+  user_id INT PRIMARY KEY,
+  version BIGINT UNSIGNED NOT NULL DEFAULT 1
+);
+
+-- 既有衣物的使用者先建立版本列
+INSERT IGNORE INTO clothing_version (user_id, version)
+SELECT DISTINCT user_id, 1 FROM Clothing;
+
+DROP TRIGGER IF EXISTS trg_clothing_ins;
+DROP TRIGGER IF EXISTS trg_clothing_upd;
+DROP TRIGGER IF EXISTS trg_clothing_del;
+
+DELIMITER $$
+CREATE TRIGGER trg_clothing_ins AFTER INSERT ON Clothing FOR EACH ROW
+BEGIN
+  INSERT INTO clothing_version (user_id) VALUES (NEW.user_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+CREATE TRIGGER trg_clothing_upd AFTER UPDATE ON Clothing FOR EACH ROW
+BEGIN
+  INSERT INTO clothing_version (user_id) VALUES (NEW.user_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+  IF NOT (OLD.user_id <=> NEW.user_id) THEN
+    INSERT INTO clothing_version (user_id) VALUES (OLD.user_id)
+    ON DUPLICATE KEY UPDATE version = version + 1;
+  END IF;
+END$$
+CREATE TRIGGER trg_clothing_del AFTER DELETE ON Clothing FOR EACH ROW
+BEGIN
+  INSERT INTO clothing_version (user_id) VALUES (OLD.user_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
@@ -8,6 +8,15 @@ DB_USER = 'user'
 # 將此密碼替換成您在 docker-compose.yml 中設定的實際密碼
 DB_PASSWORD = 'password' 
 DB_DATABASE = 'style_rec_db' 
+# 連線池大小（同時查詢資料庫的請求數上限），池滿時最多等幾秒
+DB_POOL_SIZE = 5
+DB_POOL_TIMEOUT = 5
+
+# --- 衣櫃快取 ---
+# 兩次檢查 clothing_version 之間的秒數（期間直接使用快取，不查資料庫）
+WARDROBE_CACHE_TTL = 5
+# 最多快取幾位使用者的衣櫃
+WARDROBE_CACHE_SIZE = 1000
 
 # 其他 Flask 設定
 SECRET_KEY = 'your_super_secret_key'
\ No newline at end of file
@@ -1,84 +1,205 @@
 # ~/Desktop/stylerec/data_processor.py
 
-import pandas as pd
 import json
+import threading
+import time
+from collections import OrderedDict
+
 import mysql.connector # 使用這個套件來連接 MySQL
-from config import DB_HOST, DB_USER, DB_PASSWORD, DB_DATABASE # 匯入連線參數
+from mysql.connector import pooling
+from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_DATABASE # 匯入連線參數
+from config import DB_POOL_SIZE, DB_POOL_TIMEOUT, WARDROBE_CACHE_TTL, WARDROBE_CACHE_SIZE
 
 # --- 全域變數 (用於方便 LLM 推薦) ---
 TEST_USER_ID = 99 # 專門用於測試的用戶 ID
 
+CLOTHING_COLUMNS = ["clothing_id", "category", "color", "material", "tags"]
+# 參數化查詢：user_id 由驅動程式帶入，不直接拼進 SQL 字串
+CLOTHING_QUERY = """
+    SELECT clothing_id, category, color, material, tags
+    FROM Clothing
+    WHERE user_id = %s
+    ORDER BY clothing_id
+"""
+VERSION_QUERY = "SELECT version FROM clothing_version WHERE user_id = %s"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """建立（第一次呼叫時）並回傳共用的 MySQL 連線池。"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="style_rec",
+                pool_size=DB_POOL_SIZE,
+                # 只做唯讀查詢、沒有 session 狀態，歸還時不必重設（省一次來回）
+                pool_reset_session=False,
+                # 一定要 autocommit：否則借出的連線會一直停在第一次查詢時的 InnoDB 快照（REPEATABLE READ），
+                # 歸還到池中也不會 rollback，之後讀到的 clothing_version 永遠是舊的，快取不會更新
+                autocommit=True,
+                host=DB_HOST,
+                port=DB_PORT,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                database=DB_DATABASE,
+                # 確保使用舊式密碼認證，以避免 Public Key Retrieval 錯誤
+                auth_plugin='mysql_native_password'
+            )
+        return _pool
+
+
 def get_db_connection():
-    """建立並回傳一個 MySQL 資料庫連線物件。"""
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_DATABASE,
-            # 確保使用舊式密碼認證，以避免 Public Key Retrieval 錯誤
-            auth_plugin='mysql_native_password' 
-        )
-        return conn
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
-        return None
+    """從連線池借出一個 MySQL 連線（用完呼叫 close() 會歸還到池中）；失敗回傳 None。"""
+    deadline = time.monotonic() + DB_POOL_TIMEOUT
+    while True:
+        try:
+            return get_connection_pool().get_connection()
+        except pooling.PoolError as err:
+            # 池中的連線都被借走了：稍等再試，超過 DB_POOL_TIMEOUT 才放棄
+            if time.monotonic() >= deadline:
+                print(f"Error connecting to MySQL: {err}")
+                return None
+            time.sleep(0.01)
+        except mysql.connector.Error as err:
+            print(f"Error connecting to MySQL: {err}")
+            return None
+
+
+def _fetch_clothing_rows(cur, user_id):
+    cur.execute(CLOTHING_QUERY, (user_id,))
+    return cur.fetchall()
+
 
 def fetch_clothing_data_from_db(user_id):
     """
-    從 MySQL 資料庫中讀取特定用戶的衣物數據，並回傳 Pandas DataFrame。
+    從 MySQL 資料庫中讀取特定用戶的衣物數據，並回傳 Pandas DataFrame（不經過快取）。
     """
+    import pandas as pd
+
     conn = get_db_connection()
     if conn is None:
         return pd.DataFrame() # 連線失敗則回傳空 DataFrame
 
     try:
         # 課綱：MySQL 查詢資料
-        query = f"""
-            SELECT clothing_id, category, color, material, tags
-            FROM Clothing
-            WHERE user_id = {user_id};
-        """
-        # 使用 Pandas 內建功能直接從 SQL 查詢結果建立 DataFrame
+        cur = conn.cursor(buffered=True)
+        try:
+            rows = _fetch_clothing_rows(cur, user_id)
+        finally:
+            cur.close()
         # 課綱：Pandas 介紹 / 載入資料
-        df = pd.read_sql(query, conn)
-        return df
-        
+        return pd.DataFrame(rows, columns=CLOTHING_COLUMNS)
+
     except Exception as e:
         print(f"Error fetching data: {e}")
         return pd.DataFrame()
     finally:
-        # 確保連線被關閉，釋放資源
+        # 歸還連線到連線池
+        conn.close()
+
+
+# --- 衣櫃快取 ---
+# 每位使用者的衣物清單摘要與 JSON 只在衣物異動後才重新產生：
+# clothing_version 表由 Clothing 的 trigger 遞增（見 clothing_version.sql），
+# 每 WARDROBE_CACHE_TTL 秒最多查一次版本，版本沒變就沿用快取；期間的請求完全不查資料庫
+
+class Wardrobe:
+    __slots__ = ("version", "checked_at", "count", "text_summary", "json")
+
+    def __init__(self, rows, version, checked_at):
+        self.version = version
+        self.checked_at = checked_at
+        self.count = len(rows)
+        # 衣物通常只有幾十件，直接以 Python 組字串比建 DataFrame 快得多（NULL 欄位以空白表示）
+        self.text_summary = "\n- ".join(
+            f"ID {clothing_id}: 類別: {category or ''}, 顏色: {color or ''}, "
+            f"材質: {material or ''}, 標籤: {tags or ''}"
+            for clothing_id, category, color, material, tags in rows
+        )
+        self.json = json.dumps([dict(zip(CLOTHING_COLUMNS, row)) for row in rows],
+                               ensure_ascii=False, default=str)
+
+
+_wardrobes = OrderedDict() # user_id -> Wardrobe（LRU）
+_wardrobes_lock = threading.Lock()
+
+
+def _fetch_version(cur, user_id):
+    """clothing_version 中該使用者的版本（沒有資料列為 0）；尚未建立這張表時回傳 None（只能依 TTL 重新讀取）"""
+    try:
+        cur.execute(VERSION_QUERY, (user_id,))
+        row = cur.fetchone()
+    except mysql.connector.ProgrammingError:
+        return None
+    return row[0] if row else 0
+
+
+def get_wardrobe(user_id):
+    """回傳使用者衣櫃的快取（Wardrobe）；資料庫無法連線且沒有快取時回傳 None。"""
+    now = time.monotonic()
+    with _wardrobes_lock:
+        cached = _wardrobes.get(user_id)
+        if cached is not None:
+            _wardrobes.move_to_end(user_id)
+            if now - cached.checked_at < WARDROBE_CACHE_TTL:
+                return cached
+
+    conn = get_db_connection()
+    if conn is None:
+        return cached # 連線失敗時先沿用舊的快取
+
+    try:
+        cur = conn.cursor(buffered=True)
+        try:
+            # 先讀版本再讀衣物：兩者之間若有異動，存下的是舊版本號，下次檢查時會再重新讀取
+            version = _fetch_version(cur, user_id)
+            if cached is not None and version is not None and version == cached.version:
+                cached.checked_at = now
+                return cached
+            wardrobe = Wardrobe(_fetch_clothing_rows(cur, user_id), version, now)
+        finally:
+            cur.close()
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        return cached
+    finally:
         conn.close()
 
+    with _wardrobes_lock:
+        _wardrobes[user_id] = wardrobe
+        _wardrobes.move_to_end(user_id)
+        while len(_wardrobes) > WARDROBE_CACHE_SIZE:
+            _wardrobes.popitem(last=False)
+    return wardrobe
+
+
+def invalidate_wardrobe(user_id=None):
+    """本程序修改衣物後立即讓快取失效（不必等下一次版本檢查）；user_id 為 None 時清除全部。"""
+    with _wardrobes_lock:
+        if user_id is None:
+            _wardrobes.clear()
+        else:
+            _wardrobes.pop(user_id, None)
+
+
 def get_clothing_summary_for_llm(user_id, current_occasion="", current_temp_range=""):
     """將衣物數據轉換為 LLM 易於理解的純文字摘要。"""
-    df = fetch_clothing_data_from_db(user_id)
-    
-    if df.empty:
+    wardrobe = get_wardrobe(user_id)
+
+    if wardrobe is None or wardrobe.count == 0:
         return "使用者衣櫃目前沒有任何衣物數據。", ""
-        
-    # --- 數據轉換 (與先前邏輯相同，使用 Pandas 組合字串) ---
-    df['summary_text'] = (
-        "ID " + df['clothing_id'].astype(str) + ": " + 
-        "類別: " + df['category'] + ", " + 
-        "顏色: " + df['color'] + ", " + 
-        "材質: " + df['material'] + ", " + 
-        "標籤: " + df['tags']
-    )
-    
-    text_summary = "\n- ".join(df['summary_text'].tolist())
-    
+
     llm_prompt_summary = (
         f"目前場合: {current_occasion}, 溫度: {current_temp_range}\n"
         "使用者衣櫃現有衣物清單 (請從中選擇搭配):\n"
-        f"- {text_summary}"
+        f"- {wardrobe.text_summary}"
     )
-    
+
     # 這裡我們也回傳一個 JSON 格式，方便 LLM 進行結構化輸出
-    clothing_list_json = df[['clothing_id', 'category', 'color', 'material', 'tags']].to_json(orient='records', force_ascii=False)
-    
-    return llm_prompt_summary, clothing_list_json
+    return llm_prompt_summary, wardrobe.json
 
 # 保持 __main__ 區塊不變，用於獨立測試
 if __name__ == '__main__':
@@ -87,4 +208,4 @@ if __name__ == '__main__':
         print("\n--- 成功從資料庫抓取數據並轉換為 LLM Prompt ---")
         print(llm_prompt)
     else:
-        print("\n--- 資料抓取失敗，請檢查資料庫連線 ---")
\ No newline at end of file
+        print("\n--- 資料抓取失敗，請檢查資料庫連線 ---")
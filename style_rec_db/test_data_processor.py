@@ -0,0 +1,109 @@
+# ~/Desktop/stylerec/test_data_processor.py
+# 衣櫃快取測試（不需要 MySQL）：以假的連線池模擬 InnoDB REPEATABLE READ 快照
+#     python -m unittest test_data_processor
+
+import unittest
+from unittest import mock
+
+import data_processor
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.version = 1
+        self.rows = [(1, "上衣", "白色", "棉", "休閒")]
+
+
+class FakeConnection:
+    """沒有 autocommit 時，第一次查詢建立快照，直到 commit / rollback 前都讀到同一份資料"""
+
+    def __init__(self, db, autocommit):
+        self.db = db
+        self.autocommit = autocommit
+        self.snapshot = None
+
+    def read(self):
+        current = (self.db.version, list(self.db.rows))
+        if self.autocommit:
+            return current
+        if self.snapshot is None:
+            self.snapshot = current
+        return self.snapshot
+
+    def cursor(self, buffered=False):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.snapshot = None
+
+    commit = rollback
+
+    def close(self):
+        pass  # 與 PooledMySQLConnection 相同：歸還到池中，不會 rollback
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def execute(self, sql, params):
+        version, rows = self.conn.read()
+        self.result = [(version,)] if "clothing_version" in sql else rows
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """只有一條連線的池：每次借出的都是同一條（最容易重現舊快照）"""
+
+    def __init__(self, db, **kwargs):
+        self.kwargs = kwargs
+        self.conn = FakeConnection(db, kwargs.get("autocommit", False))
+
+    def get_connection(self):
+        return self.conn
+
+
+class WardrobeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+        patches = [
+            mock.patch.object(data_processor.pooling, "MySQLConnectionPool",
+                              lambda **kwargs: FakePool(self.db, **kwargs)),
+            mock.patch.object(data_processor, "_pool", None),
+            mock.patch.object(data_processor, "WARDROBE_CACHE_TTL", 0),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        data_processor.invalidate_wardrobe()
+        self.addCleanup(data_processor.invalidate_wardrobe)
+
+    def test_version_change_between_calls_reloads_wardrobe(self):
+        first = data_processor.get_wardrobe(1)
+        self.assertEqual(first.count, 1)
+
+        # 另一個連線新增衣物，trigger 遞增 clothing_version
+        self.db.rows.append((2, "褲子", "藍色", "牛仔", None))
+        self.db.version += 1
+
+        second = data_processor.get_wardrobe(1)
+        self.assertEqual(second.version, 2)
+        self.assertEqual(second.count, 2)
+        self.assertIn("ID 2: 類別: 褲子", second.text_summary)
+
+    def test_unchanged_version_reuses_cache(self):
+        first = data_processor.get_wardrobe(1)
+        self.assertIs(data_processor.get_wardrobe(1), first)
+
+
+if __name__ == "__main__":
+    unittest.main()